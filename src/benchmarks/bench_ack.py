@@ -0,0 +1,50 @@
+# src/benchmarks/bench_ack.py
+"""Benchmark do processamento de ACKs no SimpleTCPSocket.
+
+Para cada tamanho de janela N, enche a fila de envio com N segmentos e mede
+o custo de um ACK cumulativo que confirma um único segmento (a fila é
+reabastecida a cada ACK para manter N pendentes). Com a fila indexada o custo
+por ACK deve ficar constante em N.
+
+    cd src
+    python3 -m benchmarks.bench_ack
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+from fase3.tcp_socket import SimpleTCPSocket, FLAG_ACK, MAX_SEG_DATA
+
+WINDOWS = (16, 64, 256, 1024, 4096)
+ACKS = 2000
+
+
+def bench_window(n, acks=ACKS):
+    sock = SimpleTCPSocket(local_port=0)
+    try:
+        payload = b'x' * MAX_SEG_DATA
+        with sock.send_lock:
+            for _ in range(n):
+                sock._queue_segment(FLAG_ACK, payload)
+        elapsed = 0.0
+        for _ in range(acks):
+            first = next(iter(sock.send_buffer.values()))
+            t0 = time.perf_counter()
+            sock._handle_ack(first.end, 0xffff)
+            elapsed += time.perf_counter() - t0
+            with sock.send_lock:
+                sock._queue_segment(FLAG_ACK, payload)
+        assert len(sock.send_buffer) == n
+        return elapsed / acks
+    finally:
+        sock.close()
+
+
+def main():
+    print(f"{'janela':>8} {'us/ACK':>10}")
+    for n in WINDOWS:
+        per_ack = bench_window(n)
+        print(f"{n:>8} {per_ack * 1e6:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
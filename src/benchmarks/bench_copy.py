@@ -0,0 +1,116 @@
+# src/benchmarks/bench_copy.py
+"""Benchmark das cópias no caminho de envio do TCP simplificado.
+
+Compara, para o mesmo payload, a segmentação antiga (fatia `data[a:b]`,
+cabeçalho empacotado duas vezes, checksum sobre `hdr + data` e `hdr + data`
+para enviar) com a atual (fatia de `memoryview`, `encode_header` com
+`struct.Struct` pré-compilado, CRC incremental e `sendmsg` com header e
+payload separados). Cada segmento é enviado a um socket UDP local.
+"atual" é o que o TCP faz: o `sendmsg` só compensa a partir de
+GATHER_MIN bytes; abaixo disso o custo fixo da chamada passa o de uma
+cópia, e header e payload são juntados num `sendto`. Com segmentos de
+MAX_SEG_DATA bytes o caminho atual copia metade do antigo mas fica ~10%
+mais lento por byte: o custo é de objetos Python por segmento (fatia de
+memoryview, cabeçalho novo, codec), não de cópia, e um buffer de
+cabeçalho pré-alocado (`pack_into`) não o reduz. Com 32000 bytes ele é
+mais rápido e não copia nada.
+
+"bytes copiados/byte" é medido com tracemalloc: pico de memória temporária
+de um segmento (as cópias do payload coexistem até o envio) com payload de
+MAX_SEG_DATA bytes menos o pico com payload de 1 byte, dividido pela
+diferença de tamanho — o custo fixo por segmento (objetos, cabeçalho) se
+cancela e sobra o que é proporcional ao payload.
+
+    cd src
+    python3 -m benchmarks.bench_copy
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import socket
+import struct
+import time
+import tracemalloc
+import zlib
+from fase3.tcp_socket import encode_header, FLAG_ACK, GATHER_MIN, HDR_FMT, HDR_LEN, MAX_SEG_DATA
+
+PAYLOAD = 8 * 1024 * 1024
+SIZES = (MAX_SEG_DATA, 32000)   # segmento padrão e um abaixo do MTU do loopback
+REPEAT = 7          # o tempo é o melhor de REPEAT envios: menos ruído do escalonador
+
+
+def legacy_send(sock, addr, data, offset, seq, size=MAX_SEG_DATA):
+    # caminho antigo: send() fatiava e pack_segment() concatenava duas vezes
+    chunk = data[offset: offset + size]
+    hdr_no_ck = struct.pack('!I I B B H', seq, 0, FLAG_ACK, HDR_LEN, 0xffff)
+    ck = zlib.crc32(hdr_no_ck + chunk) & 0xffffffff
+    hdr = struct.pack(HDR_FMT, seq, 0, FLAG_ACK, HDR_LEN, 0xffff, ck)
+    sock.sendto(hdr + chunk, addr)
+    return len(chunk)
+
+
+def gather_send(sock, addr, view, offset, seq, size=MAX_SEG_DATA):
+    chunk = view[offset: offset + size]
+    hdr = encode_header(seq, 0, FLAG_ACK, 0xffff, chunk)
+    sock.sendmsg((hdr, chunk), (), 0, addr)
+    return len(chunk)
+
+
+def current_send(sock, addr, view, offset, seq, size=MAX_SEG_DATA):
+    # o que _send_raw faz: sendmsg só a partir de GATHER_MIN, senão junta
+    chunk = view[offset: offset + size]
+    hdr = encode_header(seq, 0, FLAG_ACK, 0xffff, chunk)
+    if len(chunk) >= GATHER_MIN:
+        sock.sendmsg((hdr, chunk), (), 0, addr)
+    else:
+        sock.sendto(b''.join((hdr, chunk)), addr)
+    return len(chunk)
+
+
+def throughput(send, data, sock, addr, size, repeat=REPEAT):
+    """ns por byte de payload para enviar `data` inteiro (melhor de `repeat`)."""
+    best = None
+    for _ in range(repeat):
+        offset = 0
+        t0 = time.perf_counter()
+        while offset < len(data):
+            offset += send(sock, addr, data, offset, offset, size)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(data) * 1e9
+
+
+def temp_peak(send, data, sock, addr, size, rounds=200):
+    """Pico médio de memória temporária por segmento de `size` bytes."""
+    total = 0
+    tracemalloc.start()
+    for i in range(rounds):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        send(sock, addr, data, i * size, i, size)
+        total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return total / rounds
+
+
+def main():
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('localhost', 0))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    addr = sink.getsockname()
+    payload = os.urandom(PAYLOAD)
+
+    print(f"{'segmento':>8} {'caminho':>10} {'ns/byte':>10} {'bytes copiados/byte':>20}")
+    for size in SIZES:
+        for name, send, data in (('antigo', legacy_send, payload),
+                                 ('sendmsg', gather_send, memoryview(payload)),
+                                 ('atual', current_send, memoryview(payload))):
+            ns = throughput(send, data, sock, addr, size)
+            full = temp_peak(send, data, sock, addr, size)
+            tiny = temp_peak(send, data, sock, addr, 1)
+            print(f"{size:>8} {name:>10} {ns:>10.2f} {(full - tiny) / (size - 1):>20.2f}")
+    sock.close()
+    sink.close()
+
+
+if __name__ == '__main__':
+    main()
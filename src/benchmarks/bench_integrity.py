@@ -0,0 +1,46 @@
+# src/benchmarks/bench_integrity.py
+"""Custo de CPU de cada codec de integridade (utils/integrity.py).
+
+Calcula o checksum de segmentos como o TCP os monta (cabeçalho de 12
+bytes, opções de 10, payload) e mostra segundos de CPU por GB de payload,
+para alguns tamanhos de segmento. A última coluna é a atualização
+incremental do inet16 numa retransmissão (só o cabeçalho é relido).
+
+    cd src
+    python3 -m benchmarks.bench_integrity
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+from utils.integrity import CODECS, get_codec
+
+VOLUME = 256 * 1024 * 1024      # bytes de payload por medição
+SIZES = (1000, 8900, 64000)
+
+
+def cpu_per_gb(fn, size):
+    rounds = max(1, VOLUME // size)
+    t0 = time.process_time()
+    for _ in range(rounds):
+        fn()
+    return (time.process_time() - t0) / (rounds * size) * 1e9
+
+
+def main():
+    header = os.urandom(12)
+    options = os.urandom(10)
+    inet = get_codec('inet16')
+    print(f"{'mss':>6} " + ' '.join(f"{name:>9}" for name in CODECS) + f" {'inet16 upd':>11}   (s CPU/GB)")
+    for size in SIZES:
+        payload = memoryview(os.urandom(size))
+        row = [cpu_per_gb(lambda c=codec: c.compute(header, options, payload), size)
+               for codec in CODECS.values()]
+        ck = inet.compute(header, options, payload)
+        new = os.urandom(22)
+        old = header + options
+        upd = cpu_per_gb(lambda: inet.update(ck, old, new), size)
+        print(f"{size:>6} " + ' '.join(f"{v:>9.3f}" for v in row) + f" {upd:>11.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# src/benchmarks/bench_mss.py
+"""Vazão do TCP simplificado em função do MSS.
+
+Transfere TOTAL bytes pelo loopback entre dois SimpleTCPSocket para cada
+tamanho de segmento (os dois lados anunciam o mesmo MSS no handshake) e
+mostra MB/s. Segmentos maiores
+diluem o custo fixo por datagrama (cabeçalho, checksum, syscall, ACK).
+
+    cd src
+    python3 -m benchmarks.bench_mss
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import threading
+import time
+from fase3.tcp_socket import SimpleTCPSocket
+
+TOTAL = 10 * 1024 * 1024
+SIZES = (1000, 4000, 8900, 16000, 32000, 64000)
+RECV_BUFSIZE = 4 * 1024 * 1024
+
+
+def run(mss, port):
+    server = SimpleTCPSocket(local_port=port, mss=mss, recv_bufsize=RECV_BUFSIZE)
+    server.listen()
+    client = SimpleTCPSocket(local_port=port + 1, mss=mss, recv_bufsize=RECV_BUFSIZE)
+    client.connect(('localhost', port))
+    conn = server.accept(timeout=5)
+    data = os.urandom(TOTAL)
+    t0 = time.perf_counter()
+    sender = threading.Thread(target=client.send, args=(data,))
+    sender.start()
+    got = 0
+    buf = bytearray(1024 * 1024)
+    while got < TOTAL:
+        got += conn.recv_into(buf, timeout=10)
+    elapsed = time.perf_counter() - t0
+    sender.join()
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+    return TOTAL / elapsed / 1e6
+
+
+def main():
+    print(f"{'mss':>6} {'MB/s':>8}")
+    for i, mss in enumerate(SIZES):
+        rate = run(mss, 18000 + 2 * i)
+        print(f"{mss:>6} {rate:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+# src/benchmarks/bench_suite.py
+"""Suíte reproduzível de vazão e latência de todos os protocolos.
+
+Roda rdt2.0, rdt2.1, rdt3.0, Selective Repeat e o TCP simplificado sobre
+uma matriz de cenários: tamanho de payload, perda/corrupção, faixa de
+atraso e janela (SR e TCP). O canal simulado usa uma semente por cenário,
+derivada de --seed, então a sequência de perdas é a mesma entre execuções
+(a ordem entre threads ainda pode variar um pouco).
+
+Para cada cenário mede:
+- goodput: bytes de payload entregues / tempo de parede
+- latência p50/p99 por mensagem: rdt*, a duração de cada send() (pare e
+  espere, inclui o ACK); SR e TCP, do primeiro envio de um segmento até a
+  entrega em ordem no receptor, pelos eventos de utils/trace
+- razão de retransmissão: retransmissões / segmentos enviados
+- tempo de CPU do processo (as duas pontas rodam aqui)
+
+Cada cenário roda --repeat vezes e vale a mediana de cada métrica, o que
+tira boa parte do ruído entre execuções. O resultado sai em JSON; com --baseline compara com uma execução guardada
+e termina com código 1 se algum cenário piorou além da tolerância.
+
+    cd src
+    python3 -m benchmarks.bench_suite --out base.json
+    python3 -m benchmarks.bench_suite --baseline base.json
+    python3 -m benchmarks.bench_suite --profile full --engines sr,tcp
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import itertools
+import json
+import platform
+import random
+import threading
+import time
+import zlib
+
+from utils import trace
+from utils.simulator import UnreliableChannel
+from fase1.rdt20 import RDT20Sender, RDT20Receiver
+from fase1.rdt21 import RDT21Sender, RDT21Receiver
+from fase1.rdt30 import RDT30Sender, RDT30Receiver
+from fase2.sr import SRSender, SRReceiver
+from fase3.tcp_socket import SimpleTCPSocket
+
+ENGINES = ('rdt20', 'rdt21', 'rdt30', 'sr', 'tcp')
+WINDOWED = ('sr', 'tcp')
+
+# matrizes: payload (bytes por mensagem / MSS), (perda, corrupção), atraso (s), janela (segmentos)
+PROFILES = {
+    'quick': {
+        'payloads': (1000,),
+        'links': ((0.0, 0.0), (0.05, 0.02)),
+        'delays': ((0.0, 0.002),),
+        'windows': (16,),
+        'messages': 20,             # mensagens por cenário (rdt*)
+        'stream_bytes': 200_000,    # bytes por cenário (SR, TCP)
+    },
+    'full': {
+        'payloads': (100, 1000, 8000),
+        'links': ((0.0, 0.0), (0.01, 0.0), (0.05, 0.02), (0.1, 0.05)),
+        'delays': ((0.0, 0.002), (0.01, 0.03)),
+        'windows': (8, 32, 128),
+        'messages': 50,
+        'stream_bytes': 1_000_000,
+    },
+}
+
+RDT_TIMEOUT = 0.2       # timeout dos remetentes pare-e-espere
+SR_TIMEOUT = 0.2
+RUN_TIMEOUT = 60.0      # limite por cenário
+SETTLE = 0.05           # espera pelos últimos pacotes atrasados
+TOLERANCE = 0.2         # piora relativa aceita contra o baseline
+# ... e a diferença absoluta mínima para contar (ruído de medidas pequenas)
+MIN_DELTA = {'latency_p50_ms': 1.0, 'latency_p99_ms': 5.0, 'cpu_s': 0.05}
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def scenario_id(s):
+    parts = [s['engine'], 'p%d' % s['payload'], 'loss%g' % s['loss'], 'corrupt%g' % s['corrupt'],
+             'delay%g-%g' % tuple(s['delay'])]
+    if s['engine'] in WINDOWED:
+        parts.append('w%d' % s['window'])
+    return '/'.join(parts)
+
+
+def scenarios(profile, engines):
+    m = PROFILES[profile]
+    for engine in engines:
+        windows = m['windows'] if engine in WINDOWED else (None,)
+        for payload, (loss, corrupt), delay, window in itertools.product(
+                m['payloads'], m['links'], m['delays'], windows):
+            s = {'engine': engine, 'payload': payload, 'loss': loss, 'corrupt': corrupt,
+                 'delay': list(delay), 'window': window}
+            if engine in WINDOWED:
+                s['bytes'] = m['stream_bytes']
+            else:
+                s['messages'] = m['messages']
+            s['id'] = scenario_id(s)
+            yield s
+
+
+def _channel(s, seed):
+    # mesma semente para o mesmo cenário, em qualquer ordem de execução
+    return UnreliableChannel(loss_rate=s['loss'], corrupt_rate=s['corrupt'],
+                             delay_range=tuple(s['delay']), seed=zlib.crc32(('%d|%s' % (seed, s['id'])).encode()))
+
+
+def run_rdt(s, channel):
+    kind = s['engine']
+    if kind == 'rdt20':
+        recv = RDT20Receiver(0, channel)
+        sender = RDT20Sender(0, recv.sock.getsockname(), channel, timeout=RDT_TIMEOUT)
+        send = sender.send
+    elif kind == 'rdt21':
+        recv = RDT21Receiver(0, channel)
+        sender = RDT21Sender(0, recv.sock.getsockname(), channel, timeout=RDT_TIMEOUT)
+        send = sender.send
+    else:
+        recv = RDT30Receiver(0, channel)
+        sender = RDT30Sender(0, recv.sock.getsockname(), channel)
+        send = lambda m: sender.send(m, timeout=RDT_TIMEOUT)
+    msgs = [bytes([i % 256]) * s['payload'] for i in range(s['messages'])]
+    latencies = []
+    retx = 0
+    t0 = time.perf_counter()
+    try:
+        for m in msgs:
+            t = time.perf_counter()
+            retx += send(m)
+            latencies.append(time.perf_counter() - t)
+        wall = time.perf_counter() - t0
+        time.sleep(SETTLE)
+        got = recv.get_all_messages()
+    finally:
+        recv.stop()
+        sender.sock.close()
+    delivered = sum(len(m) for m in got[:len(msgs)])
+    return {'wall_s': wall, 'delivered': delivered, 'latencies': latencies,
+            'retx_ratio': retx / (len(msgs) + retx), 'ok': got[:len(msgs)] == msgs}
+
+
+def _segment_latencies(events, sender, receiver, numbered=False):
+    # primeiro envio de cada seq (remetente) até a entrega que o cobre (receptor);
+    # numbered: seq conta segmentos (SR), senão bytes (TCP)
+    ours, theirs = trace.label(sender), trace.label(receiver)
+    sent = {}
+    delivered = []
+    for t, kind, source, f in events:
+        if kind == trace.SEND and source == ours and f.get('len'):
+            sent.setdefault(f['seq'], t)
+        elif kind == trace.DELIVER and source == theirs:
+            delivered.append((t, f['seq'], f['len']))
+    out = []
+    if numbered:
+        for t, seq, _ in delivered:
+            if seq in sent:
+                out.append(t - sent[seq])
+        return out
+    starts = sorted(sent)
+    i = 0
+    for t, seq, length in sorted(delivered, key=lambda d: d[1]):
+        # seq = byte: todos os segmentos que começam em [seq, seq+length)
+        while i < len(starts) and starts[i] < seq + length:
+            if starts[i] >= seq:
+                out.append(t - sent[starts[i]])
+            i += 1
+    return out
+
+
+def run_sr(s, channel):
+    data = os.urandom(s['bytes'])
+    recv = SRReceiver(0, window_size=s['window'], channel=channel)
+    sender = SRSender(0, recv.sock.getsockname(), window_size=s['window'], channel=channel,
+                      timeout=SR_TIMEOUT, mss=s['payload'])
+    tracer = trace.enable(capacity=1 << 22)
+    t0 = time.perf_counter()
+    try:
+        sender.send_stream(data)
+        wall = time.perf_counter() - t0
+        time.sleep(SETTLE)
+        info = sender.get_info()
+        got = recv.get_data()
+    finally:
+        trace.disable()
+        sender.close()
+        recv.stop()
+    return {'wall_s': wall, 'delivered': len(got), 'ok': got == data,
+            'latencies': _segment_latencies(tracer.snapshot(), sender, recv, numbered=True),
+            'retx_ratio': info['retransmissions'] / max(1, info['segs_sent'] + info['retransmissions'])}
+
+
+def run_tcp(s, channel):
+    data = os.urandom(s['bytes'])
+    window = s['window'] * s['payload']
+    server = SimpleTCPSocket(local_port=0, channel=channel, mss=s['payload'], recv_bufsize=window)
+    server.listen()
+    client = SimpleTCPSocket(local_port=0, channel=channel, mss=s['payload'], send_bufsize=window)
+    client.connect(server.udp.getsockname(), timeout=10)
+    conn = server.accept(timeout=10)
+    tracer = trace.enable(capacity=1 << 22)
+    buf = bytearray()
+    t0 = time.perf_counter()
+    try:
+        sender = threading.Thread(target=client.send, args=(data,), daemon=True)
+        sender.start()
+        while len(buf) < len(data):
+            chunk = conn.recv(1 << 20, timeout=RUN_TIMEOUT)
+            if not chunk:
+                break
+            buf += chunk
+        wall = time.perf_counter() - t0
+        sender.join()
+        info = client.get_info()
+    finally:
+        trace.disable()
+        client.close(timeout=1.0)
+        conn.close(timeout=1.0)
+    return {'wall_s': wall, 'delivered': len(buf), 'ok': bytes(buf) == data,
+            'latencies': _segment_latencies(tracer.snapshot(), client, conn),
+            'retx_ratio': info['retransmissions'] / max(1, info['segs_sent'] + info['retransmissions'])}
+
+
+RUNNERS = {'rdt20': run_rdt, 'rdt21': run_rdt, 'rdt30': run_rdt, 'sr': run_sr, 'tcp': run_tcp}
+
+
+def run_scenario(s, seed):
+    channel = _channel(s, seed)
+    # ISNs e demais sorteios fora do canal
+    random.seed(zlib.crc32(('%d|%s|isn' % (seed, s['id'])).encode()))
+    cpu0 = time.process_time()
+    r = RUNNERS[s['engine']](s, channel)
+    cpu = time.process_time() - cpu0
+    lat = r.pop('latencies')
+    p50, p99 = percentile(lat, 50), percentile(lat, 99)
+    return dict(s, **{
+        'ok': r['ok'],
+        'wall_s': round(r['wall_s'], 4),
+        'cpu_s': round(cpu, 4),
+        'goodput_mbps': round(r['delivered'] * 8 / r['wall_s'] / 1e6, 3),
+        'latency_p50_ms': None if p50 is None else round(p50 * 1000, 3),
+        'latency_p99_ms': None if p99 is None else round(p99 * 1000, 3),
+        'retx_ratio': round(r['retx_ratio'], 4),
+    })
+
+
+METRICS = ('wall_s', 'cpu_s', 'goodput_mbps', 'latency_p50_ms', 'latency_p99_ms', 'retx_ratio')
+
+
+def run_repeated(s, seed, repeat):
+    """Mediana de cada métrica em `repeat` execuções (sementes seed, seed+1, ...)."""
+    runs = [run_scenario(s, seed + i) for i in range(repeat)]
+    out = dict(runs[0], ok=all(r['ok'] for r in runs), repeat=repeat)
+    for key in METRICS:
+        values = [r[key] for r in runs if r[key] is not None]
+        out[key] = round(percentile(values, 50), 4) if values else None
+    return out
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Regressões de `results` contra `baseline` (ambos no formato de run()); lista de textos."""
+    base = {r['id']: r for r in baseline['results']}
+    problems = []
+    for r in results['results']:
+        b = base.get(r['id'])
+        if b is None:
+            continue
+        if b['ok'] and not r['ok']:
+            problems.append('%s: dados entregues incorretos' % r['id'])
+        if r['goodput_mbps'] < b['goodput_mbps'] * (1 - tolerance):
+            problems.append('%s: goodput %.3f < %.3f Mb/s' % (r['id'], r['goodput_mbps'], b['goodput_mbps']))
+        for key, slack in MIN_DELTA.items():
+            if (r[key] is not None and b[key] is not None
+                    and r[key] > b[key] * (1 + tolerance) and r[key] - b[key] > slack):
+                problems.append('%s: %s %.3f > %.3f' % (r['id'], key, r[key], b[key]))
+    return problems
+
+
+def run(profile='quick', engines=ENGINES, seed=1, repeat=1):
+    results = []
+    for s in scenarios(profile, engines):
+        r = run_repeated(s, seed, repeat)
+        print('%-48s %8.3f Mb/s  p50 %8s ms  p99 %8s ms  retx %.3f  cpu %.2f s%s' % (
+            r['id'], r['goodput_mbps'], r['latency_p50_ms'], r['latency_p99_ms'],
+            r['retx_ratio'], r['cpu_s'], '' if r['ok'] else '  FALHOU'), file=sys.stderr)
+        results.append(r)
+    return {'meta': {'profile': profile, 'seed': seed, 'repeat': repeat, 'python': platform.python_version(),
+                     'platform': platform.platform(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'results': results}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    ap.add_argument('--engines', default=','.join(ENGINES), help='lista separada por vírgulas')
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--repeat', type=int, default=3, help='execuções por cenário (vale a mediana)')
+    ap.add_argument('--out', help='grava o JSON aqui (padrão: saída padrão)')
+    ap.add_argument('--baseline', help='JSON de uma execução anterior para comparar')
+    ap.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = ap.parse_args(argv)
+    engines = [e for e in args.engines.split(',') if e]
+    for e in engines:
+        if e not in ENGINES:
+            ap.error('protocolo desconhecido: %s' % e)
+    results = run(args.profile, engines, args.seed, args.repeat)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for p in problems:
+            print('REGRESSÃO', p, file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
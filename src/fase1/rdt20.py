@@ -1,4 +1,10 @@
 # src/fase1/rdt20.py
+"""
+rdt2.0: pare e espere com ACK/NAK, sem número de sequência.
+
+SimRDT20Sender e SimRDT20Receiver rodam o mesmo protocolo em tempo virtual,
+sobre uma utils.netsim.SimNetwork.
+"""
 
 import socket
 import threading
@@ -9,19 +15,44 @@ from utils.packet import (
     TYPE_ACK,
     TYPE_NAK,
     TYPE_DATA,
-    checksum,
+    split_type,
 )
+from utils.integrity import get_codec
+from utils.netsim import SimStopAndWaitSender, SimReceiver
 
 
 class RDT20Sender:
     """Sender rdt2.0 (stop-and-wait). Retorna número de retransmissões."""
 
-    def __init__(self, local_port, dest_addr, channel=None, timeout=1.0):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind(("localhost", local_port))
+    def __init__(self, local_port, dest_addr, channel=None, timeout=1.0, integrity='crc32'):
+        """integrity: codec do checksum (utils.integrity), anunciado no tipo de cada pacote."""
+        self.sock = self._bind(local_port)
         self.dest_addr = dest_addr
         self.channel = channel
         self.timeout = timeout
+        self.integrity = get_codec(integrity)
+
+    def _bind(self, local_port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("localhost", local_port))
+        return sock
+
+    def _transmit(self, pkt):
+        if self.channel:
+            self.channel.send(pkt, self.sock, self.dest_addr)
+        else:
+            self.sock.sendto(pkt, self.dest_addr)
+
+    def _packet(self, data):
+        return pack_rdt20(data, self.integrity)
+
+    def _is_ack(self, resp) -> bool:
+        # ACK/NAK deve ter exatamente 1 byte; NAK ou lixo → retransmitir
+        return len(resp) == 1 and resp[0] == TYPE_ACK
+
+    def _advance(self):
+        # sem número de sequência: nada muda entre mensagens
+        pass
 
     def send(self, msg):
         """
@@ -34,15 +65,12 @@ class RDT20Sender:
         else:
             data = msg.encode()
 
-        pkt = pack_rdt20(data)
+        pkt = self._packet(data)
         retrans = 0
 
         while True:
             # --- ENVIO ---
-            if self.channel:
-                self.channel.send(pkt, self.sock, self.dest_addr)
-            else:
-                self.sock.sendto(pkt, self.dest_addr)
+            self._transmit(pkt)
 
             # --- AGUARDAR ACK/NAK ---
             self.sock.settimeout(self.timeout)
@@ -52,19 +80,10 @@ class RDT20Sender:
                 retrans += 1
                 continue
 
-            # ACK/NAK deve ter exatamente 1 byte
-            if len(resp) != 1:
-                retrans += 1
-                continue
-
-            resp_type = resp[0]
-
-            if resp_type == TYPE_ACK:
+            if self._is_ack(resp):
+                self._advance()
                 return retrans  # SUCESSO
-            else:
-                # NAK ou lixo
-                retrans += 1
-                continue
+            retrans += 1
 
     def close(self):
         try: self.sock.close()
@@ -75,16 +94,28 @@ class RDT20Sender:
 class RDT20Receiver:
     """Receiver rdt2.0: roda em thread, envia ACK/NAK e bufferiza mensagens."""
 
-    def __init__(self, local_port, channel=None):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind(("localhost", local_port))
+    def __init__(self, local_port, channel=None, integrity='crc32'):
+        """
+        integrity: aceita o codec que vier no pacote; 'none' (sem
+        verificação) só se este receptor também for configurado com 'none'.
+        """
+        self.sock = self._bind(local_port)
         self.channel = channel
+        self.integrity = get_codec(integrity)
         self.buffer = []
         self.running = True
         self.lock = threading.Lock()
         self.last_payload = None
         self.last_checksum = None
+        self._start()
 
+    def _bind(self, local_port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("localhost", local_port))
+        return sock
+
+    def _start(self):
+        # thread de recepção; em tempo virtual os pacotes vão direto a _handle_packet
         self.thread = threading.Thread(target=self._loop, daemon=True)
         self.thread.start()
 
@@ -104,39 +135,45 @@ class RDT20Receiver:
                 pkt_bytes, addr = self.sock.recvfrom(65536)
             except:
                 continue
+            self._handle_packet(pkt_bytes, addr)
+
+    def _handle_packet(self, pkt_bytes, addr):
+        unpacked = unpack_rdt20(pkt_bytes)
+
+        # Pacote sem formato válido → NAK
+        if unpacked is None:
+            self._send(pack_ack_rdt20(TYPE_NAK), addr)
+            return
+
+        t, chksum, data = unpacked
+        kind, codec = split_type(t)
+
+        # --- DETECÇÃO DE CORRUPÇÃO MAIS FORTE ---
+        # tipo ou codec corrompido → NAK
+        if kind != TYPE_DATA or codec is None:
+            self._send(pack_ack_rdt20(TYPE_NAK), addr)
+            return
+        if not codec.checks and codec is not self.integrity:
+            self._send(pack_ack_rdt20(TYPE_NAK), addr)
+            return
+
+        # checksum errado → NAK
+        if not codec.verify(chksum, data):
+            self._send(pack_ack_rdt20(TYPE_NAK), addr)
+            return
+
+        # --- PACOTE OK ---
+        with self.lock:
+            if chksum == self.last_checksum and data == self.last_payload:
+                # ACK anterior pode ter sido corrompido; reenvia ACK sem duplicar entrega.
+                self._send(pack_ack_rdt20(TYPE_ACK), addr)
+                return
 
-            unpacked = unpack_rdt20(pkt_bytes)
-
-            # Pacote sem formato válido → NAK
-            if unpacked is None:
-                self._send(pack_ack_rdt20(TYPE_NAK), addr)
-                continue
-
-            t, chksum, data = unpacked
-
-            # --- DETECÇÃO DE CORRUPÇÃO MAIS FORTE ---
-            # tipo corrompido → NAK
-            if t != TYPE_DATA:
-                self._send(pack_ack_rdt20(TYPE_NAK), addr)
-                continue
-
-            # checksum errado → NAK
-            if checksum(data) != chksum:
-                self._send(pack_ack_rdt20(TYPE_NAK), addr)
-                continue
-
-            # --- PACOTE OK ---
-            with self.lock:
-                if chksum == self.last_checksum and data == self.last_payload:
-                    # ACK anterior pode ter sido corrompido; reenvia ACK sem duplicar entrega.
-                    self._send(pack_ack_rdt20(TYPE_ACK), addr)
-                    continue
-
-                self.buffer.append(data)
-                self.last_checksum = chksum
-                self.last_payload = data
+            self.buffer.append(data)
+            self.last_checksum = chksum
+            self.last_payload = data
 
-            self._send(pack_ack_rdt20(TYPE_ACK), addr)
+        self._send(pack_ack_rdt20(TYPE_ACK), addr)
 
     def get_all_messages(self):
         """Retorna lista de bytes entregues e limpa buffer."""
@@ -149,3 +186,11 @@ class RDT20Receiver:
         self.running = False
         try: self.sock.close()
         except: pass
+
+
+class SimRDT20Sender(SimStopAndWaitSender, RDT20Sender):
+    """rdt2.0 em tempo virtual (ver utils.netsim.SimStopAndWaitSender)."""
+
+
+class SimRDT20Receiver(SimReceiver, RDT20Receiver):
+    """Receptor rdt2.0 em tempo virtual: cada datagrama é tratado no evento de entrega."""
@@ -1,16 +1,22 @@
 # src/fase1/rdt21.py
+"""
+rdt2.1: pare e espere com número de sequência alternado (0/1) e ACK/NAK.
+
+SimRDT21Sender e SimRDT21Receiver rodam o mesmo protocolo em tempo virtual,
+sobre uma utils.netsim.SimNetwork.
+"""
 
 import socket
 import threading
-import struct
 from utils.packet import (
     pack_rdt21,
-    unpack_rdt21,
+    verify_rdt21,
     TYPE_DATA,
     TYPE_ACK,
     TYPE_NAK,
-    checksum,
 )
+from utils.integrity import get_codec
+from utils.netsim import SimStopAndWaitSender, SimReceiver
 
 
 class RDT21Sender:
@@ -18,14 +24,41 @@ class RDT21Sender:
     rdt 2.1 Sender (stop-and-wait com seqnum e ACK/NAK robustos).
     """
 
-    def __init__(self, local_port, dest_addr, channel=None, timeout=1.0):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind(("localhost", local_port))
+    def __init__(self, local_port, dest_addr, channel=None, timeout=1.0, integrity='crc32'):
+        """integrity: codec do checksum (utils.integrity), anunciado no tipo de cada pacote."""
+        self.sock = self._bind(local_port)
         self.dest_addr = dest_addr
         self.channel = channel
         self.timeout = timeout
+        self.integrity = get_codec(integrity)
         self.seqnum = 0  # alterna entre 0 e 1
 
+    def _bind(self, local_port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("localhost", local_port))
+        return sock
+
+    def _transmit(self, pkt):
+        if self.channel:
+            self.channel.send(pkt, self.sock, self.dest_addr)
+        else:
+            self.sock.sendto(pkt, self.dest_addr)
+
+    def _packet(self, data):
+        return pack_rdt21(TYPE_DATA, self.seqnum, data, self.integrity)
+
+    def _is_ack(self, resp_bytes) -> bool:
+        """True se é o ACK íntegro do pacote em andamento; NAK ou qualquer outra coisa → retransmitir."""
+        # validate checksum (o ACK ecoa o nosso codec)
+        resp = verify_rdt21(resp_bytes, self.integrity)
+        if resp is None:
+            return False
+        t, rseq, payload, codec = resp
+        return t == TYPE_ACK and rseq == self.seqnum and codec is self.integrity
+
+    def _advance(self):
+        self.seqnum ^= 1
+
     def send(self, msg):
         """
         Envia msg (bytes ou str), retorna nº de retransmissões.
@@ -35,15 +68,12 @@ class RDT21Sender:
         else:
             data = msg.encode()
 
-        pkt = pack_rdt21(TYPE_DATA, self.seqnum, data)
+        pkt = self._packet(data)
         retrans = 0
 
         while True:
             # SEND
-            if self.channel:
-                self.channel.send(pkt, self.sock, self.dest_addr)
-            else:
-                self.sock.sendto(pkt, self.dest_addr)
+            self._transmit(pkt)
 
             # WAIT
             self.sock.settimeout(self.timeout)
@@ -53,31 +83,10 @@ class RDT21Sender:
                 retrans += 1
                 continue
 
-            # unpack
-            resp = unpack_rdt21(resp_bytes)
-            if resp is None:
-                retrans += 1
-                continue
-
-            t, rseq, chksum, payload = resp
-
-            # validate checksum
-            calc = checksum(struct.pack('!BB', t, rseq) + payload)
-            if calc != chksum:
-                retrans += 1
-                continue
-
             # ACK correto?
-            if t == TYPE_ACK and rseq == self.seqnum:
-                self.seqnum ^= 1
+            if self._is_ack(resp_bytes):
+                self._advance()
                 return retrans
-
-            # NAK → retransmitir
-            if t == TYPE_NAK and rseq == self.seqnum:
-                retrans += 1
-                continue
-
-            # qualquer outra coisa → retransmitir
             retrans += 1
 
     def close(self):
@@ -93,14 +102,27 @@ class RDT21Receiver:
     rdt 2.1 Receiver
     """
 
-    def __init__(self, local_port, channel=None):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind(("localhost", local_port))
+    def __init__(self, local_port, channel=None, integrity='crc32'):
+        """
+        integrity: aceita o codec que vier no pacote e responde com ele;
+        'none' (sem verificação) só se este receptor também for 'none'.
+        """
+        self.sock = self._bind(local_port)
         self.channel = channel
+        self.integrity = get_codec(integrity)
         self.expected = 0
         self.buffer = []
         self.running = True
+        self._start()
 
+    def _bind(self, local_port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("localhost", local_port))
+        return sock
+
+    def _start(self):
+        # thread de recepção; em tempo virtual (SimReceiver) os pacotes vão
+        # direto a _handle_packet
         self.thread = threading.Thread(target=self._recv_loop, daemon=True)
         self.thread.start()
 
@@ -119,37 +141,33 @@ class RDT21Receiver:
                 pkt_bytes, addr = self.sock.recvfrom(65536)
             except:
                 continue
-
-            unpacked = unpack_rdt21(pkt_bytes)
-            if unpacked is None:
-                # pacote ilegível → NAK com seqnum esperado
-                nak = pack_rdt21(TYPE_NAK, self.expected, b'')
-                self._send(nak, addr)
-                continue
-
-            t, seqnum, chksum, data = unpacked
-
-            # validar checksum
-            calc = checksum(struct.pack('!BB', t, seqnum) + data)
-            if calc != chksum:
-                nak = pack_rdt21(TYPE_NAK, self.expected, b'')
-                self._send(nak, addr)
-                continue
-
-            if t != TYPE_DATA:
-                # Se chegou ACK/NAK errado no receptor → ignora
-                continue
-
-            # Se seqnum correto
-            if seqnum == self.expected:
-                self.buffer.append(data)
-                ack = pack_rdt21(TYPE_ACK, self.expected, b'')
-                self._send(ack, addr)
-                self.expected ^= 1
-            else:
-                # seqnum duplicado → reenvia ACK anterior
-                oldack = pack_rdt21(TYPE_ACK, seqnum, b'')
-                self._send(oldack, addr)
+            self._handle_packet(pkt_bytes, addr)
+
+    def _handle_packet(self, pkt_bytes, addr):
+        # validar checksum
+        unpacked = verify_rdt21(pkt_bytes, self.integrity)
+        if unpacked is None:
+            # pacote ilegível ou corrompido → NAK com seqnum esperado
+            nak = pack_rdt21(TYPE_NAK, self.expected, b'', self.integrity)
+            self._send(nak, addr)
+            return
+
+        t, seqnum, data, codec = unpacked
+
+        if t != TYPE_DATA:
+            # Se chegou ACK/NAK errado no receptor → ignora
+            return
+
+        # Se seqnum correto
+        if seqnum == self.expected:
+            self.buffer.append(data)
+            ack = pack_rdt21(TYPE_ACK, self.expected, b'', codec)
+            self._send(ack, addr)
+            self.expected ^= 1
+        else:
+            # seqnum duplicado → reenvia ACK anterior
+            oldack = pack_rdt21(TYPE_ACK, seqnum, b'', codec)
+            self._send(oldack, addr)
 
     def get_all_messages(self):
         msgs = self.buffer[:]
@@ -162,3 +180,11 @@ class RDT21Receiver:
             self.sock.close()
         except:
             pass
+
+
+class SimRDT21Sender(SimStopAndWaitSender, RDT21Sender):
+    """rdt2.1 em tempo virtual (ver utils.netsim.SimStopAndWaitSender)."""
+
+
+class SimRDT21Receiver(SimReceiver, RDT21Receiver):
+    """Receptor rdt2.1 em tempo virtual: cada datagrama é tratado no evento de entrega."""
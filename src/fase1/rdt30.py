@@ -3,6 +3,9 @@
 # =====================
 """Implementação rdt3.0 (rdt2.1 + timer para perdas).
 Remetente usa timeout para retransmitir; receptor igual ao rdt2.1.
+
+SimRDT30Sender e SimRDT30Receiver rodam o mesmo protocolo em tempo virtual,
+sobre uma utils.netsim.SimNetwork.
 """
 from fase1.rdt21 import RDT21Receiver, RDT21Sender
 import socket
@@ -10,23 +13,50 @@ import threading
 import time
 from utils import simulator
 from utils import packet as pkt
+from utils import trace
+from utils.integrity import get_codec
+from utils.netsim import SimStopAndWaitSender, SimReceiver
 
 class RDT30Sender:
-    def __init__(self, local_port, dest_addr, channel: simulator.UnreliableChannel=None):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind(('localhost', local_port))
+    def __init__(self, local_port, dest_addr, channel: simulator.UnreliableChannel=None,
+                 integrity='crc32'):
+        """integrity: codec do checksum (utils.integrity), anunciado no tipo de cada pacote."""
+        self.sock = self._bind(local_port)
         self.dest_addr = dest_addr
         self.channel = channel
+        self.integrity = get_codec(integrity)
         self.seq = 0
 
+    def _bind(self, local_port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('localhost', local_port))
+        return sock
+
+    def _transmit(self, packet):
+        if self.channel:
+            self.channel.send(packet, self.sock, self.dest_addr)
+        else:
+            self.sock.sendto(packet, self.dest_addr)
+
+    def _packet(self, data):
+        return pkt.pack_rdt21(pkt.TYPE_DATA, self.seq, data, self.integrity)
+
+    def _advance(self):
+        self.seq ^= 1
+
+    def _is_ack(self, resp) -> bool:
+        """True se `resp` é o ACK íntegro do pacote em andamento."""
+        out = pkt.verify_rdt21(resp, self.integrity)
+        if out is None:
+            return False
+        t, seqnum, payload, codec = out
+        return t == pkt.TYPE_ACK and seqnum == self.seq and codec is self.integrity
+
     def send(self, data: bytes, timeout=2.0):
         retransmissions = 0
-        packet = pkt.pack_rdt21(pkt.TYPE_DATA, self.seq, data)
+        packet = self._packet(data)
         while True:
-            if self.channel:
-                self.channel.send(packet, self.sock, self.dest_addr)
-            else:
-                self.sock.sendto(packet, self.dest_addr)
+            self._transmit(packet)
 
             start = time.time()
             self.sock.settimeout(timeout)
@@ -34,22 +64,27 @@ class RDT30Sender:
                 resp, _ = self.sock.recvfrom(4096)
             except socket.timeout:
                 retransmissions += 1
-                print('[SENDER30] Timeout, retransmitindo')
+                if trace.active is not None:
+                    trace.active.emit(trace.RETRANSMIT, self, seq=self.seq, reason='timeout')
                 continue
             # process ack
-            out = pkt.unpack_rdt21(resp)
-            if out is None:
-                retransmissions += 1
-                continue
-            t, seqnum, chksum, payload = out
-            if t == pkt.TYPE_ACK and seqnum == self.seq:
+            if self._is_ack(resp):
                 # sucesso
-                self.seq ^= 1
+                self._advance()
                 return retransmissions
             else:
                 retransmissions += 1
-                print('[SENDER30] ACK incorreto, retransmitindo')
+                if trace.active is not None:
+                    trace.active.emit(trace.RETRANSMIT, self, seq=self.seq, reason='wrong ack')
 
 # receptor pode ser o mesmo do rdt21
 class RDT30Receiver(RDT21Receiver):
-    pass
\ No newline at end of file
+    pass
+
+
+class SimRDT30Sender(SimStopAndWaitSender, RDT30Sender):
+    """rdt3.0 em tempo virtual (ver utils.netsim.SimStopAndWaitSender)."""
+
+
+class SimRDT30Receiver(SimReceiver, RDT30Receiver):
+    """Receptor rdt3.0 em tempo virtual: cada datagrama é tratado no evento de entrega."""
@@ -2,11 +2,17 @@
 # Implementação do Selective Repeat (SR) - remetente e receptor
 # Janela de envio e recepção de tamanho N
 
+import os
 import socket
 import threading
 import struct
 import time
 from utils.simulator import UnreliableChannel
+from utils.udp_offload import gso_supported, enable_gro, gso_batches, send_gso, recv_batch
+from utils.pacing import Pacer, sleep_until
+from utils.integrity import get_codec, BY_ID, DEFAULT as DEFAULT_CODEC
+from utils import trace
+from utils.filemap import map_file, windows, file_span, preallocate, MAP_WINDOW
 
 # Tipos
 TYPE_DATA = 0
@@ -14,14 +20,23 @@ TYPE_ACK = 1
 
 MSS = 1000  # payload máximo por segmento
 
+# o nibble alto do byte de tipo leva o id do codec de integridade do pacote
+CODEC_SHIFT = 4
+TYPE_MASK = 0x0f
+
 def checksum(data: bytes) -> int:
     import zlib
     return zlib.crc32(data) & 0xffffffff
 
-def pack_data(seqnum: int, payload: bytes) -> bytes:
-    header = struct.pack('!BI', TYPE_DATA, seqnum)
-    chksum = checksum(header + payload)
-    return header + struct.pack('!I', chksum) + payload
+def split_type(t: int):
+    """(tipo, codec) de um byte de tipo; codec None se o id for desconhecido."""
+    return t & TYPE_MASK, BY_ID.get(t >> CODEC_SHIFT)
+
+def pack_data(seqnum: int, payload: bytes, codec=DEFAULT_CODEC) -> bytes:
+    header = struct.pack('!BI', TYPE_DATA | codec.id << CODEC_SHIFT, seqnum)
+    # checksum pelas partes, sem concatenar cabeçalho e payload antes
+    chksum = codec.compute(header, payload)
+    return b''.join((header, struct.pack('!I', chksum), payload))
 
 def unpack_data(packet: bytes):
     if len(packet) < 9:
@@ -31,9 +46,9 @@ def unpack_data(packet: bytes):
     data = packet[9:]
     return t, seqnum, chksum, data
 
-def pack_ack(seqnum: int) -> bytes:
-    header = struct.pack('!BI', TYPE_ACK, seqnum)
-    chksum = checksum(header)
+def pack_ack(seqnum: int, codec=DEFAULT_CODEC) -> bytes:
+    header = struct.pack('!BI', TYPE_ACK | codec.id << CODEC_SHIFT, seqnum)
+    chksum = codec.compute(header)
     return header + struct.pack('!I', chksum)
 
 def unpack_ack(packet: bytes):
@@ -48,40 +63,96 @@ def unpack_ack(packet: bytes):
 # Remetente (Sender)
 # ==========================
 class SRSender:
-    def __init__(self, local_port:int, dest_addr, window_size:int=5, channel:UnreliableChannel=None, timeout=0.5):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind(('localhost', local_port))
+    # relógio das amostras de RTT e do pacing; o driver em tempo virtual usa o do simulador
+    _clock = staticmethod(time.monotonic)
+
+    def __init__(self, local_port:int, dest_addr, window_size:int=5, channel:UnreliableChannel=None, timeout=0.5,
+                 offload:bool=False, mss:int=MSS, pacing=None, integrity='crc32'):
+        self.sock = self._bind(local_port)
+        # mss: payload por segmento; o receptor aceita datagramas de até 64 KiB.
+        # Fica fixo de propósito: o SR não tem handshake onde negociar uma
+        # opção MSS, e um segmento já numerado não pode ser re-segmentado
+        # (o receptor entrega por número de sequência), então nem a busca de
+        # PMTU nem o recuo por EMSGSIZE do TCP cabem aqui. Quem conhece o
+        # caminho escolhe o mss (ex. até ~64000 no loopback)
+        self.mss = mss
+        # integrity: codec do checksum ('crc32', 'adler32', 'inet16', 'none'),
+        # anunciado em cada pacote; o receptor responde com o mesmo
+        self.integrity = get_codec(integrity)
+        # offload: rajadas da janela num único sendmsg (GSO do Linux), se disponível
+        self._gso = offload and channel is None and gso_supported(self.sock)
+        self.gso_sends = 0
+        # pacing: taxa em bytes/s, 'auto' (janela/RTT medido) ou None (janela em rajada)
+        self._pacing = pacing
+        self.pacer = None if pacing is None else Pacer(None if pacing == 'auto' else pacing, mss, clock=self._clock)
+        self.srtt = None
+        self.sent_at = {}       # seq -> instante do primeiro envio (amostras de RTT)
+        self._offered_upto = 0  # segmentos já contados como rajada oferecida
         self.dest_addr = dest_addr
         self.channel = channel
         self.window = window_size
         self.base = 0
         self.nextseq = 0
         self.lock = threading.Lock()
+        # avisado a cada ACK novo (a janela pode ter aberto) e no close()
+        self._acked_cv = threading.Condition(self.lock)
         self.timers = {}
         self.packets = {}
         self.acked = set()
         self.timeout = timeout
+        # estatísticas (get_info): contadores simples, atualizados sob self.lock
+        self.segs_sent = 0
+        self.bytes_sent = 0
+        self.retransmissions = 0
+        self.bytes_retrans = 0
+        self.acks_received = 0
+        self.dup_acks = 0           # ACKs de segmentos já confirmados
+        self.send_blocked = 0.0     # segundos esperando a janela abrir
+        # envio em andamento (_load): payloads ainda não enviados
+        self._segments = iter(())
+        self._total = 0
+        self._send_index = 0
+        self._pending = None
         self.running = True
+        self._start()
+
+    def _bind(self, local_port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('localhost', local_port))
+        return sock
+
+    def _start(self):
         self.recv_thread = threading.Thread(target=self._recv_loop, daemon=True)
         self.recv_thread.start()
 
-    def _start_timer(self, seqnum):
-        def timeout_handler():
-            with self.lock:
-                if seqnum in self.acked:
-                    return
-                pkt = self.packets.get(seqnum)
-                if not pkt:
-                    return
-                print(f"[SR] Timeout seq={seqnum}, retransmitindo")
-                if self.channel:
-                    self.channel.send(pkt, self.sock, self.dest_addr)
-                else:
-                    self.sock.sendto(pkt, self.dest_addr)
-                self._start_timer(seqnum)
-        t = threading.Timer(self.timeout, timeout_handler)
+    def _new_timer(self, delay, fn, *args):
+        # objeto com cancel(); em tempo virtual, um evento do simulador
+        t = threading.Timer(delay, fn, args)
         t.daemon = True
         t.start()
+        return t
+
+    def _on_timeout(self, seqnum):
+        with self.lock:
+            if seqnum in self.acked:
+                return
+            pkt = self.packets.get(seqnum)
+            if not pkt:
+                return
+            if trace.active is not None:
+                trace.active.emit(trace.RETRANSMIT, self, seq=seqnum, reason='timeout')
+            # ACK de segmento retransmitido é ambíguo: sem amostra de RTT (Karn)
+            self.sent_at.pop(seqnum, None)
+            self.retransmissions += 1
+            self.bytes_retrans += len(pkt) - 9
+            if self.channel:
+                self.channel.send(pkt, self.sock, self.dest_addr)
+            else:
+                self.sock.sendto(pkt, self.dest_addr)
+            self._start_timer(seqnum)
+
+    def _start_timer(self, seqnum):
+        t = self._new_timer(self.timeout, self._on_timeout, seqnum)
         old = self.timers.get(seqnum)
         if old:
             try: old.cancel()
@@ -101,54 +172,186 @@ class SRSender:
                 pkt, _ = self.sock.recvfrom(65536)
             except Exception:
                 continue
-            out = unpack_ack(pkt)
-            if out is None:
-                continue
-            t, seqnum, chksum = out
-            if t != TYPE_ACK:
-                continue
-            header = struct.pack('!BI', t, seqnum)
-            if checksum(header) != chksum:
-                continue
-            with self.lock:
-                if seqnum in self.acked:
-                    continue
-                self.acked.add(seqnum)
-                self._cancel_timer(seqnum)
-                while self.base in self.acked:
-                    try: del self.packets[self.base]
-                    except KeyError: pass
-                    self.base += 1
+            self._handle_ack(pkt)
+
+    def _handle_ack(self, pkt):
+        out = unpack_ack(pkt)
+        if out is None:
+            return
+        t, seqnum, chksum = out
+        kind, codec = split_type(t)
+        if kind != TYPE_ACK or codec is not self.integrity:
+            return
+        if not codec.verify(chksum, pkt[:5]):
+            return
+        with self.lock:
+            self.acks_received += 1
+            if seqnum in self.acked:
+                self.dup_acks += 1
+                return
+            self.acked.add(seqnum)
+            if trace.active is not None:
+                trace.active.emit(trace.ACK, self, seq=seqnum)
+            self._cancel_timer(seqnum)
+            sent = self.sent_at.pop(seqnum, None)
+            if sent is not None:
+                sample = self._clock() - sent
+                self.srtt = sample if self.srtt is None else 0.875 * self.srtt + 0.125 * sample
+            while self.base in self.acked:
+                try: del self.packets[self.base]
+                except KeyError: pass
+                self.base += 1
+            self._acked_cv.notify_all()
 
     def send_stream(self, data: bytes):
         """Divide o fluxo de bytes em segmentos e envia com Selective Repeat"""
-        segments = [data[i:i+MSS] for i in range(0, len(data), MSS)]
-        total_segments = len(segments)
-        send_index = 0
+        # fatias (memoryview) geradas sob demanda: só pack_data copia o payload
+        view = memoryview(data).cast('B')
+        segments = (view[i:i+self.mss] for i in range(0, len(view), self.mss))
+        self._send_segments(segments, (len(view) + self.mss - 1) // self.mss)
+
+    def send_file(self, path, offset: int = 0, count: int = None) -> int:
+        """
+        Envia `count` bytes do arquivo (até o fim, se None) a partir de offset
+        sem lê-lo para a memória: os segmentos são fatias de um mmap do
+        arquivo, mapeado uma janela por vez. Só a janela de envio fica em
+        memória (como pacotes prontos para retransmissão). Retorna os bytes enviados.
+        """
+        with open(path, 'rb') as f:
+            fd = f.fileno()
+            count = file_span(fd, offset, count)
+            # janelas múltiplas do MSS: nenhum segmento fica entre dois mapas
+            step = max(self.mss, MAP_WINDOW - MAP_WINDOW % self.mss)
+
+            def segments():
+                for pos, n in windows(offset, count, step):
+                    view = map_file(fd, pos, n)
+                    for i in range(0, n, self.mss):
+                        yield view[i:i+self.mss]
+
+            self._send_segments(segments(), (count + self.mss - 1) // self.mss)
+        return count
+
+    def _send_segments(self, segments, total_segments: int):
+        # segments: iterador de payloads, consumido só quando a janela abre
+        self._load(segments, total_segments)
         while True:
+            wait = self._fill_window()
+            if wait > 0:
+                sleep_until(time.monotonic() + wait)
+                continue
             with self.lock:
-                while self.nextseq < self.base + self.window and send_index < total_segments:
-                    payload = segments[send_index]
-                    seqnum = self.nextseq
-                    pkt = pack_data(seqnum, payload)
-                    self.packets[seqnum] = pkt
-                    if self.channel:
-                        self.channel.send(pkt, self.sock, self.dest_addr)
-                    else:
-                        self.sock.sendto(pkt, self.dest_addr)
-                    self._start_timer(seqnum)
-                    self.nextseq += 1
-                    send_index += 1
-            with self.lock:
-                if len(self.acked) >= total_segments:
+                if len(self.acked) >= total_segments or not self.running:
                     break
-            time.sleep(0.01)
+                # janela cheia (ou tudo enviado): dorme até um ACK mudar isso
+                t0 = time.monotonic()
+                self._acked_cv.wait_for(lambda: len(self.acked) >= total_segments or not self.running
+                                        or (self.nextseq < self.base + self.window
+                                            and self._send_index < self._total))
+                self.send_blocked += time.monotonic() - t0
         with self.lock:
             for s in list(self.timers.keys()):
                 self._cancel_timer(s)
 
+    def _load(self, segments, total_segments: int):
+        with self.lock:
+            self._segments = segments
+            self._total = total_segments
+            self._send_index = 0
+            self._pending = None
+
+    def _fill_window(self) -> float:
+        """
+        Envia o que a janela (e o pacer) permitem agora. Retorna quantos
+        segundos esperar pelas fichas do pacer (0: a janela é que está cheia
+        ou não há mais o que enviar).
+        """
+        wait = 0.0
+        with self.lock:
+            burst = []
+            total = self._total
+            if self.pacer is not None:
+                self._offer_to_pacer(total - self._send_index)
+            while self.nextseq < self.base + self.window and self._send_index < total:
+                if self._pending is None:
+                    self._pending = next(self._segments)
+                payload = self._pending
+                if self.pacer is not None:
+                    # sem fichas: solta o lock, espera e continua de onde parou
+                    wait = self.pacer.delay(len(payload) + 9)
+                    if wait > 0:
+                        break
+                    self.pacer.consume(len(payload) + 9)
+                seqnum = self.nextseq
+                pkt = pack_data(seqnum, payload, self.integrity)
+                self.packets[seqnum] = pkt
+                self.sent_at[seqnum] = self._clock()
+                self.segs_sent += 1
+                self.bytes_sent += len(payload)
+                if trace.active is not None:
+                    trace.active.emit(trace.SEND, self, seq=seqnum, len=len(payload))
+                if self.channel:
+                    self.channel.send(pkt, self.sock, self.dest_addr)
+                elif self._gso:
+                    burst.append((self.dest_addr, len(pkt), (pkt,)))
+                else:
+                    self.sock.sendto(pkt, self.dest_addr)
+                self._start_timer(seqnum)
+                self.nextseq += 1
+                self._send_index += 1
+                self._pending = None
+            if burst:
+                self._send_burst(burst)
+        return wait
+
+    def _offer_to_pacer(self, remaining):
+        # com 'auto', taxa = janela / RTT; registra a rajada que a janela permite agora
+        if self._pacing == 'auto' and self.srtt:
+            self.pacer.set_rate(self.window * self.mss / self.srtt)
+        # só conta segmentos que a janela liberou desde a última vez
+        limit = min(self.base + self.window, self.nextseq + remaining)
+        ready = limit - max(self.nextseq, self._offered_upto)
+        if ready > 0:
+            self.pacer.offer(ready)
+            self._offered_upto = limit
+
+    def _send_burst(self, burst):
+        # segmentos de mesmo tamanho saem num sendmsg só; sem suporte, um a um
+        for addr, seg_size, dgrams in gso_batches(burst):
+            if len(dgrams) > 1 and self._gso:
+                try:
+                    send_gso(self.sock, dgrams, seg_size, addr)
+                    self.gso_sends += 1
+                    continue
+                except OSError:
+                    self._gso = False
+            for (pkt,) in dgrams:
+                self.sock.sendto(pkt, addr)
+
+    def get_info(self) -> dict:
+        """Fotografia do estado e dos contadores do remetente (tempos em s, tamanhos em bytes)."""
+        with self.lock:
+            return {
+                'base': self.base,
+                'nextseq': self.nextseq,
+                'window': self.window,
+                'unacked_segs': len(self.packets) - sum(1 for s in self.packets if s in self.acked),
+                'srtt': self.srtt,
+                'rto': self.timeout,
+                'segs_sent': self.segs_sent,
+                'bytes_sent': self.bytes_sent,
+                'retransmissions': self.retransmissions,
+                'bytes_retrans': self.bytes_retrans,
+                'acks_received': self.acks_received,
+                'dup_acks': self.dup_acks,
+                'send_blocked': self.send_blocked,
+                'integrity': self.integrity.name,
+            }
+
     def close(self):
-        self.running = False
+        with self.lock:
+            self.running = False
+            self._acked_cv.notify_all()
         try: self.sock.close()
         except Exception: pass
 
@@ -157,16 +360,36 @@ class SRSender:
 # Receptor (Receiver)
 # ==========================
 class SRReceiver:
-    def __init__(self, local_port:int, window_size:int=5, channel:UnreliableChannel=None):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind(('localhost', local_port))
+    def __init__(self, local_port:int, window_size:int=5, channel:UnreliableChannel=None, offload:bool=False,
+                 integrity='crc32'):
+        self.sock = self._bind(local_port)
+        # aceita o codec que vier no pacote; 'none' (sem verificação) só se
+        # este receptor também for configurado com 'none'
+        self.integrity = get_codec(integrity)
+        # offload: recebe lotes agrupados pelo kernel (GRO do Linux), se disponível
+        self._gro = offload and channel is None and enable_gro(self.sock)
         self.channel = channel
         self.window = window_size
         self.base = 0
         self.buffer = {}
         self.delivered = []
         self.lock = threading.Lock()
+        self._delivered_cv = threading.Condition(self.lock)
+        self._sink = None           # recv_to_file(): [fd, bytes gravados, limite]
+        self.segs_received = 0      # pacotes de dados íntegros
+        self.bytes_received = 0     # bytes entregues em ordem
+        self.duplicates = 0         # segmentos já recebidos antes
+        self.checksum_errors = 0
+        self.acks_sent = 0
         self.running = True
+        self._start()
+
+    def _bind(self, local_port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('localhost', local_port))
+        return sock
+
+    def _start(self):
         self.thread = threading.Thread(target=self._recv_loop, daemon=True)
         self.thread.start()
 
@@ -176,37 +399,109 @@ class SRReceiver:
     def _recv_loop(self):
         while self.running:
             try:
-                pkt, addr = self.sock.recvfrom(65536)
+                if self._gro:
+                    pkts, addr = recv_batch(self.sock)
+                else:
+                    pkt, addr = self.sock.recvfrom(65536)
+                    pkts = (pkt,)
             except Exception:
                 continue
-            out = unpack_data(pkt)
-            if out is None:
-                continue
-            t, seqnum, chksum, data = out
-            if t != TYPE_DATA:
-                continue
-            header = struct.pack('!BI', t, seqnum)
-            if checksum(header + data) != chksum:
-                continue
+            for pkt in pkts:
+                self._handle_packet(pkt, addr)
+
+    def _handle_packet(self, pkt, addr):
+        out = unpack_data(pkt)
+        if out is None:
+            return
+        t, seqnum, chksum, data = out
+        kind, codec = split_type(t)
+        if kind != TYPE_DATA or codec is None:
+            return
+        if not codec.checks and codec is not self.integrity:
+            return
+        if not codec.verify(chksum, pkt[:5], data):
+            self.checksum_errors += 1
+            return
+        with self.lock:
+            self.segs_received += 1
+            if self._in_window(seqnum):
+                if seqnum not in self.buffer:
+                    self.buffer[seqnum] = data
+                else:
+                    self.duplicates += 1
+                ack = pack_ack(seqnum, codec)
+                self.acks_sent += 1
+                if self.channel:
+                    self.channel.send(ack, self.sock, addr)
+                else:
+                    self.sock.sendto(ack, addr)
+                while self.base in self.buffer:
+                    data = self.buffer.pop(self.base)
+                    self.bytes_received += len(data)
+                    if trace.active is not None:
+                        trace.active.emit(trace.DELIVER, self, seq=self.base, len=len(data))
+                    self._deliver(data)
+                    self.base += 1
+            elif seqnum < self.base:
+                self.duplicates += 1
+                ack = pack_ack(seqnum, codec)
+                self.acks_sent += 1
+                if self.channel:
+                    self.channel.send(ack, self.sock, addr)
+                else:
+                    self.sock.sendto(ack, addr)
+
+    def _deliver(self, data):
+        # chamar com o lock: grava no arquivo de recv_to_file() ou acumula
+        sink = self._sink
+        if sink is not None and sink[1] < sink[2]:
+            n = min(len(data), sink[2] - sink[1])
+            os.pwrite(sink[0], data[:n], sink[1])
+            sink[1] += n
+            data = data[n:]
+        if data:
+            self.delivered.append(data)
+        self._delivered_cv.notify_all()
+
+    def recv_to_file(self, path, count: int, timeout: float = None) -> int:
+        """
+        Grava em `path` (criado ou truncado, pré-alocado) os próximos `count`
+        bytes entregues em ordem, com escritas posicionais em vez de
+        acumulá-los em memória. Bloqueia até gravar tudo ou até `timeout`;
+        retorna os bytes gravados.
+        """
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            preallocate(fd, count)
             with self.lock:
-                if self._in_window(seqnum):
-                    if seqnum not in self.buffer:
-                        self.buffer[seqnum] = data
-                    ack = pack_ack(seqnum)
-                    if self.channel:
-                        self.channel.send(ack, self.sock, addr)
-                    else:
-                        self.sock.sendto(ack, addr)
-                    while self.base in self.buffer:
-                        self.delivered.append(self.buffer[self.base])
-                        del self.buffer[self.base]
-                        self.base += 1
-                elif seqnum < self.base:
-                    ack = pack_ack(seqnum)
-                    if self.channel:
-                        self.channel.send(ack, self.sock, addr)
-                    else:
-                        self.sock.sendto(ack, addr)
+                self._sink = sink = [fd, 0, count]
+                # o que já foi entregue vai primeiro
+                pending, self.delivered = self.delivered, []
+                for data in pending:
+                    self._deliver(data)
+                self._delivered_cv.wait_for(lambda: sink[1] >= count or not self.running, timeout)
+                self._sink = None
+                written = sink[1]
+            if written < count:
+                os.ftruncate(fd, written)
+        finally:
+            os.close(fd)
+        return written
+
+    def get_info(self) -> dict:
+        """Fotografia do estado e dos contadores do receptor (tamanhos em bytes)."""
+        with self.lock:
+            return {
+                'base': self.base,
+                'window': self.window,
+                'ooo_segs': len(self.buffer),
+                'ooo_bytes': sum(len(d) for d in self.buffer.values()),
+                'segs_received': self.segs_received,
+                'bytes_received': self.bytes_received,
+                'duplicates': self.duplicates,
+                'checksum_errors': self.checksum_errors,
+                'acks_sent': self.acks_sent,
+            }
 
     def get_data(self) -> bytes:
         with self.lock:
@@ -216,3 +511,72 @@ class SRReceiver:
         self.running = False
         try: self.sock.close()
         except Exception: pass
+
+
+# ==========================
+# Tempo virtual (utils.netsim)
+# ==========================
+class SimSRSender(SRSender):
+    """
+    SRSender sobre uma SimNetwork: timers e esperas do pacer viram eventos
+    do simulador e send_stream()/send_file() só carregam os segmentos e
+    retornam; a janela avança a cada ACK entregue. `done` diz quando tudo
+    foi confirmado.
+    """
+
+    def __init__(self, net, local_port:int, dest_addr, **options):
+        """net: utils.netsim.SimNetwork; options: as do SRSender (window_size, timeout, ...)."""
+        self.net = net
+        self._clock = net.sim.time
+        self._pace_timer = None
+        super().__init__(local_port, dest_addr, **options)
+
+    def _bind(self, local_port):
+        return self.net.socket(local_port)
+
+    def _start(self):
+        self.sock.handler = self._on_datagram
+
+    def _new_timer(self, delay, fn, *args):
+        return self.net.sim.call_later(delay, fn, *args)
+
+    @property
+    def done(self) -> bool:
+        return len(self.acked) >= self._total
+
+    def _send_segments(self, segments, total_segments: int):
+        self._load(segments, total_segments)
+        self._fill()
+
+    def _fill(self):
+        self._pace_timer = None
+        wait = self._fill_window()
+        if wait > 0 and self._pace_timer is None:
+            self._pace_timer = self.net.sim.call_later(wait, self._fill)
+
+    def _on_datagram(self, pkt, addr):
+        self._handle_ack(pkt)
+        if self._pace_timer is None:
+            self._fill()
+
+    def close(self):
+        self.running = False
+        with self.lock:
+            for s in list(self.timers.keys()):
+                self._cancel_timer(s)
+        self.sock.close()
+
+
+class SimSRReceiver(SRReceiver):
+    """SRReceiver sobre uma SimNetwork: cada datagrama é tratado no evento de entrega."""
+
+    def __init__(self, net, local_port:int, **options):
+        """net: utils.netsim.SimNetwork; options: as do SRReceiver (window_size, integrity)."""
+        self.net = net
+        super().__init__(local_port, **options)
+
+    def _bind(self, local_port):
+        return self.net.socket(local_port)
+
+    def _start(self):
+        self.sock.handler = self._handle_packet
@@ -0,0 +1,174 @@
+# src/fase3/congestion.py
+"""
+Congestion control for SimpleTCPSocket.
+
+The socket does loss detection (duplicate ACKs, retransmission timer, the
+NewReno "recover" point) and calls into a controller that only decides how
+cwnd and ssthresh react. Controllers are picked by name ('reno', 'newreno',
+'cubic') or passed in as an instance, so new algorithms can be plugged in by
+subclassing CongestionControl.
+
+All windows are in bytes.
+"""
+
+import time
+from collections import deque
+
+DUPACK_THRESHOLD = 3
+INITIAL_WINDOW_SEGMENTS = 10     # RFC 6928
+TRACE_LEN = 10000
+
+
+class CongestionControl:
+    """Base controller: slow start + Reno congestion avoidance and fast recovery."""
+    name = 'base'
+    # NewReno stays in fast recovery until everything outstanding at loss time
+    # is acked (retransmitting on each partial ACK); Reno leaves on the first new ACK
+    newreno = True
+
+    def __init__(self, mss:int, trace_len:int=TRACE_LEN, clock=time.monotonic):
+        """clock: time source of the trace (the connection's, virtual under fase3.tcp_sim)."""
+        self.mss = mss
+        self.clock = clock
+        self.cwnd = INITIAL_WINDOW_SEGMENTS * mss
+        self.ssthresh = 2**31
+        # (time, event, cwnd, ssthresh)
+        self.trace = deque(maxlen=trace_len)
+        self._log('init')
+
+    def _log(self, event):
+        self.trace.append((self.clock(), event, self.cwnd, self.ssthresh))
+
+    def _loss_ssthresh(self, flight_size):
+        return max(flight_size // 2, 2 * self.mss)
+
+    def set_mss(self, mss:int):
+        """Segment size changed (handshake, path MTU): keep the windows in segments."""
+        if self.ssthresh < 2**31:
+            self.ssthresh = max(2 * mss, self.ssthresh * mss // self.mss)
+        self.cwnd = max(mss, self.cwnd * mss // self.mss)
+        self.mss = mss
+        self._log('mss')
+
+    def in_slow_start(self):
+        return self.cwnd < self.ssthresh
+
+    # --- events ---
+    def on_ack(self, acked:int, now:float, rtt:float):
+        """New data acked outside of fast recovery."""
+        if self.in_slow_start():
+            # appropriate byte counting (RFC 3465), L = 2*MSS
+            self.cwnd += min(acked, 2 * self.mss)
+            self._log('slow_start')
+        else:
+            self._avoid_congestion(acked, now, rtt)
+            self._log('cong_avoid')
+
+    def _avoid_congestion(self, acked, now, rtt):
+        self.cwnd += max(1, self.mss * acked // self.cwnd)
+
+    def on_enter_recovery(self, flight_size:int, now:float):
+        """Third duplicate ACK: fast retransmit was just sent."""
+        self.ssthresh = self._loss_ssthresh(flight_size)
+        self.cwnd = self.ssthresh + DUPACK_THRESHOLD * self.mss
+        self._log('fast_retransmit')
+
+    def on_dup_ack(self):
+        """Additional duplicate ACK while in fast recovery: inflate the window."""
+        self.cwnd += self.mss
+        self._log('dup_ack')
+
+    def on_partial_ack(self, acked:int):
+        """NewReno partial ACK: deflate by the amount acked, add back one segment."""
+        self.cwnd = max(self.mss, self.cwnd - acked + self.mss)
+        self._log('partial_ack')
+
+    def on_exit_recovery(self):
+        self.cwnd = self.ssthresh
+        self._log('recovery_exit')
+
+    def on_timeout(self, flight_size:int, now:float):
+        self.ssthresh = self._loss_ssthresh(flight_size)
+        self.cwnd = self.mss
+        self._log('timeout')
+
+
+class RenoCC(CongestionControl):
+    name = 'reno'
+    newreno = False
+
+
+class NewRenoCC(CongestionControl):
+    name = 'newreno'
+
+
+class CubicCC(CongestionControl):
+    """CUBIC (RFC 8312) window growth with NewReno-style loss recovery."""
+    name = 'cubic'
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self, mss:int, trace_len:int=TRACE_LEN, clock=time.monotonic):
+        super().__init__(mss, trace_len, clock)
+        self.w_max = 0.0          # segments
+        self.w_last_max = 0.0
+        self.epoch_start = None
+        self.k = 0.0
+
+    def _loss_ssthresh(self, flight_size):
+        cwnd_seg = self.cwnd / self.mss
+        # fast convergence
+        if cwnd_seg < self.w_last_max:
+            self.w_last_max = cwnd_seg
+            self.w_max = cwnd_seg * (1 + self.BETA) / 2
+        else:
+            self.w_last_max = cwnd_seg
+            self.w_max = cwnd_seg
+        self.epoch_start = None
+        return max(int(self.cwnd * self.BETA), 2 * self.mss)
+
+    def _avoid_congestion(self, acked, now, rtt):
+        mss = self.mss
+        cwnd_seg = self.cwnd / mss
+        if self.epoch_start is None:
+            self.epoch_start = now
+            if cwnd_seg < self.w_max:
+                self.k = ((self.w_max - cwnd_seg) / self.C) ** (1 / 3)
+            else:
+                self.k = 0.0
+                self.w_max = cwnd_seg
+        t = now - self.epoch_start
+        target = self.C * (t + rtt - self.k) ** 3 + self.w_max
+        # TCP-friendly region: never grow slower than standard TCP would
+        w_est = self.w_max * self.BETA + 3 * (1 - self.BETA) / (1 + self.BETA) * (t / max(rtt, 1e-6))
+        target = min(max(target, w_est), 1.5 * cwnd_seg)
+        if target > cwnd_seg:
+            inc = (target - cwnd_seg) / cwnd_seg * (acked / mss)
+            self.cwnd += max(1, int(inc * mss))
+        else:
+            self.cwnd += max(1, mss * acked // (100 * self.cwnd))
+
+    def on_timeout(self, flight_size:int, now:float):
+        super().on_timeout(flight_size, now)
+        self.epoch_start = None
+
+
+CONGESTION_CONTROLS = {
+    'reno': RenoCC,
+    'newreno': NewRenoCC,
+    'cubic': CubicCC,
+}
+
+
+def make_congestion_control(cc, mss:int, clock=time.monotonic) -> CongestionControl:
+    """
+    Build a controller from a name in CONGESTION_CONTROLS or return the given
+    instance; either way its trace runs on `clock`.
+    """
+    if isinstance(cc, CongestionControl):
+        cc.clock = clock
+        return cc
+    try:
+        return CONGESTION_CONTROLS[cc](mss, clock=clock)
+    except KeyError:
+        raise ValueError(f'unknown congestion control: {cc!r}') from None
@@ -0,0 +1,106 @@
+# src/fase3/fastopen.py
+"""
+Fast Open (RFC 7413) state for the TCP-like protocol of fase3.tcp_socket.
+
+A client that asks for it gets a cookie in the SYN-ACK; it keeps the cookie
+per server and sends it, with the first data, in the SYN of its next
+connections. The server delivers that data before the handshake completes
+if the cookie is valid.
+
+Cookies are a MAC of the client's IP address and a key epoch, so they
+expire. Within their lifetime a server refuses a SYN it has already
+accepted (same client address, ISN and cookie): a replayed SYN falls back
+to the normal handshake instead of delivering its data twice.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+COOKIE_LEN = 8
+COOKIE_LIFETIME = 600.0      # a cookie is accepted during its epoch and the next (s)
+REPLAY_CACHE_SIZE = 4096     # accepted SYNs remembered; TFO is refused when full
+
+
+class CookieCache:
+    """Client side: the latest cookie issued by each server address."""
+
+    def __init__(self, maxlen:int=1024):
+        self.maxlen = maxlen
+        self._lock = threading.Lock()
+        self._cookies = OrderedDict()
+
+    def get(self, server):
+        with self._lock:
+            return self._cookies.get(server)
+
+    def put(self, server, cookie:bytes):
+        with self._lock:
+            self._cookies[server] = cookie
+            self._cookies.move_to_end(server)
+            while len(self._cookies) > self.maxlen:
+                self._cookies.popitem(last=False)
+
+    def discard(self, server):
+        with self._lock:
+            self._cookies.pop(server, None)
+
+
+class FastOpenServer:
+    """Server side: issues and validates cookies, refuses replayed SYNs."""
+
+    def __init__(self, key:bytes=None, lifetime:float=COOKIE_LIFETIME,
+                 replay_cache:int=REPLAY_CACHE_SIZE):
+        self.key = key or os.urandom(16)
+        self.lifetime = lifetime
+        self.replay_cache = replay_cache
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()   # (addr, isn, cookie) -> accept time, oldest first
+        self.accepted = 0
+        self.rejected = 0
+
+    def _cookie(self, ip, epoch):
+        msg = ('%s|%d' % (ip, epoch)).encode()
+        return hmac.new(self.key, msg, hashlib.sha256).digest()[:COOKIE_LEN]
+
+    def issue(self, addr, now:float=None) -> bytes:
+        """
+        Cookie for the client at addr (only its IP address counts).
+        now: the caller's clock (time.monotonic() if None), as in valid() and accept().
+        """
+        now = time.monotonic() if now is None else now
+        return self._cookie(addr[0], int(now // self.lifetime))
+
+    def valid(self, addr, cookie:bytes, now:float=None) -> bool:
+        now = time.monotonic() if now is None else now
+        epoch = int(now // self.lifetime)
+        return any(hmac.compare_digest(cookie, self._cookie(addr[0], e)) for e in (epoch, epoch - 1))
+
+    def accept(self, addr, isn:int, cookie:bytes, now:float=None) -> bool:
+        """
+        True if the data in this SYN may be delivered: valid cookie, and the
+        same SYN was not accepted before.
+        """
+        now = time.monotonic() if now is None else now
+        if not self.valid(addr, cookie, now):
+            self.rejected += 1
+            return False
+        key = (addr, isn, cookie)
+        with self._lock:
+            # forget SYNs whose cookie can no longer be valid
+            while self._seen and next(iter(self._seen.values())) < now - 2 * self.lifetime:
+                self._seen.popitem(last=False)
+            if key in self._seen or len(self._seen) >= self.replay_cache:
+                self.rejected += 1
+                return False
+            self._seen[key] = now
+            self.accepted += 1
+        return True
+
+
+# process-wide defaults, like the kernel's cookie cache and key
+client_cookies = CookieCache()
+server = FastOpenServer()
@@ -0,0 +1,199 @@
+# src/fase3/pool.py
+"""
+Client connection pool for SimpleTCPSocket.
+
+Requests to the same server reuse an established connection instead of
+paying for a UDP bind, two threads, a handshake and a FIN exchange each:
+
+    pool = ConnectionPool(max_total=32)
+    with pool.connection(('localhost', 8000)) as conn:
+        conn.send(request)
+        reply = conn.recv(4096)
+
+A released connection stays open (idle) if it is healthy: established,
+the peer has not closed, nothing is left unread and nothing is being
+retransmitted. acquire() checks again before handing an idle connection
+out; the ones that fail are closed and replaced.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from fase3.tcp_socket import SimpleTCPSocket
+
+
+def _healthy(sock):
+    if not sock.running or sock.state != 'ESTABLISHED' or sock._peer_fin:
+        return False
+    # unread bytes belong to the previous user: the next reply would follow them
+    with sock.recv_lock:
+        if len(sock.app_recv) or sock.recv_buffer:
+            return False
+    # unacknowledged data being retransmitted: the peer may be gone
+    # (the timer thread changes the send queue under send_lock)
+    with sock.send_lock:
+        front = next(iter(sock.send_buffer.values()), None)
+        return front is None or front.retx_count == 0
+
+
+class ConnectionPool:
+    """Thread-safe pool of client connections, keyed by destination address."""
+
+    def __init__(self, max_total:int=64, max_idle:int=4, idle_timeout:float=30.0,
+                 connect_timeout:float=5.0, close_timeout:float=1.0, **options):
+        """
+        max_total: connections open at once, idle and in use; acquire() evicts
+        the least recently used idle connection or waits when the pool is full.
+        max_idle: idle connections kept per destination.
+        idle_timeout: idle connections are closed after this many seconds.
+        options: for each SimpleTCPSocket (congestion, nodelay, fastopen, ...).
+        """
+        self.max_total = max_total
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.close_timeout = close_timeout
+        self.options = options
+
+        self._lock = threading.Lock()
+        self._cv = threading.Condition(self._lock)
+        self._idle = OrderedDict()     # sock -> (dest, released at), oldest first
+        self._in_use = {}              # sock -> dest
+        self._connecting = 0
+        self._closed = False
+
+        self.hits = 0          # acquire() served by an idle connection
+        self.misses = 0        # acquire() had to connect
+        self.evictions = 0     # idle connections closed for room or age
+        self.discarded = 0     # connections closed because they were unhealthy
+
+    def _open_count(self):
+        return len(self._idle) + len(self._in_use) + self._connecting
+
+    def _expire(self, now, to_close):
+        # call with _lock held; the idle list is in release order
+        while self._idle:
+            sock, (dest, released) = next(iter(self._idle.items()))
+            if now - released <= self.idle_timeout:
+                break
+            del self._idle[sock]
+            to_close.append(sock)
+            self.evictions += 1
+
+    def _take_idle(self, dest, to_close):
+        # most recently released healthy connection to dest; call with _lock held
+        for sock in reversed([s for s, (d, _) in self._idle.items() if d == dest]):
+            del self._idle[sock]
+            if _healthy(sock):
+                return sock
+            to_close.append(sock)
+            self.discarded += 1
+        return None
+
+    def _close_all(self, socks):
+        for sock in socks:
+            try:
+                sock.close(timeout=self.close_timeout)
+            except OSError:
+                pass
+
+    def acquire(self, dest, timeout=None):
+        """
+        A connection to dest: an idle one if a healthy one is kept, else a new
+        one. Raises TimeoutError if the pool stays full for `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        to_close = []
+        sock = None
+        try:
+            with self._lock:
+                while True:
+                    if self._closed:
+                        raise OSError('pool closed')
+                    self._expire(time.monotonic(), to_close)
+                    sock = self._take_idle(dest, to_close)
+                    if sock is not None:
+                        self.hits += 1
+                        self._in_use[sock] = dest
+                        return sock
+                    if self._open_count() < self.max_total:
+                        self.misses += 1
+                        self._connecting += 1
+                        break
+                    if self._idle:
+                        # full: make room by closing the least recently used idle connection
+                        victim, _ = self._idle.popitem(last=False)
+                        to_close.append(victim)
+                        self.evictions += 1
+                        continue
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError('no connection available')
+                    self._cv.wait(remaining)
+        finally:
+            self._close_all(to_close)
+
+        # connect outside the lock
+        try:
+            sock = SimpleTCPSocket(local_port=0, **self.options)
+            sock.connect(dest, timeout=self.connect_timeout)
+        except BaseException:
+            if sock is not None:
+                sock._cleanup()
+            with self._lock:
+                self._connecting -= 1
+                self._cv.notify()
+            raise
+        with self._lock:
+            self._connecting -= 1
+            self._in_use[sock] = dest
+        return sock
+
+    def release(self, sock, reuse:bool=True):
+        """Give a connection back; it is kept idle if `reuse` and it is healthy, else closed."""
+        to_close = []
+        with self._lock:
+            dest = self._in_use.pop(sock, None)
+            if dest is None:
+                raise ValueError('connection does not belong to this pool')
+            now = time.monotonic()
+            self._expire(now, to_close)
+            if not reuse or self._closed:
+                to_close.append(sock)
+            elif not _healthy(sock):
+                to_close.append(sock)
+                self.discarded += 1
+            elif sum(1 for d, _ in self._idle.values() if d == dest) >= self.max_idle:
+                to_close.append(sock)
+                self.evictions += 1
+            else:
+                self._idle[sock] = (dest, now)
+            self._cv.notify()
+        self._close_all(to_close)
+
+    @contextmanager
+    def connection(self, dest, timeout=None):
+        """acquire() / release() around a block; a connection is not reused after an exception."""
+        sock = self.acquire(dest, timeout)
+        try:
+            yield sock
+        except BaseException:
+            self.release(sock, reuse=False)
+            raise
+        self.release(sock)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'discarded': self.discarded, 'idle': len(self._idle), 'in_use': len(self._in_use)}
+
+    def close(self):
+        """Close the idle connections; ones in use are closed when released."""
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cv.notify_all()
+        self._close_all(idle)
@@ -0,0 +1,483 @@
+# src/fase3/tcp_asyncio.py
+"""
+asyncio driver for the TCP-like protocol of fase3.tcp_socket.
+
+Runs TCPConnection on an event loop instead of threads: a datagram endpoint
+per local port hands segments to its connections, timers are loop callbacks,
+and the application talks to asyncio-style streams:
+
+    reader, writer = await open_connection('localhost', 8000)
+    writer.write(b'hello')
+    await writer.drain()
+    data = await reader.read(4096)
+
+    server = await start_server(handle, 'localhost', 8000)
+
+The wire protocol is the same as SimpleTCPSocket's, so both kinds of endpoint
+talk to each other.
+"""
+
+import asyncio
+import socket
+import time
+
+from fase3.tcp_socket import TCPConnection, FLAG_SYN, HDR_LEN
+
+CLOSE_LINGER = 5.0   # how long close() waits for the FIN exchange before aborting (s)
+
+
+class _LoopSender:
+    """
+    sendto() for UnreliableChannel: its delayed sends run on timer threads,
+    and datagram transports may only be used from the loop thread.
+    """
+    def __init__(self, loop, transport):
+        self._loop = loop
+        self._transport = transport
+
+    def sendto(self, data, addr):
+        try:
+            self._loop.call_soon_threadsafe(self._send, data, addr)
+        except RuntimeError:
+            # loop already closed
+            pass
+
+    def _send(self, data, addr):
+        # the transport may have been closed while the datagram was delayed
+        if not self._transport.is_closing():
+            self._transport.sendto(data, addr)
+
+
+class AsyncTCPConnection(TCPConnection):
+    """TCPConnection whose hooks schedule work on an event loop."""
+
+    def __init__(self, loop, endpoint, **options):
+        """options: see TCPConnection (channel, congestion, recv_bufsize, ...)."""
+        super().__init__(**options)
+        self._loop = loop
+        self._endpoint = endpoint
+        if self.channel:
+            self._out = _LoopSender(loop, endpoint.transport)
+        else:
+            self._out = endpoint.transport
+        self._timer_handle = None
+        self._timer_deadline = None
+        self._connected = loop.create_future()
+        self._closed = loop.create_future()
+        self._readable = asyncio.Event()
+        self.writer = None
+
+    # ----------------------
+    # driver hooks
+    # ----------------------
+    def _wake_timer(self):
+        self._arm_timer()
+
+    def _signal_writable(self):
+        # called with send_lock held, which the writer needs: pump on the next iteration
+        if self.writer is not None:
+            self.writer._schedule_pump()
+
+    def _signal_readable(self):
+        self._readable.set()
+
+    def _signal_connected(self):
+        if not self._connected.done():
+            self._connected.set_result(None)
+
+    def _signal_closed(self):
+        if not self._closed.done():
+            self._closed.set_result(None)
+        self._loop.call_soon(self._abort)
+
+    def _signal_aborted(self):
+        # given up: waiters get self.error (ETIMEDOUT)
+        self._abort(self.error)
+
+    # ----------------------
+    # timers
+    # ----------------------
+    def _arm_timer(self):
+        # keep one loop callback at the earliest deadline of the timer heap
+        deadline = self._timers.next_deadline()
+        if deadline is None:
+            return
+        if self._timer_handle is not None:
+            if self._timer_deadline <= deadline:
+                return
+            self._timer_handle.cancel()
+        self._timer_deadline = deadline
+        delay = max(0.0, deadline - time.monotonic())
+        self._timer_handle = self._loop.call_later(delay, self._fire_timers)
+
+    def _fire_timers(self):
+        self._timer_handle = None
+        if not self.running:
+            return
+        with self.send_lock:
+            self._run_timers(time.monotonic())
+            self._arm_timer()
+
+    def _abort(self, exc=None):
+        """Tear the connection down at once (no FIN exchange)."""
+        if not self.running:
+            return
+        self.running = False
+        self.state = 'CLOSED'
+        if self._timer_handle is not None:
+            self._timer_handle.cancel()
+            self._timer_handle = None
+        self._timers.clear()
+        if not self._connected.done():
+            self._connected.set_exception(exc or ConnectionResetError('connection closed'))
+            # nobody may be waiting on it (server side)
+            self._connected.exception()
+        if not self._closed.done():
+            self._closed.set_result(None)
+        self._readable.set()
+        if self.writer is not None:
+            self.writer._connection_lost(exc)
+        self._endpoint._forget(self)
+
+
+class TCPStreamReader:
+    """Read side of a connection, in the style of asyncio.StreamReader."""
+
+    def __init__(self, conn:AsyncTCPConnection):
+        self._conn = conn
+        self._buffer = bytearray()   # bytes taken from the connection but not returned (readline)
+
+    async def _wait(self):
+        conn = self._conn
+        if conn._tfo_deferred:
+            conn._release_syn()
+        while True:
+            with conn.recv_lock:
+                if not len(conn.app_recv) and conn.error is not None:
+                    raise conn.error
+                if len(conn.app_recv) or conn._peer_fin or not conn.running:
+                    return
+                conn._readable.clear()
+            await conn._readable.wait()
+
+    def _take(self, n):
+        conn = self._conn
+        with conn.recv_lock:
+            out = conn.app_recv.read(n)
+            update = out and conn._after_read()
+        if update:
+            conn._send_window_update()
+        return out
+
+    async def read(self, n=-1):
+        """Up to n bytes (everything until end of stream if n < 0); b'' at end of stream."""
+        if n == 0:
+            return b''
+        if n < 0:
+            chunks = []
+            while True:
+                chunk = await self.read(self._conn.recv_bufsize)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+        if self._buffer:
+            out = bytes(self._buffer[:n])
+            del self._buffer[:n]
+            return out
+        await self._wait()
+        return self._take(n)
+
+    async def readexactly(self, n):
+        out = bytearray()
+        while len(out) < n:
+            chunk = await self.read(n - len(out))
+            if not chunk:
+                raise asyncio.IncompleteReadError(bytes(out), n)
+            out += chunk
+        return bytes(out)
+
+    async def readline(self):
+        """Bytes up to and including b'\\n', or whatever is left at end of stream."""
+        while True:
+            i = self._buffer.find(b'\n')
+            if i >= 0:
+                out = bytes(self._buffer[:i + 1])
+                del self._buffer[:i + 1]
+                return out
+            await self._wait()
+            chunk = self._take(self._conn.recv_bufsize)
+            if not chunk:
+                out = bytes(self._buffer)
+                self._buffer.clear()
+                return out
+            self._buffer += chunk
+
+    def at_eof(self):
+        conn = self._conn
+        return (not self._buffer and not len(conn.app_recv)
+                and (conn._peer_fin or not conn.running))
+
+
+class TCPStreamWriter:
+    """
+    Write side of a connection, in the style of asyncio.StreamWriter. write()
+    never blocks: data waits in the connection's send queue and is segmented
+    as the congestion and peer windows open (and Nagle or a cork allow);
+    drain() waits until it has all been sent.
+    """
+
+    def __init__(self, conn:AsyncTCPConnection):
+        self._conn = conn
+        conn.writer = self
+        self._pump_scheduled = False
+        self._drain_waiters = []
+        self._eof = False
+        self._closing = False
+        self._exc = None
+
+    def write(self, data):
+        if self._eof or not self._conn.running:
+            raise self._conn.error or ConnectionResetError('connection is closed')
+        if data:
+            conn = self._conn
+            with conn.send_lock:
+                # one copy, as the caller may reuse its buffer; segments are views of it
+                conn._enqueue(memoryview(bytes(data)).cast('B'))
+                conn._push()
+
+    def writelines(self, data):
+        for chunk in data:
+            self.write(chunk)
+
+    def can_write_eof(self):
+        return True
+
+    def write_eof(self):
+        """Half-close: send FIN once the queued data has gone out."""
+        if self._eof:
+            return
+        self._eof = True
+        # the connection sends the FIN after the queued data
+        self._conn._start_close()
+
+    async def drain(self):
+        if self._exc is not None:
+            raise self._exc
+        if not self._conn.running:
+            raise self._conn.error or ConnectionResetError('connection is closed')
+        if not self._conn._unsent_bytes:
+            return
+        fut = self._conn._loop.create_future()
+        self._drain_waiters.append(fut)
+        await fut
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        self.write_eof()
+        self._conn._loop.call_later(CLOSE_LINGER, self._conn._abort)
+
+    def is_closing(self):
+        return self._closing
+
+    async def wait_closed(self):
+        await asyncio.shield(self._conn._closed)
+
+    def get_extra_info(self, name, default=None):
+        conn = self._conn
+        if name == 'peername':
+            return conn.remote
+        if name == 'sockname':
+            return conn._endpoint.transport.get_extra_info('sockname')
+        if name == 'connection':
+            return conn
+        return default
+
+    # ----------------------
+    # sending
+    # ----------------------
+    def _schedule_pump(self):
+        if not self._pump_scheduled:
+            self._pump_scheduled = True
+            self._conn._loop.call_soon(self._pump)
+
+    def _pump(self):
+        """Wake drain() once the connection has sent everything queued."""
+        self._pump_scheduled = False
+        conn = self._conn
+        if not conn.running:
+            return
+        with conn.send_lock:
+            conn._push()
+            if conn._unsent_bytes:
+                return
+        self._wake_drain(None)
+
+    def _wake_drain(self, exc):
+        waiters, self._drain_waiters = self._drain_waiters, []
+        for fut in waiters:
+            if not fut.done():
+                if exc is None:
+                    fut.set_result(None)
+                else:
+                    fut.set_exception(exc)
+
+    def _connection_lost(self, exc):
+        if self._conn._unsent_bytes:
+            self._exc = exc or ConnectionResetError('connection closed with unsent data')
+            self._wake_drain(self._exc)
+        else:
+            self._wake_drain(None)
+
+
+class _TCPEndpoint(asyncio.DatagramProtocol):
+    """One UDP port: routes datagrams to its connections by peer address."""
+
+    def __init__(self, loop, options, on_accept=None, backlog=100):
+        self.loop = loop
+        self.options = options
+        self.on_accept = on_accept   # None: do not accept new connections
+        self.backlog = backlog
+        self.transport = None
+        self.conns = {}              # peer address -> AsyncTCPConnection
+        self.close_when_idle = False
+        self._idle = loop.create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        conn = self.conns.get(addr)
+        if conn is None:
+            # only a bare SYN opens a connection
+            if self.on_accept is None or len(data) < HDR_LEN or data[8] != FLAG_SYN:
+                return
+            # half-open connections hold a slot until they complete or, after
+            # synack_retries unanswered SYN-ACKs, give up and are forgotten
+            pending = sum(1 for c in self.conns.values() if not c._connected.done())
+            if pending >= self.backlog:
+                return   # the client retransmits its SYN
+            conn = AsyncTCPConnection(self.loop, self, **self.options)
+            conn.listen()
+            self.conns[addr] = conn
+            conn._connected.add_done_callback(lambda fut, conn=conn: self._accepted(conn, fut))
+        conn._process_segment(data, addr)
+
+    def _accepted(self, conn, fut):
+        if fut.cancelled() or fut.exception() is not None or self.on_accept is None:
+            return
+        self.on_accept(conn)
+
+    def error_received(self, exc):
+        # e.g. ICMP port unreachable; the retransmission timers deal with it
+        pass
+
+    def connection_lost(self, exc):
+        for conn in list(self.conns.values()):
+            conn._abort(exc)
+
+    def _add(self, addr, conn):
+        self.conns[addr] = conn
+
+    def _forget(self, conn):
+        for addr, c in list(self.conns.items()):
+            if c is conn:
+                del self.conns[addr]
+        if not self.conns and self.close_when_idle:
+            self.transport.close()
+            if not self._idle.done():
+                self._idle.set_result(None)
+
+
+class TCPServer:
+    """Returned by start_server(); close() stops accepting, wait_closed() waits for the connections."""
+
+    def __init__(self, endpoint:_TCPEndpoint):
+        self._endpoint = endpoint
+        self._tasks = set()
+
+    @property
+    def sockname(self):
+        return self._endpoint.transport.get_extra_info('sockname')
+
+    def close(self):
+        ep = self._endpoint
+        ep.on_accept = None
+        ep.close_when_idle = True
+        if not ep.conns:
+            ep._forget(None)
+
+    def is_serving(self):
+        return self._endpoint.on_accept is not None
+
+    async def wait_closed(self):
+        await asyncio.shield(self._endpoint._idle)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+        await self.wait_closed()
+
+
+async def _resolve(host, port):
+    # datagrams arrive from numeric addresses: key connections by those
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    return infos[0][4]
+
+
+async def open_connection(host, port, local_port=0, timeout=5.0, **options):
+    """
+    Connect to (host, port) and return (TCPStreamReader, TCPStreamWriter).
+    options: see TCPConnection (channel, congestion, recv_bufsize, ...).
+    """
+    loop = asyncio.get_running_loop()
+    dest = await _resolve(host, port)
+    transport, endpoint = await loop.create_datagram_endpoint(
+        lambda: _TCPEndpoint(loop, options),
+        local_addr=('localhost', local_port), family=socket.AF_INET)
+    endpoint.close_when_idle = True
+    conn = AsyncTCPConnection(loop, endpoint, **options)
+    endpoint._add(dest, conn)
+    reader, writer = TCPStreamReader(conn), TCPStreamWriter(conn)
+    if conn._start_connect(dest):
+        # Fast Open with a cached cookie: the SYN leaves with the first write
+        return reader, writer
+    try:
+        await asyncio.wait_for(asyncio.shield(conn._connected), timeout)
+    except asyncio.TimeoutError:
+        if conn.error is not None:
+            # syn_retries SYNs went unanswered
+            raise conn.error from None
+        conn._abort()
+        raise TimeoutError('connect timeout') from None
+    return reader, writer
+
+
+async def start_server(client_connected_cb, host='localhost', port=0, backlog=100, **options):
+    """
+    Accept connections on (host, port); client_connected_cb(reader, writer) is
+    called for each one and may be a coroutine function.
+    options: see TCPConnection (channel, congestion, recv_bufsize, ...).
+    """
+    loop = asyncio.get_running_loop()
+    server = None
+
+    def on_accept(conn):
+        reader, writer = TCPStreamReader(conn), TCPStreamWriter(conn)
+        res = client_connected_cb(reader, writer)
+        if asyncio.iscoroutine(res):
+            task = loop.create_task(res)
+            server._tasks.add(task)
+            task.add_done_callback(server._tasks.discard)
+
+    _, endpoint = await loop.create_datagram_endpoint(
+        lambda: _TCPEndpoint(loop, options, on_accept, backlog),
+        local_addr=(host, port), family=socket.AF_INET)
+    server = TCPServer(endpoint)
+    return server
@@ -1,6 +1,5 @@
 # src/fase3/tcp_server.py
 from fase3.tcp_socket import SimpleTCPSocket
-import time
 
 def server_example():
     server = SimpleTCPSocket(local_port=8000)
@@ -13,8 +12,7 @@ def server_example():
     while len(total) < 10240:
         chunk = conn.recv(4096)
         if not chunk:
-            time.sleep(0.01)
-            continue
+            break   # end of stream
         total += chunk
     print(f"Server received {len(total)} bytes")
     conn.close()
@@ -0,0 +1,239 @@
+# src/fase3/tcp_sim.py
+"""
+Virtual-time driver for the TCP-like protocol of fase3.tcp_socket.
+
+Runs TCPConnection inside a utils.netsim.Simulator: segments travel over a
+SimNetwork, timers are simulator events and the connection's clock is the
+simulator's. A transfer that would spend minutes in retransmission timeouts
+runs as fast as the segments can be processed, with no sockets or threads,
+and the same seeds give the same run every time:
+
+    sim = Simulator(seed=1)
+    net = SimNetwork(sim, UnreliableChannel(loss_rate=0.05, seed=1), delay=0.02)
+    server = start_server(net, 8000, on_accept)
+    conn = open_connection(net, ('localhost', 8000))
+    conn.write(data)
+    sim.run(until=lambda: conn.all_acked)
+
+Nothing blocks: write() queues, read() returns what has arrived, and
+on_data / on_accept callbacks run as simulator events.
+"""
+
+from fase3.tcp_socket import TCPConnection, FLAG_SYN, HDR_LEN
+
+CLOSE_LINGER = 5.0   # virtual seconds close() waits for the FIN exchange before aborting
+
+
+class SimTCPConnection(TCPConnection):
+    """TCPConnection whose hooks schedule work on a Simulator."""
+
+    def __init__(self, endpoint, **options):
+        """
+        options: see TCPConnection (congestion, recv_bufsize, ...); loss,
+        corruption and delay come from the network's channel.
+        """
+        self._endpoint = endpoint
+        self.sim = endpoint.net.sim
+        self._clock = self.sim.time
+        super().__init__(**options)
+        self._out = endpoint.sock
+        self._timer = None
+        self._timer_deadline = None
+        self._read_scheduled = False
+        self.connected = False
+        self.closed = False
+        self.on_data = None   # on_data(bytes): takes in-order data as it arrives (else read())
+
+    def _initial_seq(self):
+        # from the simulator's generator, so runs repeat exactly
+        return self.sim.rng.getrandbits(32)
+
+    # ----------------------
+    # driver hooks
+    # ----------------------
+    def _wake_timer(self):
+        self._arm_timer()
+
+    def _signal_writable(self):
+        # write() never blocks: nobody waits for room
+        pass
+
+    def _signal_readable(self):
+        # called with recv_lock held: hand the data over in an event of its own
+        if self.on_data is not None and not self._read_scheduled:
+            self._read_scheduled = True
+            self.sim.call_soon(self._feed)
+
+    def _signal_connected(self):
+        if not self.connected:
+            self.connected = True
+            self._endpoint._accepted(self)
+
+    def _signal_closed(self):
+        self.sim.call_soon(self._abort)
+
+    def _signal_aborted(self):
+        # given up (self.error): the endpoint forgets the connection at once
+        self._abort()
+
+    # ----------------------
+    # timers
+    # ----------------------
+    def _arm_timer(self):
+        # keep one simulator event at the earliest deadline of the timer heap
+        deadline = self._timers.next_deadline()
+        if deadline is None:
+            return
+        if self._timer is not None:
+            if self._timer_deadline <= deadline:
+                return
+            self._timer.cancel()
+        self._timer_deadline = deadline
+        self._timer = self.sim.call_at(deadline, self._fire_timers)
+
+    def _fire_timers(self):
+        self._timer = None
+        if not self.running:
+            return
+        with self.send_lock:
+            self._run_timers(self.sim.now)
+            self._arm_timer()
+
+    # ----------------------
+    # application side
+    # ----------------------
+    def write(self, data):
+        """Queue data for sending; segments leave as the windows open."""
+        if not self.running:
+            raise self.error or ConnectionResetError('connection is closed')
+        if data:
+            with self.send_lock:
+                # one copy, as the caller may reuse its buffer; segments are views of it
+                self._enqueue(memoryview(bytes(data)).cast('B'))
+                self._push()
+
+    def read(self, n=-1):
+        """
+        Up to n bytes of in-order data (all there is if n < 0); b'' if none
+        has arrived. Raises self.error once the connection has been given up.
+        """
+        if self._tfo_deferred:
+            self._release_syn()
+        with self.recv_lock:
+            if not len(self.app_recv) and self.error is not None:
+                raise self.error
+            out = self.app_recv.read(len(self.app_recv) if n < 0 else n)
+            update = out and self._after_read()
+        if update:
+            self._send_window_update()
+        return out
+
+    def _feed(self):
+        self._read_scheduled = False
+        data = self.read()
+        if data and self.on_data is not None:
+            self.on_data(data)
+
+    @property
+    def all_acked(self) -> bool:
+        """Everything written so far has been sent and acknowledged."""
+        return not (self._unsent_bytes or self.send_buffer)
+
+    @property
+    def at_eof(self) -> bool:
+        return not len(self.app_recv) and (self._peer_fin or not self.running)
+
+    def close(self):
+        """Send FIN after the queued data; abort if the exchange is not over after CLOSE_LINGER."""
+        if self._start_close():
+            self.sim.call_later(CLOSE_LINGER, self._abort)
+        elif self.state not in ('FIN_WAIT_1', 'FIN_WAIT_2', 'CLOSING', 'LAST_ACK'):
+            self._abort()
+
+    def _abort(self):
+        """Tear the connection down at once (no FIN exchange)."""
+        if not self.running:
+            return
+        self.running = False
+        self.state = 'CLOSED'
+        self.closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._timers.clear()
+        self._endpoint._forget(self)
+
+
+class SimTCPEndpoint:
+    """One SimNetwork port: routes datagrams to its connections by peer address."""
+
+    def __init__(self, net, port=0, options=None, on_accept=None, backlog=100):
+        self.net = net
+        self.options = options or {}
+        self.on_accept = on_accept   # None: do not accept new connections
+        self.backlog = backlog
+        self.conns = {}              # peer address -> SimTCPConnection
+        self.close_when_idle = False
+        self.sock = net.socket(port)
+        self.sock.handler = self._datagram
+
+    @property
+    def sockname(self):
+        return self.sock.getsockname()
+
+    def _datagram(self, data, addr):
+        conn = self.conns.get(addr)
+        if conn is None:
+            # only a bare SYN opens a connection
+            if self.on_accept is None or len(data) < HDR_LEN or data[8] != FLAG_SYN:
+                return
+            # half-open connections hold a slot until they complete or, after
+            # synack_retries unanswered SYN-ACKs, give up and are forgotten
+            pending = sum(1 for c in self.conns.values() if not c.connected)
+            if pending >= self.backlog:
+                return   # the client retransmits its SYN
+            conn = SimTCPConnection(self, **self.options)
+            conn.listen()
+            self.conns[addr] = conn
+        conn._process_segment(data, addr)
+
+    def _accepted(self, conn):
+        if self.on_accept is not None:
+            self.net.sim.call_soon(self.on_accept, conn)
+
+    def _forget(self, conn):
+        for addr, c in list(self.conns.items()):
+            if c is conn:
+                del self.conns[addr]
+        if not self.conns and self.close_when_idle:
+            self.sock.close()
+
+    def close(self):
+        """Stop accepting; the port is released once its connections are gone."""
+        self.on_accept = None
+        self.close_when_idle = True
+        if not self.conns:
+            self.sock.close()
+
+
+def open_connection(net, dest, local_port=0, **options) -> SimTCPConnection:
+    """
+    Start connecting to dest over the SimNetwork `net` and return the
+    connection at once; `connected` turns True once the simulator has run
+    the handshake. options: see TCPConnection.
+    """
+    endpoint = SimTCPEndpoint(net, local_port, options)
+    endpoint.close_when_idle = True
+    conn = SimTCPConnection(endpoint, **options)
+    endpoint.conns[dest] = conn
+    conn._start_connect(dest)
+    return conn
+
+
+def start_server(net, port, on_accept, backlog=100, **options) -> SimTCPEndpoint:
+    """
+    Accept connections on `port` of the SimNetwork `net`; on_accept(conn)
+    runs as a simulator event once each handshake completes.
+    options: see TCPConnection.
+    """
+    return SimTCPEndpoint(net, port, options, on_accept, backlog)
@@ -2,16 +2,35 @@
 """
 TCP-like sobre UDP — versão com retransmissão robusta de handshake (SYN/SYN-ACK)
 e proteção contra timeouts em canais com perda.
+
+TCPConnection holds the protocol state machine and does no I/O of its own:
+drivers feed it datagrams (_process_segment), run its timers (_run_timers)
+and give it something with sendto() to transmit with. SimpleTCPSocket is the
+threaded driver; fase3/tcp_asyncio.py is the asyncio one.
 """
 
+import os
 import socket
 import threading
 import struct
 import time
 import random
 import zlib
+import errno
+import itertools
+from collections import OrderedDict, deque
 
 from utils.simulator import UnreliableChannel
+from utils.timers import TimerHeap
+from utils.ringbuffer import RingBuffer
+from utils.pacing import Pacer
+from utils.integrity import get_codec, DEFAULT as DEFAULT_CODEC
+from utils import trace
+from utils.filemap import map_file, windows, file_span, preallocate
+from utils.udp_offload import (gso_supported, enable_gro, gso_batches, send_gso, recv_batch,
+                               set_dont_fragment)
+from fase3.congestion import make_congestion_control, DUPACK_THRESHOLD
+from fase3 import fastopen
 
 FLAG_FIN = 0x01
 FLAG_SYN = 0x02
@@ -19,377 +38,1849 @@ FLAG_ACK = 0x10
 
 HDR_FMT = '!I I B B H I'
 HDR_LEN = 16
+HDR = struct.Struct(HDR_FMT)
+HDR_NO_CK = struct.Struct('!I I B B H')   # the part covered by the checksum
+CK = struct.Struct('!I')
 MAX_SEG_DATA = 1000
 
+# header options (TCP kinds), encoded as kind(1) len(1) value, after the fixed
+# header; the hdrlen field covers fixed header + options
+OPT_MSS = 2
+OPT_WSCALE = 3
+OPT_SACK_PERM = 4
+OPT_SACK = 5
+OPT_TIMESTAMP = 8
+OPT_FASTOPEN = 34          # empty: cookie request; else the cookie (RFC 7413)
+OPT_INTEGRITY = 252        # private kind: integrity codec id (utils.integrity)
+OPT_PMTU_PROBE = 253       # experimental kinds: path MTU probe id / its echo
+OPT_PMTU_PROBE_ACK = 254
+MAX_SACK_BLOCKS = 4
+MAX_WSCALE = 14
+
+MSS_MAX = 65000      # largest payload that still fits a UDP datagram with our header
+
+# path MTU discovery (DPLPMTUD-like, RFC 8899): start at PMTU_BASE, probe the
+# candidate sizes upwards, give a size up after PMTU_MAX_PROBES lost probes
+PMTU_BASE = MAX_SEG_DATA
+PMTU_CANDIDATES = (1400, 2000, 4000, 8000, 8900, 16000, 32000, 64000)
+PMTU_MAX_PROBES = 3
+PMTU_RAISE_INTERVAL = 30.0   # search again for a larger size after this long (s)
+
+PERSIST_MAX = 60.0   # cap for the zero-window probe interval (s)
+CORK_TIMEOUT = 0.2   # a corked partial segment waits at most this long (s), as on Linux
+FILE_CHUNK = 256 * 1024   # recv_to_file() buffer when the size is not known up front
+GATHER_MIN = 16000   # smaller payloads are joined to the header: one memcpy beats sendmsg()'s setup
+RTO_MIN = 0.1
+RTO_MAX = 60.0       # cap for the backed-off retransmission timeout (s)
+MAX_RETRIES = 15     # consecutive timeouts before the connection is given up (tcp_retries2)
+SYN_RETRIES = 6      # ... of a SYN (tcp_syn_retries)
+SYNACK_RETRIES = 5   # ... of a SYN-ACK: a half-open connection is dropped after ~95 s (tcp_synack_retries)
+ACK_DELAY = 0.04     # default delayed-ACK timer (s)
+
 def checksum(data: bytes) -> int:
     return zlib.crc32(data) & 0xffffffff
 
-def pack_segment(seqnum:int, acknum:int, flags:int, window:int, data:bytes=b'') -> bytes:
-    hdr_no_ck = struct.pack('!I I B B H', seqnum, acknum, flags, HDR_LEN, window)
-    ck = checksum(hdr_no_ck + data)
-    hdr = struct.pack(HDR_FMT, seqnum, acknum, flags, HDR_LEN, window, ck)
-    return hdr + data
+def pack_option(kind:int, value:bytes=b'') -> bytes:
+    return struct.pack('!B B', kind, 2 + len(value)) + value
+
+def parse_options(raw: bytes) -> dict:
+    """kind -> value bytes. Malformed trailing bytes are ignored."""
+    opts = {}
+    i = 0
+    while i + 2 <= len(raw):
+        kind, length = raw[i], raw[i + 1]
+        if length < 2 or i + length > len(raw):
+            break
+        opts[kind] = raw[i + 2:i + length]
+        i += length
+    return opts
 
-def unpack_segment(seg: bytes):
+def encode_header(seqnum:int, acknum:int, flags:int, window:int, data=b'', options:bytes=b'',
+                  codec=None) -> bytearray:
+    """
+    Header + options for a segment carrying `data`, checksum included. The
+    payload is only read (checksum computed piece by piece), not copied.
+    The header is a new buffer each time: the send queue keeps it for
+    retransmissions.
+    codec: integrity codec (utils.integrity), CRC32 by default. SYN segments
+    always use CRC32: they are checked before both sides agree on a codec.
+    """
+    if codec is None or flags & FLAG_SYN:
+        codec = DEFAULT_CODEC
+    # packed once and appended to: cheaper per segment than pack_into a
+    # zeroed buffer and checksumming a memoryview of it
+    head = HDR_NO_CK.pack(seqnum & SEQ_MASK, acknum & SEQ_MASK, flags, HDR_LEN + len(options), window)
+    hdr = bytearray(head)
+    hdr += CK.pack(codec.compute(head, options, data))
+    hdr += options
+    return hdr
+
+def pack_segment(seqnum:int, acknum:int, flags:int, window:int, data:bytes=b'', options:bytes=b'',
+                 codec=None) -> bytes:
+    seg = encode_header(seqnum, acknum, flags, window, data, options, codec)
+    seg += data
+    return bytes(seg)
+
+def unpack_segment(seg: bytes, codec=None):
     if len(seg) < HDR_LEN:
         return None
-    seqnum, acknum, flags, hdrlen, window, ck = struct.unpack(HDR_FMT, seg[:HDR_LEN])
-    data = seg[HDR_LEN:]
-    hdr_no_ck = struct.pack('!I I B B H', seqnum, acknum, flags, hdrlen, window)
-    calc = checksum(hdr_no_ck + data)
-    return {'seq': seqnum, 'ack': acknum, 'flags': flags, 'window': window, 'ck': ck, 'calc': calc, 'data': data}
-
-class SimpleTCPSocket:
-    def __init__(self, local_port:int, channel:UnreliableChannel=None):
-        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.udp.bind(('localhost', local_port))
+    seqnum, acknum, flags, hdrlen, window, ck = HDR.unpack_from(seg)
+    if hdrlen < HDR_LEN or hdrlen > len(seg):
+        return None
+    if codec is None or flags & FLAG_SYN:
+        codec = DEFAULT_CODEC
+    view = memoryview(seg)
+    options = seg[HDR_LEN:hdrlen]
+    data = seg[hdrlen:]
+    calc = codec.compute(view[:HDR_NO_CK.size], options, view[hdrlen:]) if codec.checks else ck
+    return {'seq': seqnum, 'ack': acknum, 'flags': flags, 'window': window, 'ck': ck, 'calc': calc,
+            'options': options, 'data': data}
+
+def pack_sack(blocks) -> bytes:
+    """SACK option from (left, right) edges, right edge exclusive."""
+    return pack_option(OPT_SACK, b''.join(struct.pack('!I I', l, r) for l, r in blocks))
+
+def parse_sack(value: bytes):
+    return [struct.unpack('!I I', value[i:i + 8]) for i in range(0, len(value) - 7, 8)]
+
+def ts_clock(now: float = None) -> int:
+    # timestamp option clock: milliseconds, wrapping at 32 bits
+    return int((time.monotonic() if now is None else now) * 1000) & 0xffffffff
+
+# sequence numbers are 32-bit and wrap: add and compare modulo 2**32 (RFC 1982)
+SEQ_MASK = 0xffffffff
+
+def seq_add(seq:int, n:int) -> int:
+    return (seq + n) & SEQ_MASK
+
+def seq_diff(a:int, b:int) -> int:
+    # bytes from b up to a, with a at or after b
+    return (a - b) & SEQ_MASK
+
+def seq_lt(a:int, b:int) -> bool:
+    # a comes before b: b is less than half the sequence space ahead
+    return 0 < (b - a) & SEQ_MASK < 0x80000000
+
+def seq_leq(a:int, b:int) -> bool:
+    return a == b or seq_lt(a, b)
+
+def seg_len(flags:int, data_len:int) -> int:
+    # SYN and FIN consume one sequence number each, like in TCP
+    return data_len + (1 if flags & FLAG_SYN else 0) + (1 if flags & FLAG_FIN else 0)
+
+class SendEntry:
+    """
+    Metadata of a segment waiting in the send queue. Kept alongside the encoded
+    header so the ACK path never has to re-parse (and re-checksum) the segment.
+    """
+    __slots__ = ('seq', 'length', 'flags', 'header', 'data', 'first_sent', 'last_sent',
+                 'retx_count', 'sacked')
+
+    def __init__(self, seq:int, length:int, flags:int, header:bytes, data, now:float):
+        self.seq = seq
+        self.length = length          # sequence space consumed (data + SYN/FIN)
+        self.flags = flags
+        self.header = header          # encoded header + options, ready to (re)transmit
+        self.data = data              # payload: a view of the application's buffer
+        self.first_sent = now
+        self.last_sent = now
+        self.retx_count = 0
+        self.sacked = False           # receiver reported it in a SACK block
+
+    @property
+    def end(self) -> int:
+        return (self.seq + self.length) & SEQ_MASK
+
+class TCPConnection:
+    """
+    One endpoint of a connection. Thread-safe: segment processing and the
+    senders take send_lock / recv_lock; the _signal_* hooks and _wake_timer let
+    drivers block or schedule work without the state machine knowing how.
+    """
+    # time source of the state machine (s); fase3/tcp_sim.py swaps in virtual time
+    _clock = staticmethod(time.monotonic)
+
+    def __init__(self, channel:UnreliableChannel=None, congestion='newreno',
+                 recv_bufsize:int=256*1024, window_scaling:bool=True, sack:bool=True,
+                 timestamps:bool=True, delayed_ack:bool=True, ack_delay:float=ACK_DELAY,
+                 mss:int=MAX_SEG_DATA, pmtud:bool=False, nodelay:bool=True,
+                 send_bufsize:int=256*1024, fastopen:bool=False, pacing=None,
+                 integrity='crc32', max_retries:int=MAX_RETRIES, syn_retries:int=SYN_RETRIES,
+                 synack_retries:int=SYNACK_RETRIES):
+        """
+        congestion: name of a controller in fase3.congestion ('reno', 'newreno',
+        'cubic') or a CongestionControl instance.
+        recv_bufsize: receive buffer capacity; the advertised window is its free space.
+        window_scaling: offer the window-scale option in the handshake.
+        sack: offer selective acknowledgments (RFC 2018) in the handshake.
+        timestamps: offer the timestamp option (RFC 7323); when both sides use
+        it every ACK echoes a send time, giving RTT samples even for
+        retransmitted data.
+        delayed_ack: ACK every second full segment or after ack_delay seconds
+        instead of every segment (out-of-order data is still ACKed at once).
+        mss: largest segment payload we send or accept, advertised in the SYN;
+        the peer's value caps ours (MAX_SEG_DATA if it advertises none).
+        pmtud: start at PMTU_BASE and probe for larger segments up to the
+        negotiated MSS; sends failing with EMSGSIZE fall back to PMTU_BASE.
+        nodelay: send small writes at once; False enables Nagle's algorithm
+        (a partial segment waits while earlier data is unacknowledged).
+        send_bufsize: bytes that may wait in the send queue before send() blocks.
+        fastopen: Fast Open (fase3.fastopen). A client asks servers for a
+        cookie and, once one is cached, sends its first data in the SYN; a
+        server issues cookies and delivers data from SYNs with a valid one
+        before the handshake completes.
+        pacing: space new segments with a token bucket (utils.pacing): a rate
+        in bytes/s, or 'auto' for cwnd/srtt (times 2 in slow start, 1.2
+        after, as Linux does). None sends each window as one burst.
+        integrity: checksum codec (utils.integrity: 'crc32', 'adler32',
+        'inet16', 'none'), offered in the SYN; used once the handshake is
+        done if the peer offers the same one, else CRC32.
+        max_retries, syn_retries, synack_retries: consecutive retransmission
+        timeouts without forward progress (of our SYN, of our SYN-ACK) after
+        which the connection is given up with ETIMEDOUT. synack_retries is
+        what frees a listener's backlog slot from a client that went away.
+        """
         self.channel = channel
+        self._out = None   # set by the driver: UDP socket or datagram transport
+        self._scatter = False   # _out has sendmsg() (scatter/gather)
+        self._gso = False       # _out takes UDP_SEGMENT: a burst leaves in one sendmsg
+        self._burst = None      # datagrams held back while a burst is being queued
+        self.gso_sends = 0
 
         self.remote = None
-        self.state = 'CLOSED'
+        self._state = 'CLOSED'
+        self._irs = None   # peer's initial sequence number, from its SYN
 
         # seq/ack (byte-based)
-        self.seq = random.randint(0, 2**31-1)
+        self.seq = self._initial_seq()
         self.ack = 0
 
         # send/recv buffers and locks
         self.send_lock = threading.Lock()
-        self.send_buffer = {}   # seq -> (segment_bytes, send_time)
+        # timers (retransmission, ...) share send_lock; the timer thread sleeps
+        # on _timer_cv until the earliest deadline or until a sooner one is armed
+        self._timers = TimerHeap()
+        self._timer_cv = threading.Condition(self.send_lock)
+        # send() waits here for ACKs to open the congestion window
+        self._send_cv = threading.Condition(self.send_lock)
+        self.send_buffer = OrderedDict()   # seq -> SendEntry, in sequence order
+        # written but not yet segmented (windows closed, Nagle or cork)
+        self.send_bufsize = send_bufsize
+        self._unsent = deque()      # memoryviews of the application's writes
+        self._unsent_offset = 0     # bytes of _unsent[0] already segmented
+        self._unsent_bytes = 0
+        self.nodelay = nodelay
+        self._corked = False
+        self._fin_pending = False   # close requested while data was still unsent
         self.recv_buffer = {}   # seq -> data
-        self.app_recv = bytearray()
-        self.recv_window = 4096
+        self.recv_lock = threading.Lock()
+        # in-order data waiting for the application; recv() blocks on _recv_cv
+        self.app_recv = RingBuffer(recv_bufsize)
+        self._recv_cv = threading.Condition(self.recv_lock)
+        self._peer_fin = False
+
+        # flow control: we advertise free space in app_recv; the peer's window
+        # (already scaled) limits what we put in flight
+        self.recv_bufsize = recv_bufsize
+        self.rcv_wscale = 0
+        if window_scaling:
+            while (recv_bufsize >> self.rcv_wscale) > 0xffff and self.rcv_wscale < MAX_WSCALE:
+                self.rcv_wscale += 1
+        self._offer_wscale = window_scaling
+        self.snd_wscale = 0
+        self.peer_window = 0xffff
+        # seq and ack of the segment that last set peer_window (SND.WL1, SND.WL2)
+        self._snd_wl1 = self._snd_wl2 = None
+        self._last_adv = 0
+
+        # selective acknowledgments: enabled if both SYNs carry SACK-permitted
+        self._offer_sack = sack
+        self.sack_ok = False
+        self._last_ooo_seq = None   # receiver: latest out-of-order arrival (first SACK block)
+        self._high_sacked = None    # sender scoreboard: highest sacked byte (None: none)
+        self._hole_cursor = None    # sender: where to resume the search for holes
 
-        # RTT estimation
+        # timestamps: enabled if both SYNs carry the option
+        self._offer_ts = timestamps
+        self.ts_ok = False
+        self._ts_recent = 0         # peer's latest TSval, echoed in our TSecr
+
+        # delayed / piggybacked ACKs
+        self.delayed_ack = delayed_ack
+        self.ack_delay = ack_delay
+        self._unacked_bytes = 0     # in-order data received since our last ACK
+        self._unacked_segs = 0
+        self.acks_sent = 0
+        self.acks_saved = 0         # data segments that did not need an ACK of their own
+
+        # RTT estimation (Karn's algorithm without timestamps)
         self.estimated_rtt = 0.5
         self.dev_rtt = 0.25
+        self._rtt_sampled = False
         self.timeout_interval = self._calc_timeout()
 
+        # segment size: self.mss is what we send now, up to _mss_limit
+        # (min of both sides' MSS once the handshake is done)
+        self.mss_max = min(mss, MSS_MAX)
+        self._mss_limit = self.mss_max
+        self.mss = min(self.mss_max, PMTU_BASE) if pmtud else self.mss_max
+        self._rcv_mss = min(self.mss_max, MAX_SEG_DATA)   # largest segment seen from the peer
+        self._oversize = False      # a send failed with EMSGSIZE
+
+        # path MTU search
+        self.pmtud = pmtud
+        self._pmtu_candidates = []
+        self._pmtu_probe = None     # (id, size) of the probe in flight
+        self._pmtu_fails = 0
+        self._pmtu_ids = itertools.count(1)
+        self.pmtu_probes = 0
+
+        # congestion control / loss recovery
+        self.cc = make_congestion_control(congestion, self.mss, clock=self._clock)
+        self.dup_acks = 0
+        self._recovery = None      # None, 'fast' (3 dup ACKs) or 'rto' (timeout)
+        self._recover = self.seq   # snd_nxt when recovery started (RFC 6582)
+        self._recovery_start = 0.0
+        self.retransmissions = 0
+        self.fast_retransmits = 0
+
+        # statistics for get_info(): plain counters, updated under the lock
+        # the code path already holds
+        self.segs_sent = 0          # data/SYN/FIN segments, first transmissions
+        self.bytes_sent = 0         # payload bytes, first transmissions
+        self.bytes_retrans = 0
+        self.dup_acks_received = 0
+        self.segs_received = 0      # datagrams that passed the checksum
+        self.bytes_received = 0     # payload bytes delivered in order
+        self.checksum_errors = 0
+        self.send_blocked = 0.0     # seconds send() waited for room in the send queue
+
+        # Fast Open
+        self.fastopen = fastopen
+        self._tfo_server = None     # client: address the cookie is cached under
+        self._tfo_cookie = None     # client: cookie sent in our SYN
+        self._tfo_deferred = False  # client: SYN held back until the first send()
+        self._tfo_issue = False     # server: the peer needs a (new) cookie
+        self._tfo_early = False     # server: connection handed out at the SYN
+        self.tfo_data = 0           # bytes that arrived in a SYN and were accepted
+
+        # integrity codec: CRC32 until both SYNs carry the same one
+        self.integrity = get_codec(integrity)
+        self._codec = DEFAULT_CODEC
+
+        # pacing
+        self._pacing = pacing
+        self.pacer = None
+        if pacing is not None:
+            self.pacer = Pacer(None if pacing == 'auto' else pacing, self.mss, clock=self._clock)
+        self._pace_backlog = 0      # segments held back by the pacer last time
+
+        # zero-window probing (persist timer)
+        self._probe_due = False
+
+        # giving up on a peer that stopped answering
+        self.max_retries = max_retries
+        self.syn_retries = syn_retries
+        self.synack_retries = synack_retries
+        self.error = None          # TimeoutError (ETIMEDOUT) once given up
+        self._timeouts = 0         # consecutive RTOs without forward progress
+        self._probes = 0           # consecutive probes of a window too small for the flight
+
         # control
         self.running = True
+        self._fin_seq = None       # seq of our FIN once sent
         self._connect_event = threading.Event()
         self._close_event = threading.Event()
 
-        # threads
-        self._recv_t = threading.Thread(target=self._recv_loop, daemon=True)
-        self._retx_t = threading.Thread(target=self._retx_loop, daemon=True)
-        self._recv_t.start()
-        self._retx_t.start()
+    # ----------------------
+    # driver hooks
+    # ----------------------
+    def _wake_timer(self):
+        # a timer was armed earlier than the previous earliest deadline (send_lock held)
+        self._timer_cv.notify()
+
+    def _signal_writable(self):
+        # ACKs / window updates may let more data out (send_lock held)
+        self._send_cv.notify_all()
+
+    def _signal_readable(self):
+        # in-order data or end of stream for the application (recv_lock held)
+        self._recv_cv.notify_all()
+
+    def _signal_connected(self):
+        self._connect_event.set()
+
+    def _signal_closed(self):
+        self._close_event.set()
+
+    def _signal_aborted(self):
+        # the connection was given up (send_lock held): wake every waiter
+        self.running = False
+        self.state = 'CLOSED'
+        self._timer_cv.notify_all()
+        self._send_cv.notify_all()
+        with self.recv_lock:
+            self._recv_cv.notify_all()
+        self._connect_event.set()
+        self._close_event.set()
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        if trace.active is not None and state != self._state:
+            trace.active.emit(trace.STATE, self, old=self._state, new=state)
+        self._state = state
 
     # ----------------------
     # helpers
     # ----------------------
+    def _initial_seq(self):
+        return random.getrandbits(32)
+
     def _calc_timeout(self):
-        return max(0.1, self.estimated_rtt + 4*self.dev_rtt)
+        return min(RTO_MAX, max(RTO_MIN, self.estimated_rtt + 4*self.dev_rtt))
 
     def _update_rtt(self, sample):
-        self.estimated_rtt = 0.875*self.estimated_rtt + 0.125*sample
-        self.dev_rtt = 0.75*self.dev_rtt + 0.25*abs(sample - self.estimated_rtt)
+        if not self._rtt_sampled:
+            # first measurement replaces the initial guess (RFC 6298)
+            self._rtt_sampled = True
+            self.estimated_rtt = sample
+            self.dev_rtt = sample / 2
+        else:
+            self.estimated_rtt = 0.875*self.estimated_rtt + 0.125*sample
+            self.dev_rtt = 0.75*self.dev_rtt + 0.25*abs(sample - self.estimated_rtt)
         self.timeout_interval = self._calc_timeout()
 
-    def _send_raw(self, seg, addr):
-        if self.channel:
-            self.channel.send(seg, self.udp, addr)
+    def _send_allowance(self):
+        # bytes the congestion window lets us have in flight; the first two duplicate
+        # ACKs each let one extra new segment out (limited transmit, RFC 3042)
+        allowance = self.cc.cwnd
+        if self._recovery is None:
+            allowance += min(self.dup_acks, DUPACK_THRESHOLD - 1) * self.mss
+        return allowance
+
+    def _free_space(self):
+        return self.app_recv.free
+
+    def _window_field(self, syn=False):
+        """Value for the 16-bit window field (never scaled in SYN segments, RFC 7323)."""
+        free = self._free_space()
+        shift = 0 if syn else self.rcv_wscale
+        field = min(free >> shift, 0xffff)
+        self._last_adv = field << shift
+        return field
+
+    def _syn_options(self):
+        opts = pack_option(OPT_MSS, struct.pack('!H', self.mss_max))
+        if self._offer_wscale:
+            opts += pack_option(OPT_WSCALE, bytes([self.rcv_wscale]))
+        if self._offer_sack:
+            opts += pack_option(OPT_SACK_PERM)
+        if self._offer_ts:
+            opts += pack_option(OPT_TIMESTAMP, struct.pack('!I I', ts_clock(self._clock()), self._ts_recent))
+        if self.integrity is not DEFAULT_CODEC:
+            opts += pack_option(OPT_INTEGRITY, bytes([self.integrity.id]))
+        if self.fastopen:
+            if self.state == 'SYN_SENT':
+                # our cookie, or an empty option to ask for one
+                opts += pack_option(OPT_FASTOPEN, self._tfo_cookie or b'')
+            elif self._tfo_issue:
+                opts += pack_option(OPT_FASTOPEN, fastopen.server.issue(self.remote, self._clock()))
+        return opts
+
+    def _ts_option(self):
+        if not self.ts_ok:
+            return b''
+        return pack_option(OPT_TIMESTAMP, struct.pack('!I I', ts_clock(self._clock()), self._ts_recent))
+
+    def _negotiate(self, opts):
+        # peer's SYN / SYN-ACK options; scaling only applies if both sides offered it
+        if len(opts.get(OPT_MSS, b'')) == 2:
+            peer_mss = struct.unpack('!H', opts[OPT_MSS])[0]
         else:
-            try:
-                self.udp.sendto(seg, addr)
-            except OSError:
-                # socket may be closed; ignore
-                pass
+            peer_mss = MAX_SEG_DATA
+        self._mss_limit = max(1, min(self.mss_max, peer_mss))
+        self._rcv_mss = min(self._rcv_mss, self._mss_limit)
+        self._set_mss(min(PMTU_BASE, self._mss_limit) if self.pmtud else self._mss_limit)
+        if self._offer_wscale and OPT_WSCALE in opts and opts[OPT_WSCALE]:
+            self.snd_wscale = min(opts[OPT_WSCALE][0], MAX_WSCALE)
+        else:
+            self.snd_wscale = 0
+            self.rcv_wscale = 0
+        self.sack_ok = self._offer_sack and OPT_SACK_PERM in opts
+        self.ts_ok = self._offer_ts and len(opts.get(OPT_TIMESTAMP, b'')) == 8
+        peer_codec = opts.get(OPT_INTEGRITY, bytes([DEFAULT_CODEC.id]))
+        self._codec = self.integrity if peer_codec == bytes([self.integrity.id]) else DEFAULT_CODEC
+
+    def _set_mss(self, mss):
+        if mss != self.mss:
+            self.mss = mss
+            self.cc.set_mss(mss)
+            if self.pacer is not None:
+                self.pacer.set_rate(self.pacer.rate, mss)
+
+    def _sack_blocks(self):
+        """
+        Contiguous out-of-order ranges held in recv_buffer, the one with the most
+        recent arrival first (RFC 2018), then from highest to lowest.
+        """
+        blocks = []
+        for seq in sorted(self.recv_buffer, key=lambda s: seq_diff(s, self.ack), reverse=True):
+            end = seq_add(seq, len(self.recv_buffer[seq]))
+            if blocks and end == blocks[-1][0]:
+                blocks[-1] = (seq, blocks[-1][1])
+            else:
+                blocks.append((seq, end))
+        latest = self._last_ooo_seq
+        for i, (l, r) in enumerate(blocks):
+            if seq_diff(latest, l) < seq_diff(r, l):
+                blocks.insert(0, blocks.pop(i))
+                break
+        return blocks[:MAX_SACK_BLOCKS]
+
+    def _send_ack(self, addr):
+        opts = self._ts_option()
+        if self.sack_ok and self.recv_buffer:
+            with self.recv_lock:
+                opts += pack_sack(self._sack_blocks())
+        ackseg = pack_segment(self.seq, self.ack, FLAG_ACK, self._window_field(), options=opts,
+                              codec=self._codec)
+        # one ACK covers every segment received since the previous one
+        if self._unacked_segs > 1:
+            self.acks_saved += self._unacked_segs - 1
+        self._unacked_bytes = self._unacked_segs = 0
+        self.acks_sent += 1
+        self._send_raw(ackseg, addr)
+
+    def _ack_now(self, addr):
+        """
+        Pure ACK right away, in place of a pending delayed one: under send_lock,
+        so it cannot race the delayed-ACK timer into two identical ACKs (which
+        the peer would count as a duplicate).
+        """
+        with self.send_lock:
+            self._timers.cancel(('delack', None))
+            self._send_ack(addr)
+
+    def _delay_ack(self, nbytes, addr):
+        """In-order data arrived with no gap: ACK every 2nd full segment, else arm the delayed-ACK timer."""
+        with self.send_lock:
+            self._unacked_bytes += nbytes
+            self._unacked_segs += 1
+            if self._unacked_bytes >= 2 * self._rcv_mss:
+                self._send_ack(addr)
+            elif ('delack', None) not in self._timers:
+                self._set_timer(('delack', None), self.ack_delay)
+
+    def _set_timer(self, key, delay):
+        """Arm (or re-arm) timer `key` to fire in `delay` seconds. Call with send_lock held."""
+        deadline = self._clock() + delay
+        first = self._timers.next_deadline()
+        self._timers.schedule(key, deadline)
+        if first is None or deadline < first:
+            self._wake_timer()
+
+    def _build_header(self, seq, flags, data=b''):
+        syn = bool(flags & FLAG_SYN)
+        options = self._syn_options() if syn else self._ts_option()
+        return encode_header(seq, self.ack, flags, self._window_field(syn), data, options, self._codec)
+
+    def _rebuild_header(self, entry):
+        """
+        Fresh header (TSval, ack, window) for a retransmission. With a codec
+        that updates incrementally (inet16) the payload is not read again.
+        """
+        old = entry.header
+        if entry.data and not entry.flags & FLAG_SYN:
+            new = self._build_header(entry.seq, entry.flags)
+            if len(new) == len(old):
+                # the checksum covers header and options, skipping its own field
+                n = HDR_NO_CK.size
+                ck = self._codec.update(CK.unpack_from(old, n)[0], old[:n] + old[HDR_LEN:],
+                                        new[:n] + new[HDR_LEN:])
+                if ck is not None:
+                    CK.pack_into(new, n, ck)
+                    return new
+        return self._build_header(entry.seq, entry.flags, entry.data)
+
+    def _queue_segment(self, flags, data=b''):
+        """
+        Build a segment at self.seq, store it in the send queue and transmit it.
+        `data` is kept by reference (bytes or a memoryview slice), not copied.
+        Must be called with send_lock held. Returns the queued entry.
+        """
+        syn = bool(flags & FLAG_SYN)
+        if self._unacked_segs and not syn:
+            # the pending ACK rides on this segment
+            self.acks_saved += self._unacked_segs
+            self._unacked_bytes = self._unacked_segs = 0
+        header = self._build_header(self.seq, flags, data)
+        entry = SendEntry(self.seq, seg_len(flags, len(data)), flags, header, data, self._clock())
+        self.send_buffer[entry.seq] = entry
+        self.segs_sent += 1
+        self.bytes_sent += len(data)
+        if trace.active is not None:
+            trace.active.emit(trace.SEND, self, seq=entry.seq, len=len(data), flags=flags)
+        if self.remote and not self._send_raw(header, self.remote, data):
+            self._oversize = True
+        self._set_timer(('rtx', entry.seq), self.timeout_interval)
+        self.seq = entry.end
+        self._check_oversize()
+        return entry
+
+    def _flight_size(self):
+        # bytes sent and not yet acked; call with send_lock held
+        if not self.send_buffer:
+            return 0
+        return seq_diff(self.seq, next(iter(self.send_buffer)))
+
+    def _retransmit(self, entry, now):
+        # call with send_lock held
+        entry.last_sent = now
+        entry.retx_count += 1
+        self.retransmissions += 1
+        self.bytes_retrans += len(entry.data)
+        if trace.active is not None:
+            trace.active.emit(trace.RETRANSMIT, self, seq=entry.seq, len=len(entry.data),
+                              count=entry.retx_count, rto=self.timeout_interval)
+        if self.ts_ok:
+            # fresh TSval (and ack/window) so the echo identifies this transmission
+            entry.header = self._rebuild_header(entry)
+        if self.remote and not self._send_raw(entry.header, self.remote, entry.data):
+            # handled by _check_oversize() once the caller is done with the queue
+            self._oversize = True
+        self._set_timer(('rtx', entry.seq), self.timeout_interval)
+
+    def _handle_ack(self, acknum, window, pure=False, syn=False, sack_blocks=(), tsecr=0,
+                    seqnum=None):
+        """
+        Cumulative ACK: pop from the front of the (ordered) send queue every
+        segment fully covered by acknum. Cost is O(segments acked).
+        window: raw window field (scaled here unless syn).
+        pure: the segment carried no data/SYN/FIN, so it may count as a duplicate ACK.
+        sack_blocks: (left, right) ranges the receiver holds beyond acknum.
+        tsecr: echoed timestamp (0 if none).
+        seqnum: the segment's sequence number; None takes the window as is.
+        """
+        with self.send_lock:
+            now = self._clock()
+            window = window if syn else window << self.snd_wscale
+            # only a segment at least as new as the last one that set the window
+            # may change it (RFC 9293 3.10.7.4): a delayed older ACK must not
+            # reopen a window the peer has since closed
+            wl1 = self._snd_wl1
+            if seqnum is None or wl1 is None or seq_lt(wl1, seqnum) or (
+                    wl1 == seqnum and seq_leq(self._snd_wl2, acknum)):
+                if seqnum is not None:
+                    self._snd_wl1, self._snd_wl2 = seqnum, acknum
+                if window != self.peer_window:
+                    # a window update is never a duplicate ACK
+                    self.peer_window = window
+                    if self._probes:
+                        self._end_probing()
+                    pure = False
+                    self._probe_due = False
+                    self._timers.cancel(('persist', None))
+                    self._signal_writable()
+            buf = self.send_buffer
+            if sack_blocks:
+                self._mark_sacked(sack_blocks)
+            if buf:
+                snd_una = next(iter(buf))
+                if seq_lt(snd_una, acknum):
+                    acked = 0
+                    newest = None
+                    retransmitted = False
+                    while buf:
+                        entry = next(iter(buf.values()))
+                        # acknum is the next expected byte
+                        if seq_lt(acknum, entry.end):
+                            break
+                        buf.popitem(last=False)
+                        self._timers.cancel(('rtx', entry.seq))
+                        acked += entry.length
+                        newest = entry
+                        retransmitted = retransmitted or entry.retx_count > 0
+                    # one RTT sample per ACK. With timestamps the echo tells which
+                    # transmission is being acked. Without, Karn's algorithm: an ACK
+                    # that covers retransmitted data is ambiguous (and would mostly
+                    # measure the time spent recovering), so it is not sampled
+                    if self.ts_ok and tsecr and not syn:
+                        self._update_rtt(((ts_clock(now) - tsecr) & 0xffffffff) / 1000.0)
+                    elif newest is not None and not retransmitted:
+                        self._update_rtt(now - newest.first_sent)
+                    self.dup_acks = 0
+                    self._timeouts = 0
+                    if self._probes:
+                        self._end_probing()
+                    if not buf:
+                        self._high_sacked = None
+                    self._on_new_ack(acknum, acked, now)
+                    if self._fin_seq is not None and seq_lt(self._fin_seq, acknum):
+                        self._on_fin_acked()
+                    self._signal_writable()
+                elif acknum == snd_una and pure:
+                    self._on_dup_ack(now)
+            self._check_oversize()
+            self._push()
+
+    def _on_fin_acked(self):
+        # call with send_lock held
+        if self.state == 'FIN_WAIT_1':
+            self.state = 'FIN_WAIT_2'
+        elif self.state in ('CLOSING', 'LAST_ACK'):
+            self.state = 'CLOSED'
+            self._signal_closed()
+
+    def _mark_sacked(self, blocks):
+        # update the scoreboard; segment boundaries match the receiver's because
+        # it stores out-of-order data keyed by the seq we sent. Call with send_lock held
+        buf = self.send_buffer
+        for left, right in blocks:
+            entry = buf.get(left)
+            while entry is not None and seq_leq(entry.end, right):
+                if not entry.sacked:
+                    entry.sacked = True
+                    # the receiver has it: no more timer-driven retransmissions
+                    self._timers.cancel(('rtx', entry.seq))
+                entry = buf.get(entry.end)
+            if self._high_sacked is None or seq_lt(self._high_sacked, right):
+                self._high_sacked = right
+
+    def _next_hole(self):
+        """
+        Next unsacked segment below the highest sacked byte that was not yet
+        retransmitted in this recovery episode, or None. Call with send_lock held.
+        """
+        buf = self.send_buffer
+        entry = buf.get(self._hole_cursor) if self._hole_cursor is not None else None
+        if entry is None:
+            entry = next(iter(buf.values()), None)
+        high = self._high_sacked
+        while entry is not None and high is not None and seq_lt(entry.seq, high):
+            if not entry.sacked and entry.last_sent < self._recovery_start:
+                self._hole_cursor = entry.end
+                return entry
+            entry = buf.get(entry.end)
+        return None
+
+    def _retransmit_next_hole(self, now):
+        # with SACK, repair the next real hole; without it, assume the oldest segment is lost
+        if self.sack_ok:
+            hole = self._next_hole()
+        else:
+            hole = next(iter(self.send_buffer.values()), None)
+        if hole is not None:
+            self._retransmit(hole, now)
+
+    def _on_new_ack(self, acknum, acked, now):
+        # call with send_lock held
+        if trace.active is not None:
+            trace.active.emit(trace.ACK, self, ack=acknum, acked=acked, cwnd=self.cc.cwnd)
+        cc = self.cc
+        front = next(iter(self.send_buffer.values()), None)
+        if self._recovery == 'fast':
+            if seq_leq(self._recover, acknum) or not cc.newreno or front is None:
+                self._recovery = None
+                cc.on_exit_recovery()
+            else:
+                # partial ACK: the next hole is lost too
+                cc.on_partial_ack(acked)
+                self._retransmit_next_hole(now)
+        elif self._recovery == 'rto':
+            cc.on_ack(acked, now, self.estimated_rtt)
+            if seq_leq(self._recover, acknum) or front is None:
+                self._recovery = None
+                return
+            # go back: resend what was outstanding at the timeout, as cwnd allows
+            for entry in self.send_buffer.values():
+                if seq_diff(entry.end, acknum) > cc.cwnd:
+                    break
+                if entry.last_sent < self._recovery_start and not entry.sacked:
+                    self._retransmit(entry, now)
+        else:
+            cc.on_ack(acked, now, self.estimated_rtt)
+
+    def _on_dup_ack(self, now):
+        # call with send_lock held
+        self.dup_acks += 1
+        self.dup_acks_received += 1
+        if self._recovery == 'fast':
+            self.cc.on_dup_ack()
+            if self.sack_ok:
+                # each duplicate ACK (new SACK information) repairs one more hole
+                self._retransmit_next_hole(now)
+            self._signal_writable()
+        elif self._recovery is None and self.dup_acks < DUPACK_THRESHOLD:
+            self._signal_writable()
+        elif self._recovery is None and self.dup_acks == DUPACK_THRESHOLD:
+            # fast retransmit + enter fast recovery
+            self._recovery = 'fast'
+            self._recover = self.seq
+            self._recovery_start = now
+            self._hole_cursor = None
+            self.cc.on_enter_recovery(self._flight_size(), now)
+            self.fast_retransmits += 1
+            self._retransmit(next(iter(self.send_buffer.values())), now)
+
+    def _on_rto(self, now):
+        # retransmission timeout; call with send_lock held
+        self._timeouts += 1
+        self.cc.on_timeout(self._flight_size(), now)
+        # exponential backoff (RFC 6298 5.5); kept until a valid RTT sample
+        self.timeout_interval = min(RTO_MAX, self.timeout_interval * 2)
+        self._recovery = 'rto'
+        self._recover = self.seq
+        self._recovery_start = now
+        self.dup_acks = 0
+        entries = iter(self.send_buffer.values())
+        self._retransmit(next(entries), now)
+        # hold back the others: after an RTO they are resent as ACKs open cwnd
+        for entry in entries:
+            if not entry.sacked:
+                self._set_timer(('rtx', entry.seq), self.timeout_interval)
+
+    def _send_raw(self, seg, addr, data=b''):
+        """
+        Send one datagram: `seg` alone, or header `seg` followed by payload `data`.
+        Returns False if it was too big to send (EMSGSIZE).
+        """
+        if self._burst is not None:
+            self._burst.append((addr, len(seg) + len(data), (seg, data) if data else (seg,)))
+            return True
+        if self.channel:
+            # the channel may corrupt or hold the datagram: give it its own bytes
+            self.channel.send(b''.join((seg, data)), self._out, addr)
+            return True
+        try:
+            if not data:
+                self._out.sendto(seg, addr)
+            elif self._scatter and len(data) >= GATHER_MIN:
+                # header and payload leave as one datagram without being joined
+                self._out.sendmsg((seg, data), (), 0, addr)
+            else:
+                self._out.sendto(b''.join((seg, data)), addr)
+        except OSError as e:
+            if e.errno == errno.EMSGSIZE:
+                # bigger than the local MTU or the path MTU the kernel learned
+                # from ICMP (sockets are set to not fragment when pmtud is on)
+                return False
+            # socket may be closed; ignore
+        return True
+
+    def _begin_burst(self):
+        # call with send_lock held; datagrams are held until _end_burst()
+        if self._gso:
+            self._burst = []
+
+    def _end_burst(self):
+        """Send the held datagrams, equal-sized runs as one GSO sendmsg each."""
+        burst, self._burst = self._burst, None
+        if not burst:
+            return
+        for addr, seg_size, dgrams in gso_batches(burst):
+            if len(dgrams) > 1 and self._gso:
+                try:
+                    send_gso(self._out, dgrams, seg_size, addr)
+                    self.gso_sends += 1
+                    continue
+                except OSError as e:
+                    if e.errno != errno.EMSGSIZE:
+                        # e.g. the outgoing device cannot segment: plain sends from now on
+                        self._gso = False
+            for dgram in dgrams:
+                if not self._send_raw(dgram[0], addr, dgram[1] if len(dgram) > 1 else b''):
+                    self._oversize = True
+        self._check_oversize()
 
     # ----------------------
-    # receive loop
+    # path MTU discovery
     # ----------------------
-    def _recv_loop(self):
-        while self.running:
-            try:
-                seg_bytes, addr = self.udp.recvfrom(65536)
-            except Exception:
-                continue
-            parsed = unpack_segment(seg_bytes)
-            if parsed is None:
-                continue
-            if parsed['ck'] != parsed['calc']:
-                continue  # corrupted
-            seqnum = parsed['seq']
-            acknum = parsed['ack']
-            flags = parsed['flags']
-            data = parsed['data']
-            window = parsed['window']
-
-            # update remote address
-            self.remote = addr
-
-            # --- HANDSHAKE server side: receive SYN ---
-            if flags == FLAG_SYN and self.state == 'LISTEN':
-                # set ack to client's seq+1
-                self.ack = seqnum + 1
-                # build SYN-ACK
-                synack = pack_segment(self.seq, self.ack, FLAG_SYN | FLAG_ACK, self.recv_window)
-                # send SYN-ACK and store in send_buffer so retransmitter handles it
-                with self.send_lock:
-                    self.send_buffer[self.seq] = (synack, time.time())
-                    if self.remote:
-                        self._send_raw(synack, addr)
-                # consume seq for our SYN-ACK
-                self.seq += 1
-                self.state = 'SYN_RCVD'
-                continue
+    def _pmtu_ladder(self):
+        # candidate sizes above the current MSS, ending at the negotiated limit
+        limit = self._mss_limit
+        sizes = [c for c in PMTU_CANDIDATES if self.mss < c < limit]
+        if limit > self.mss:
+            sizes.append(limit)
+        return sizes
 
-            # --- HANDSHAKE client side: received SYN-ACK ---
-            if flags == (FLAG_SYN | FLAG_ACK) and self.state == 'SYN_SENT':
-                # record ack and send final ACK
-                self.ack = seqnum + 1
-                ackseg = pack_segment(self.seq, self.ack, FLAG_ACK, self.recv_window)
-                # send ACK (final) — don't store it in send_buffer (no data)
-                self._send_raw(ackseg, addr)
-                # mark established
-                self.state = 'ESTABLISHED'
-                # since the client may have stored its SYN in send_buffer, ACK handler will remove it
-                self._connect_event.set()
-                continue
+    def _pmtu_start(self):
+        """Begin the upward search. Call with send_lock held, once established."""
+        if self.pmtud and self._pmtu_probe is None:
+            self._pmtu_candidates = self._pmtu_ladder()
+            self._pmtu_fails = 0
+            if self._pmtu_candidates:
+                self._send_pmtu_probe()
+
+    def _send_pmtu_probe(self):
+        # a probe is padding, not stream data: it consumes no sequence space,
+        # is never delivered, and its loss does not count as congestion
+        size = self._pmtu_candidates[0]
+        probe_id = next(self._pmtu_ids)
+        options = pack_option(OPT_PMTU_PROBE, struct.pack('!I', probe_id)) + self._ts_option()
+        padding = bytes(size)
+        header = encode_header(self.seq, self.ack, FLAG_ACK, self._window_field(), padding, options,
+                               self._codec)
+        self.pmtu_probes += 1
+        if not self._send_raw(header, self.remote, padding):
+            # the local MTU already rules this size out
+            self._pmtu_done()
+            return
+        self._pmtu_probe = (probe_id, size)
+        self._set_timer(('pmtu', None), self.timeout_interval)
 
-            # --- HANDSHAKE server: final ACK from client ---
-            if flags == FLAG_ACK and self.state == 'SYN_RCVD':
-                # this ACK likely acknowledges server's SYN-ACK; send_buffer removals happen in ACK handling
-                self.state = 'ESTABLISHED'
+    def _pmtu_done(self):
+        # nothing larger gets through for now; search again later
+        self._pmtu_probe = None
+        self._pmtu_candidates = []
+        self._set_timer(('pmtu', None), PMTU_RAISE_INTERVAL)
+
+    def _on_pmtu_probe_acked(self, probe_id):
+        if self._pmtu_probe is None or self._pmtu_probe[0] != probe_id:
+            return
+        size = self._pmtu_probe[1]
+        self._pmtu_probe = None
+        self._timers.cancel(('pmtu', None))
+        self._set_mss(size)
+        self._signal_writable()
+        self._pmtu_candidates.pop(0)
+        self._pmtu_fails = 0
+        if self._pmtu_candidates:
+            self._send_pmtu_probe()
+
+    def _on_pmtu_timer(self):
+        if self.state not in ('ESTABLISHED', 'CLOSE_WAIT'):
+            self._pmtu_probe = None
+            return
+        if self._pmtu_probe is None:
+            # raise timer
+            self._pmtu_start()
+            return
+        # probe lost: the path may not carry this size
+        self._pmtu_probe = None
+        self._pmtu_fails += 1
+        if self._pmtu_fails < PMTU_MAX_PROBES:
+            self._send_pmtu_probe()
+        else:
+            self._pmtu_done()
+
+    def _send_probe_ack(self, value, addr):
+        options = pack_option(OPT_PMTU_PROBE_ACK, value) + self._ts_option()
+        self._send_raw(pack_segment(self.seq, self.ack, FLAG_ACK, self._window_field(), options=options,
+                                    codec=self._codec), addr)
+
+    def _check_oversize(self):
+        """
+        After a send failed with EMSGSIZE: fall back to the base segment size
+        and split what is queued. Call with send_lock held, outside any loop
+        over send_buffer.
+        """
+        if not self._oversize:
+            return
+        self._oversize = False
+        base = min(PMTU_BASE, self._mss_limit)
+        if self.mss > base:
+            self._set_mss(base)
+        if self.pmtud:
+            self._pmtu_done()
+        self._resegment(self._clock())
+
+    def _resegment(self, now):
+        # split queued segments larger than self.mss and send the pieces
+        old = self.send_buffer
+        if not any(len(entry.data) > self.mss for entry in old.values()):
+            return
+        self.send_buffer = OrderedDict()
+        for entry in old.values():
+            if len(entry.data) <= self.mss:
+                self.send_buffer[entry.seq] = entry
                 continue
+            self._timers.cancel(('rtx', entry.seq))
+            for off in range(0, len(entry.data), self.mss):
+                data = entry.data[off: off + self.mss]
+                seq = seq_add(entry.seq, off)
+                header = self._build_header(seq, entry.flags, data)
+                piece = SendEntry(seq, len(data), entry.flags, header, data, entry.first_sent)
+                piece.retx_count = entry.retx_count
+                piece.sacked = entry.sacked
+                piece.last_sent = now
+                self.send_buffer[seq] = piece
+                if not piece.sacked:
+                    if self.remote:
+                        self._send_raw(header, self.remote, data)
+                    self._set_timer(('rtx', seq), self.timeout_interval)
 
-            # --- ACK handling: remove acked segments from send_buffer ---
-            if flags & FLAG_ACK:
+    # ----------------------
+    # segment processing
+    # ----------------------
+    def _process_segment(self, seg_bytes, addr):
+        """Handle one received datagram (called by the driver's receive path)."""
+        parsed = unpack_segment(seg_bytes, self._codec)
+        if parsed is None:
+            return
+        if parsed['ck'] != parsed['calc']:
+            self.checksum_errors += 1
+            return  # corrupted
+        self.segs_received += 1
+        seqnum = parsed['seq']
+        acknum = parsed['ack']
+        flags = parsed['flags']
+        data = parsed['data']
+        window = parsed['window']
+        opts = parse_options(parsed['options']) if parsed['options'] else {}
+        tsecr = 0
+        if self.ts_ok and OPT_TIMESTAMP in opts:
+            tsval, tsecr = struct.unpack('!I I', opts[OPT_TIMESTAMP])
+            if seq_leq(seqnum, self.ack):
+                # not beyond the left edge of our window: echo it from now on
+                self._ts_recent = tsval
+        if OPT_PMTU_PROBE in opts:
+            # path MTU probe: answer at once; the padding is not stream data
+            self._send_probe_ack(opts[OPT_PMTU_PROBE], addr)
+            return
+        if OPT_PMTU_PROBE_ACK in opts:
+            if len(opts[OPT_PMTU_PROBE_ACK]) == 4:
                 with self.send_lock:
-                    to_delete = []
-                    for s_seq, (segb, sent_time) in list(self.send_buffer.items()):
-                        parsed_sent = unpack_segment(segb)
-                        if parsed_sent is None:
-                            continue
-                        sent_seq = parsed_sent['seq']
-                        sent_len = len(parsed_sent['data'])
-                        sent_last = sent_seq + sent_len
-                        # acknum is next expected byte: if acknum > sent_last -> this segment fully acked
-                        if acknum > sent_last:
-                            sample = time.time() - sent_time
-                            self._update_rtt(sample)
-                            to_delete.append(s_seq)
-                    for s in to_delete:
-                        try:
-                            del self.send_buffer[s]
-                        except KeyError:
-                            pass
-                # update advertised window
-                self.recv_window = window
-
-            # --- FIN handling ---
-            if flags & FLAG_FIN:
-                # ack FIN
-                self.ack = seqnum + 1
-                ackseg = pack_segment(self.seq, self.ack, FLAG_ACK, self.recv_window)
-                self._send_raw(ackseg, addr)
-
-                # transitions
-                if self.state == 'FIN_WAIT_2':
-                    self.state = 'CLOSED'
-                    self._close_event.set()
-                    continue
-                if self.state == 'ESTABLISHED':
-                    self.state = 'CLOSE_WAIT'
-                    continue
-                if self.state == 'FIN_WAIT_1':
-                    # if our FIN was already acked and we get FIN, finish
-                    if len(self.send_buffer) == 0:
-                        self.state = 'CLOSED'
-                        self._close_event.set()
-                    else:
-                        self.state = 'CLOSING'
-                    continue
+                    self._on_pmtu_probe_acked(struct.unpack('!I', opts[OPT_PMTU_PROBE_ACK])[0])
+            return
+
+        # update remote address
+        self.remote = addr
+
+        # --- HANDSHAKE server side: receive SYN ---
+        if flags == FLAG_SYN and self.state == 'LISTEN':
+            # set ack to client's seq+1
+            self._irs = seqnum
+            self.ack = seq_add(seqnum, 1)
+            self._negotiate(opts)
+            if self.ts_ok:
+                self._ts_recent = struct.unpack('!I', opts[OPT_TIMESTAMP][:4])[0]
+            self.peer_window = window
+            self._snd_wl1, self._snd_wl2 = seqnum, acknum
+            early = False
+            if self.fastopen and OPT_FASTOPEN in opts:
+                cookie = opts[OPT_FASTOPEN]
+                if data and fastopen.server.accept(addr, seqnum, cookie, self._clock()):
+                    # Fast Open: the data is the application's before the handshake ends
+                    with self.recv_lock:
+                        n = self.app_recv.write(data)
+                        self.ack = seq_add(self.ack, n)
+                        self.tfo_data += n
+                        self.bytes_received += n
+                        self._signal_readable()
+                    early = True
+                elif not fastopen.server.valid(addr, cookie, self._clock()):
+                    # cookie request, or a stale cookie: send a new one (any
+                    # data in the SYN is left for the client to send again)
+                    self._tfo_issue = True
+            # send SYN-ACK and store in send_buffer so retransmitter handles it
+            # (_queue_segment also consumes the seq of our SYN-ACK)
+            with self.send_lock:
+                self._queue_segment(FLAG_SYN | FLAG_ACK)
+            self.state = 'SYN_RCVD'
+            if early:
+                self._tfo_early = True
+                self._signal_connected()
+            return
+
+        # --- retransmitted SYN: our SYN-ACK was lost, resend it now ---
+        # (matched on the ISN: self.ack is past any Fast Open data the first copy carried)
+        if flags == FLAG_SYN and self.state == 'SYN_RCVD' and seqnum == self._irs:
+            with self.send_lock:
+                entry = next(iter(self.send_buffer.values()), None)
+                if entry is not None and entry.flags & FLAG_SYN:
+                    self._retransmit(entry, self._clock())
+            return
+
+        # --- HANDSHAKE client side: received SYN-ACK ---
+        if flags == (FLAG_SYN | FLAG_ACK) and self.state == 'SYN_SENT':
+            # record ack and send final ACK
+            self._irs = seqnum
+            self.ack = seq_add(seqnum, 1)
+            self._negotiate(opts)
+            if self.ts_ok:
+                self._ts_recent = struct.unpack('!I', opts[OPT_TIMESTAMP][:4])[0]
+            if self.fastopen:
+                self._on_fastopen_reply(opts.get(OPT_FASTOPEN), acknum)
+            # send ACK (final) — don't store it in send_buffer (no data)
+            self._ack_now(addr)
+            # the SYN-ACK acknowledges our SYN: drop it from send_buffer
+            self._handle_ack(acknum, window, syn=True, seqnum=seqnum)
+            # mark established
+            self.state = 'ESTABLISHED'
+            self._signal_connected()
+            with self.send_lock:
+                self._pmtu_start()
+                # data written while the handshake was in progress
+                self._push()
+            return
+
+        # --- retransmitted SYN-ACK: our final ACK was lost, send it again ---
+        if flags == (FLAG_SYN | FLAG_ACK) and seqnum == self._irs:
+            self._ack_now(addr)
+            return
 
-            # --- DATA handling ---
-            if data:
+        # --- HANDSHAKE server: final ACK from client ---
+        if flags & FLAG_ACK and self.state == 'SYN_RCVD':
+            # this ACK acknowledges server's SYN-ACK; removal happens in ACK handling below
+            # (it may already carry data, so don't stop here)
+            self.state = 'ESTABLISHED'
+            if not self._tfo_early:
+                self._signal_connected()
+            with self.send_lock:
+                self._pmtu_start()
+
+        # --- ACK handling: remove acked segments from send_buffer ---
+        if flags & FLAG_ACK:
+            sack_blocks = ()
+            if self.sack_ok and OPT_SACK in opts:
+                sack_blocks = parse_sack(opts[OPT_SACK])
+            self._handle_ack(acknum, window, pure=not data and not flags & (FLAG_SYN | FLAG_FIN),
+                             sack_blocks=sack_blocks, tsecr=tsecr, seqnum=seqnum)
+
+        # --- FIN handling ---
+        if flags & FLAG_FIN:
+            if seq_lt(self.ack, seqnum):
+                # data before the FIN is still missing: wait for its retransmission
+                self._ack_now(addr)
+                return
+            if seqnum == self.ack:
+                with self.recv_lock:
+                    self.ack = seq_add(seqnum, 1)
+                    # end of stream: wake readers so recv() can return b''
+                    self._peer_fin = True
+                    self._signal_readable()
+            # ack FIN (again, if it is a retransmission)
+            self._ack_now(addr)
+
+            # transitions
+            if self.state == 'FIN_WAIT_2':
+                self.state = 'CLOSED'
+                self._signal_closed()
+                return
+            if self.state == 'ESTABLISHED':
+                self.state = 'CLOSE_WAIT'
+                return
+            if self.state == 'FIN_WAIT_1':
+                # simultaneous close: our FIN is still unacked (else we would be
+                # in FIN_WAIT_2); its ACK takes us to CLOSED
+                self.state = 'CLOSING'
+                return
+
+        # --- DATA handling ---
+        if data:
+            delayable = False
+            with self.recv_lock:
+                # anything beyond the advertised right edge is dropped
+                free = self._free_space()
+                if len(data) > self._rcv_mss:
+                    self._rcv_mss = len(data)
                 if seqnum == self.ack:
-                    self.app_recv.extend(data)
-                    self.ack = seqnum + len(data)
+                    # in order, fits, and no gap before or after: the ACK may wait
+                    delayable = self.delayed_ack and not self.recv_buffer and len(data) <= free
+                    n = self.app_recv.write(data)
+                    self.ack = seq_add(seqnum, n)
                     # deliver buffered
                     while self.ack in self.recv_buffer:
                         frag = self.recv_buffer.pop(self.ack)
-                        self.app_recv.extend(frag)
-                        self.ack += len(frag)
-                elif seqnum > self.ack:
+                        self.app_recv.write(frag)
+                        self.ack = seq_add(self.ack, len(frag))
+                    delivered = seq_diff(self.ack, seqnum)
+                    self.bytes_received += delivered
+                    if trace.active is not None:
+                        trace.active.emit(trace.DELIVER, self, seq=seqnum, len=delivered)
+                    if n:
+                        self._signal_readable()
+                elif 0 < seq_diff(seqnum, self.ack) <= free - len(data):
                     if seqnum not in self.recv_buffer:
                         self.recv_buffer[seqnum] = data
-                # always send cumulative ACK
-                ackseg = pack_segment(self.seq, self.ack, FLAG_ACK, self.recv_window)
-                self._send_raw(ackseg, addr)
+                    self._last_ooo_seq = seqnum
+            # cumulative ACK: right away for out-of-order data, duplicates and
+            # gap fills (the sender's loss recovery relies on them), else delayed
+            if delayable:
+                self._delay_ack(len(data), addr)
+            else:
+                self._ack_now(addr)
+
+    def _on_fastopen_reply(self, cookie, acknum):
+        # client, on the SYN-ACK: remember a new cookie (a server without Fast
+        # Open sends none, so forget ours) and take back data it did not accept
+        if cookie:
+            fastopen.client_cookies.put(self._tfo_server, cookie)
+        elif cookie is None:
+            fastopen.client_cookies.discard(self._tfo_server)
+        with self.send_lock:
+            entry = next(iter(self.send_buffer.values()), None)
+            if entry is not None and entry.flags & FLAG_SYN and entry.data and seq_lt(acknum, entry.end):
+                self._timers.cancel(('rtx', entry.seq))
+                self._tfo_take_back(entry)
 
     # ------------------------------
-    # retransmission loop
+    # timers
     # ------------------------------
-    def _retx_loop(self):
-        while self.running:
-            time.sleep(0.05)
-            now = time.time()
-            with self.send_lock:
-                for s_seq, (segbytes, ts) in list(self.send_buffer.items()):
-                    if now - ts > self.timeout_interval:
-                        # retransmit and update timestamp
-                        self.send_buffer[s_seq] = (segbytes, now)
-                        if self.remote:
-                            self._send_raw(segbytes, self.remote)
+    def _run_timers(self, now):
+        """Fire every expired timer. Call with send_lock held."""
+        for key in self._timers.pop_expired(now):
+            if not self.running:
+                return
+            if key in self._timers:
+                # re-armed by an earlier timer of this round (an RTO holds back
+                # the rest of its burst): no longer due
+                continue
+            self._on_timer(key, now)
+        self._check_oversize()
+        self._push()
+
+    def _on_timer(self, key, now):
+        # called with send_lock held
+        kind, seq = key
+        if kind == 'delack':
+            if self._unacked_segs and self.remote:
+                self._send_ack(self.remote)
+            return
+        if kind == 'pmtu':
+            self._on_pmtu_timer()
+            return
+        if kind == 'pace':
+            # the pacer has tokens again: the _push() after the timers sends
+            return
+        if kind == 'cork':
+            # corked too long: the partial segment goes out anyway
+            self._push(force=True)
+            return
+        if kind == 'persist':
+            # the peer window stayed closed: let the sender out with a one-byte probe
+            self._probe_due = True
+            self._signal_writable()
+            return
+        if kind == 'rtx':
+            entry = self.send_buffer.get(seq)
+            if entry is None or entry.sacked:
+                return
+            front = next(iter(self.send_buffer.values()))
+            if not front.flags & FLAG_SYN and self.peer_window < self._flight_size():
+                # the window closed (or shrank below the flight): what is past its
+                # edge was refused for lack of room, not lost
+                self._probe_window(front, now)
+                return
+            # only timeouts count: fast retransmits and SACK repairs mean the peer is alive
+            if self._timeouts >= self._retry_limit(front.flags):
+                self._give_up()
+                return
+            if entry.flags & FLAG_SYN and entry.data:
+                # the path may drop SYNs with data: retry with a bare SYN
+                self._tfo_take_back(entry)
+            self._on_rto(now)
+
+    def _probe_window(self, front, now):
+        """
+        Persist: resend the oldest segment as a window probe, backed off up to
+        PERSIST_MAX, and hold the rest of the queue until then. Not a loss: no
+        congestion response and no retry limit (the peer answers probes, it
+        only has no room). Call with send_lock held.
+        """
+        self._probes += 1
+        self._retransmit(front, now)
+        delay = min(PERSIST_MAX, self.timeout_interval * 2**self._probes)
+        for entry in self.send_buffer.values():
+            if not entry.sacked:
+                self._set_timer(('rtx', entry.seq), delay)
+
+    def _end_probing(self):
+        # the window moved: what _probe_window held back is due after a normal RTO
+        self._probes = 0
+        for entry in self.send_buffer.values():
+            if not entry.sacked:
+                self._set_timer(('rtx', entry.seq), self.timeout_interval)
+
+    def _retry_limit(self, flags):
+        if flags & FLAG_SYN:
+            return self.synack_retries if flags & FLAG_ACK else self.syn_retries
+        return self.max_retries
+
+    def _give_up(self):
+        """
+        Too many timeouts without an answer: abort the connection with
+        ETIMEDOUT. Blocked calls wake up and raise self.error; the driver
+        releases the connection (_signal_aborted). Call with send_lock held.
+        """
+        self.error = TimeoutError(errno.ETIMEDOUT, 'connection timed out')
+        self._timers.clear()
+        self._signal_aborted()
 
     # ------------------------------
-    # public API
+    # non-blocking operations used by the drivers
     # ------------------------------
     def listen(self):
         self.state = 'LISTEN'
 
-    def accept(self, timeout=None):
-        start = time.time()
-        while True:
-            if self.state == 'ESTABLISHED':
-                return self
-            if timeout and (time.time() - start) > timeout:
-                raise TimeoutError('accept timeout')
-            time.sleep(0.01)
-
-    def connect(self, dest, timeout=5.0):
+    def _start_connect(self, dest):
         """
-        Send SYN repeatedly until SYN-ACK received or timeout.
-        We store the SYN in send_buffer so retransmissions are handled by _retx_loop too.
+        Send our SYN; the SYN-ACK ends up in _signal_connected(). Returns True
+        if the SYN was held back instead, to carry the first data (Fast Open
+        with a cached cookie): it leaves with the first send(), or when the
+        application reads first (_release_syn).
         """
         self.remote = dest
-        syn = pack_segment(self.seq, 0, FLAG_SYN, self.recv_window)
-        with self.send_lock:
-            self.send_buffer[self.seq] = (syn, time.time())
-            self._send_raw(syn, dest)
-        # consume seq for our SYN
-        self.seq += 1
+        # set state first: the SYN-ACK may arrive before _queue_segment returns
         self.state = 'SYN_SENT'
+        self._tfo_server = dest
+        cookie = fastopen.client_cookies.get(dest) if self.fastopen else None
+        with self.send_lock:
+            if cookie:
+                self._tfo_cookie = cookie
+                self._tfo_deferred = True
+                return True
+            # consumes seq for our SYN
+            self._queue_segment(FLAG_SYN)
+        return False
 
-        start = time.time()
-        # retransmit loop (in addition to _retx_loop): proactively re-send SYN if still in send_buffer
-        while True:
-            if self._connect_event.wait(timeout=0.1):
-                break
-            if time.time() - start > timeout:
-                break
-            # if still in send_buffer (not acked), re-send (also _retx_loop will handle)
-            with self.send_lock:
-                for s_seq, (segb, ts) in list(self.send_buffer.items()):
-                    parsed = unpack_segment(segb)
-                    if parsed and parsed['flags'] == FLAG_SYN:
-                        # resend SYN proactively
-                        self._send_raw(segb, dest)
-
-        if not self._connect_event.is_set():
-            # give a chance that ACK handler will clear buffer; then timeout
-            raise TimeoutError('connect timeout')
+    def _send_deferred_syn(self):
+        # Fast Open: the SYN carries up to one default-sized segment of queued
+        # data (the peer's MSS is not known yet). Call with send_lock held
+        self._tfo_deferred = False
+        data = b''
+        if self._unsent_bytes:
+            data = self._take_unsent(min(self.mss, MAX_SEG_DATA, self._unsent_bytes))
+        self._queue_segment(FLAG_SYN, data)
 
-    def send(self, data: bytes):
-        offset = 0
-        total_len = len(data)
-        while offset < total_len:
-            chunk = data[offset: offset + MAX_SEG_DATA]
-            seg = pack_segment(self.seq, self.ack, FLAG_ACK, self.recv_window, chunk)
-            with self.send_lock:
-                self.send_buffer[self.seq] = (seg, time.time())
-                if self.remote:
-                    self._send_raw(seg, self.remote)
-            self.seq += len(chunk)
-            offset += len(chunk)
-            # avoid unbounded queue growth: simple backoff
-            safety_start = time.time()
-            while True:
-                with self.send_lock:
-                    pending = len(self.send_buffer)
-                if pending < 500:
-                    break
-                if time.time() - safety_start > 2.0:
-                    break
-                time.sleep(0.01)
+    def _release_syn(self):
+        """Send a held-back Fast Open SYN now, with whatever data is queued."""
+        with self.send_lock:
+            if self._tfo_deferred:
+                self._send_deferred_syn()
 
-        # wait for buffer to drain with reasonable timeout
-        start = time.time()
-        max_wait = max(5.0, total_len / 1024.0)
-        while True:
-            with self.send_lock:
-                if len(self.send_buffer) == 0:
-                    break
-            if time.time() - start > max_wait:
-                break
-            time.sleep(0.01)
+    def _tfo_take_back(self, entry):
+        # the data in our SYN was not accepted (or the SYN got no answer):
+        # shrink it to a bare SYN and queue the data again to follow the
+        # handshake. Call with send_lock held
+        data = entry.data
+        entry.data = b''
+        entry.length = 1
+        entry.header = self._build_header(entry.seq, entry.flags, b'')
+        self.seq = entry.end
+        if self._unsent_offset:
+            self._unsent[0] = self._unsent[0][self._unsent_offset:]
+            self._unsent_offset = 0
+        self._unsent.appendleft(memoryview(data).cast('B'))
+        self._unsent_bytes += len(data)
 
-    def recv(self, bufsize=4096):
-        if len(self.app_recv) == 0:
-            return b''
-        out = bytes(self.app_recv[:bufsize])
-        self.app_recv = self.app_recv[bufsize:]
-        return out
+    def _send_space(self, want):
+        """
+        How many of `want` bytes may be queued right now, honouring both cwnd
+        and the peer's window: `want`, less when the peer window is smaller,
+        1 for a zero-window probe, or 0 (wait for _signal_writable).
+        Call with send_lock held.
+        """
+        flight = self._flight_size()
+        if flight == 0:
+            # nothing in flight: cwnd always allows one segment
+            if self.peer_window >= want:
+                return want
+            if self.peer_window > 0:
+                return self.peer_window
+            # zero window: wait for an update, probe with one byte if none comes
+            if self._probe_due:
+                self._probe_due = False
+                return 1
+            if ('persist', None) not in self._timers:
+                self._set_timer(('persist', None), self.timeout_interval)
+            return 0
+        if flight + want <= min(self._send_allowance(), self.peer_window):
+            return want
+        return 0
 
-    def close(self, timeout=5.0):
-        start = time.time()
+    # ------------------------------
+    # write queue: coalescing (Nagle) and corking
+    # ------------------------------
+    def _enqueue(self, view):
+        """Append a write (a byte memoryview) to the send queue. Call with send_lock held."""
+        if len(view):
+            self._unsent.append(view)
+            self._unsent_bytes += len(view)
 
-        if self.state == 'CLOSED':
-            self._cleanup()
-            return
+    def _take_unsent(self, n):
+        # next n queued bytes: a slice when one write covers them, else small
+        # writes coalesced into one segment (the only copy on this path)
+        head = self._unsent[0]
+        off = self._unsent_offset
+        if len(head) - off >= n:
+            chunk = head[off: off + n]
+            self._advance_unsent(n)
+            return chunk
+        parts = []
+        need = n
+        while need:
+            head = self._unsent[0]
+            take = min(need, len(head) - self._unsent_offset)
+            parts.append(head[self._unsent_offset: self._unsent_offset + take])
+            self._advance_unsent(take)
+            need -= take
+        return b''.join(parts)
 
-        # try draining send_buffer briefly
-        drain_deadline = time.time() + min(1.0, timeout/2.0)
-        while True:
-            with self.send_lock:
-                pending = len(self.send_buffer)
-            if pending == 0:
-                break
-            if time.time() > drain_deadline:
-                break
-            time.sleep(0.01)
+    def _advance_unsent(self, n):
+        self._unsent_offset += n
+        self._unsent_bytes -= n
+        if self._unsent_offset == len(self._unsent[0]):
+            self._unsent.popleft()
+            self._unsent_offset = 0
 
-        # active close: send FIN and wait for FIN/ACK sequence
-        if self.state in ('ESTABLISHED', 'SYN_RCVD'):
-            fin = pack_segment(self.seq, self.ack, FLAG_FIN | FLAG_ACK, self.recv_window)
-            with self.send_lock:
-                self.send_buffer[self.seq] = (fin, time.time())
-                if self.remote:
-                    self._send_raw(fin, self.remote)
-            self.seq += 1
-            self.state = 'FIN_WAIT_1'
-
-            # wait for close event or timeout
-            while True:
-                if self._close_event.wait(timeout=0.1):
+    def _push(self, force=False):
+        """
+        Segment queued bytes as far as the windows allow. A partial segment
+        waits while corked (up to CORK_TIMEOUT) or, with Nagle, while earlier
+        data is unacknowledged; `force` sends it anyway. Queues a pending FIN
+        once everything is out. Call with send_lock held.
+        """
+        if not self.remote or not self.running:
+            return
+        if self.state == 'SYN_SENT':
+            # data waits for the SYN-ACK, except what a Fast Open SYN carries
+            if self._tfo_deferred and self._unsent_bytes:
+                self._send_deferred_syn()
+            return
+        sent = 0
+        pacer = self.pacer
+        held = 0
+        if pacer is not None and self._unsent_bytes:
+            ready = self._offer_to_pacer()
+        self._begin_burst()
+        while self._unsent_bytes:
+            size = min(self.mss, self._unsent_bytes)
+            if size < self.mss and not force:
+                if self._corked:
+                    if ('cork', None) not in self._timers:
+                        self._set_timer(('cork', None), CORK_TIMEOUT)
                     break
-                if time.time() - start > timeout:
+                if not self.nodelay and self.send_buffer:
                     break
-            self._cleanup()
-            return
-
-        # passive close: if peer closed first, send our FIN and wait for ack
-        if self.state == 'CLOSE_WAIT':
-            fin = pack_segment(self.seq, self.ack, FLAG_FIN | FLAG_ACK, self.recv_window)
-            with self.send_lock:
-                self.send_buffer[self.seq] = (fin, time.time())
-                if self.remote:
-                    self._send_raw(fin, self.remote)
-            self.seq += 1
-            self.state = 'LAST_ACK'
-            while True:
-                if self._close_event.wait(timeout=0.1):
+            n = self._send_space(size)
+            if n == 0:
+                break
+            if pacer is not None:
+                wait = pacer.delay(n)
+                if wait > 0:
+                    held = max(0, ready - sent)
+                    self._set_timer(('pace', None), wait)
                     break
-                if time.time() - start > timeout:
+                pacer.consume(n)
+            self._queue_segment(FLAG_ACK, self._take_unsent(n))
+            sent += 1
+        if pacer is not None:
+            self._pace_backlog = held
+        if not self._unsent_bytes:
+            self._timers.cancel(('cork', None))
+            if self._fin_pending:
+                self._fin_pending = False
+                self._queue_fin()
+        self._end_burst()
+        if sent:
+            # room in the send queue for blocked writers
+            self._signal_writable()
+
+    def _offer_to_pacer(self):
+        """
+        Update an 'auto' pacing rate and record the burst the windows allow
+        now (segments a sender without pacing would send back to back).
+        Returns its size. Call with send_lock held.
+        """
+        if self._pacing == 'auto' and self._rtt_sampled:
+            gain = 2.0 if self.cc.in_slow_start() else 1.2
+            self.pacer.set_rate(gain * self.cc.cwnd / max(self.estimated_rtt, 1e-4))
+        flight = self._flight_size()
+        room = min(self._send_allowance(), self.peer_window) - flight
+        ready = min(-(-self._unsent_bytes // self.mss), max(room // self.mss, 0 if flight else 1))
+        # segments held back last time were already counted
+        self.pacer.offer(ready - self._pace_backlog)
+        return ready
+
+    def cork(self):
+        """Hold partial segments until uncork() (or CORK_TIMEOUT), like TCP_CORK."""
+        with self.send_lock:
+            self._corked = True
+
+    def uncork(self):
+        """Release the cork and send whatever is queued, partial segment included."""
+        with self.send_lock:
+            self._corked = False
+            self._push(force=True)
+
+    def set_nodelay(self, nodelay:bool):
+        """Toggle Nagle's algorithm (nodelay=True disables it), like TCP_NODELAY."""
+        with self.send_lock:
+            self.nodelay = nodelay
+            if nodelay:
+                self._push()
+
+    def get_info(self) -> dict:
+        """
+        Snapshot of the connection's state and counters, in the spirit of
+        Linux's TCP_INFO. Times are in seconds, windows and sizes in bytes.
+        """
+        with self.send_lock:
+            info = {
+                'state': self.state,
+                'mss': self.mss,
+                'rcv_mss': self._rcv_mss,
+                'srtt': self.estimated_rtt if self._rtt_sampled else None,
+                'rttvar': self.dev_rtt if self._rtt_sampled else None,
+                'rto': self.timeout_interval,
+                'cwnd': self.cc.cwnd,
+                'ssthresh': self.cc.ssthresh,
+                'recovery': self._recovery,
+                'unacked_segs': len(self.send_buffer),
+                'bytes_in_flight': self._flight_size(),
+                'unsent_bytes': self._unsent_bytes,
+                'peer_window': self.peer_window,
+                'segs_sent': self.segs_sent,
+                'bytes_sent': self.bytes_sent,
+                'retransmissions': self.retransmissions,
+                'fast_retransmits': self.fast_retransmits,
+                'bytes_retrans': self.bytes_retrans,
+                'dup_acks': self.dup_acks_received,
+                'acks_sent': self.acks_sent,
+                'acks_saved': self.acks_saved,
+                'send_blocked': self.send_blocked,
+                'ts_ok': self.ts_ok,
+                'sack_ok': self.sack_ok,
+                'integrity': self._codec.name,
+            }
+        with self.recv_lock:
+            info.update({
+                'advertised_window': self._last_adv,
+                'recv_queued': len(self.app_recv),
+                'ooo_segs': len(self.recv_buffer),
+                'ooo_bytes': sum(len(d) for d in self.recv_buffer.values()),
+                'segs_received': self.segs_received,
+                'bytes_received': self.bytes_received,
+                'checksum_errors': self.checksum_errors,
+            })
+        return info
+
+    def _after_read(self):
+        # window update once reading has opened the window significantly
+        # (receiver-side silly window avoidance); call with recv_lock held
+        free = self._free_space()
+        return (self._last_adv * 2 <= self.recv_bufsize
+                and free >= max(2 * self._last_adv, self._rcv_mss))
+
+    def _send_window_update(self):
+        if self.remote and self.state in ('ESTABLISHED', 'FIN_WAIT_1', 'FIN_WAIT_2'):
+            self._ack_now(self.remote)
+
+    def _start_close(self):
+        """Send our FIN if the state allows it; returns True if one was queued."""
+        with self.send_lock:
+            if self.state in ('ESTABLISHED', 'SYN_RCVD'):
+                # active close
+                self.state = 'FIN_WAIT_1'
+            elif self.state == 'CLOSE_WAIT':
+                # passive close: peer closed first
+                self.state = 'LAST_ACK'
+            else:
+                return False
+            if self._unsent_bytes:
+                # the FIN follows the queued data
+                self._fin_pending = True
+                self._corked = False
+                self._push(force=True)
+            else:
+                self._queue_fin()
+            return True
+
+    def _queue_fin(self):
+        # call with send_lock held
+        self._fin_seq = self.seq
+        self._queue_segment(FLAG_FIN | FLAG_ACK)
+
+
+class TCPStream(TCPConnection):
+    """
+    Blocking send/recv/close on top of TCPConnection (condition variables).
+    The driver that owns it feeds segments in and runs its timers.
+    """
+
+    def send(self, data):
+        """
+        Queue a bytes-like object for sending; returns once all of it is in the
+        send queue (blocking while the queue holds send_bufsize bytes), not once
+        it is acknowledged — see flush(). Segments are memoryview slices of
+        `data`; mutable buffers are copied once first, since the caller may reuse them.
+        """
+        view = memoryview(data).cast('B')
+        if not view.readonly:
+            view = memoryview(view.tobytes())
+        offset = 0
+        total_len = len(view)
+        with self.send_lock:
+            while offset < total_len and self.running:
+                room = self.send_bufsize - self._unsent_bytes
+                if room <= 0:
+                    t0 = time.monotonic()
+                    self._send_cv.wait()
+                    self.send_blocked += time.monotonic() - t0
+                    continue
+                n = min(room, total_len - offset)
+                self._enqueue(view[offset: offset + n])
+                offset += n
+                self._push()
+        if self.error is not None:
+            raise self.error
+
+    def flush(self, timeout=None):
+        """
+        Block until everything written so far is sent and acknowledged
+        (a corked or Nagle-held partial segment is sent first).
+        Returns False on timeout or if the socket closed first; raises
+        self.error if the connection was given up.
+        """
+        with self.send_lock:
+            self._push(force=True)
+            done = self._send_cv.wait_for(
+                lambda: not (self._unsent_bytes or self.send_buffer) or not self.running,
+                timeout=timeout)
+            if self.error is not None:
+                raise self.error
+            return bool(done) and self.running
+
+    def _wait_readable(self, timeout):
+        # call with recv_lock held; False if the wait timed out
+        ok = self._recv_cv.wait_for(
+            lambda: len(self.app_recv) or self._peer_fin or not self.running, timeout=timeout)
+        if ok and not len(self.app_recv) and self.error is not None:
+            raise self.error
+        return bool(ok)
+
+    def recv(self, bufsize=4096, timeout=None):
+        """
+        Block until in-order data is available and return up to bufsize bytes.
+        Returns b'' at end of stream (peer sent FIN) or once the socket is closed;
+        raises TimeoutError if `timeout` seconds pass without data, and
+        self.error once the connection has been given up.
+        """
+        if self._tfo_deferred:
+            self._release_syn()
+        with self.recv_lock:
+            if not self._wait_readable(timeout):
+                raise TimeoutError('recv timeout')
+            out = self.app_recv.read(bufsize)
+            update = out and self._after_read()
+        if update:
+            self._send_window_update()
+        return out
+
+    def recv_into(self, buffer, nbytes=0, timeout=None):
+        """
+        Like recv(), but copies straight into a writable buffer (bytearray,
+        memoryview, ...) and returns the number of bytes written (0 at end of stream).
+        """
+        view = memoryview(buffer).cast('B')
+        if nbytes:
+            view = view[:nbytes]
+        if self._tfo_deferred:
+            self._release_syn()
+        with self.recv_lock:
+            if not self._wait_readable(timeout):
+                raise TimeoutError('recv timeout')
+            n = self.app_recv.readinto(view)
+            update = n and self._after_read()
+        if update:
+            self._send_window_update()
+        return n
+
+    def send_file(self, path, offset=0, count=None):
+        """
+        Send `count` bytes of the file at `path` from `offset` (to the end of
+        the file if None) without reading it into memory: the file is mapped
+        a window at a time and segments are slices of the mapping, unmapped
+        once acknowledged. Returns the number of bytes queued, like send()
+        once they are all in the send queue.
+        """
+        with open(path, 'rb') as f:
+            fd = f.fileno()
+            count = file_span(fd, offset, count)
+            queued = 0
+            for pos, n in windows(offset, count):
+                if not self.running:
                     break
+                self.send(map_file(fd, pos, n))
+                queued += n
+        return queued
+
+    def recv_to_file(self, path, count=None, timeout=None):
+        """
+        Write the incoming stream to the file at `path` (created or truncated)
+        until end of stream, or until `count` bytes. With a count the file is
+        preallocated and data is received straight into a mapping of it, a
+        window at a time; without one, reads go through one reused buffer and
+        os.pwrite(). Returns the number of bytes written; `timeout` applies to
+        each wait for data, as in recv().
+        """
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        written = 0
+        try:
+            if count is not None:
+                preallocate(fd, count)
+                for pos, n in windows(0, count):
+                    view = map_file(fd, pos, n, write=True)
+                    got = 0
+                    while got < n:
+                        r = self.recv_into(view[got:], timeout=timeout)
+                        if not r:
+                            break
+                        got += r
+                    del view
+                    written += got
+                    if got < n:
+                        # stream ended early: drop the preallocated tail
+                        os.ftruncate(fd, written)
+                        break
+            else:
+                buf = memoryview(bytearray(FILE_CHUNK))
+                while True:
+                    r = self.recv_into(buf, timeout=timeout)
+                    if not r:
+                        break
+                    os.pwrite(fd, buf[:r], written)
+                    written += r
+        finally:
+            os.close(fd)
+        return written
+
+    def close(self, timeout=5.0):
+        deadline = time.time() + timeout
+
+        if self.state == 'CLOSED' or self._tfo_deferred:
+            # never connected (or the Fast Open SYN was never sent)
             self._cleanup()
             return
 
-        # other states: wait a bit then cleanup
-        wait_deadline = time.time() + timeout
-        while time.time() < wait_deadline:
-            if self._close_event.wait(timeout=0.1):
-                break
+        # try draining the send queue briefly
+        with self.send_lock:
+            self._corked = False
+            self._push(force=True)
+            self._send_cv.wait_for(lambda: not (self._unsent_bytes or self.send_buffer) or not self.running,
+                                   timeout=min(1.0, timeout/2.0))
+
+        # send our FIN (active or passive close) and wait for the FIN/ACK
+        # sequence to finish; other states just wait a bit
+        self._start_close()
+        self._close_event.wait(timeout=max(0.0, deadline - time.time()))
         self._cleanup()
 
     def _cleanup(self):
-        # stop threads and close socket
         self.running = False
         self._close_event.set()
-        # small pause to let retx timers finish attempts
-        time.sleep(0.01)
+        # wake the timer thread so it can exit, and any blocked sender/reader
+        with self.send_lock:
+            self._timer_cv.notify_all()
+            self._send_cv.notify_all()
+        with self.recv_lock:
+            self._recv_cv.notify_all()
+
+
+class SimpleTCPSocket(TCPStream):
+    """
+    Socket-like endpoint with its own UDP socket, receive thread and timer
+    thread. listen()/accept() serve a single peer; see TCPListener for a
+    server port shared by many connections.
+    """
+
+    def __init__(self, local_port:int, channel:UnreliableChannel=None, offload:bool=False, **options):
+        """
+        offload: use Linux UDP GSO/GRO when available (not with a channel,
+        which must see every datagram).
+        options: see TCPConnection (congestion, recv_bufsize, sack, ...).
+        """
+        super().__init__(channel, **options)
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.bind(('localhost', local_port))
+        self._out = self.udp
+        self._scatter = hasattr(self.udp, 'sendmsg')
+        offload = offload and channel is None
+        self._gso = offload and gso_supported(self.udp)
+        self._gro = offload and enable_gro(self.udp)
+        if self.pmtud:
+            # oversized sends must fail (EMSGSIZE), not be fragmented
+            set_dont_fragment(self.udp)
+
+        # threads
+        self._recv_t = threading.Thread(target=self._recv_loop, daemon=True)
+        self._timer_t = threading.Thread(target=self._timer_loop, daemon=True)
+        self._recv_t.start()
+        self._timer_t.start()
+
+    # ----------------------
+    # receive loop
+    # ----------------------
+    def _recv_loop(self):
+        while self.running:
+            try:
+                if self._gro:
+                    segs, addr = recv_batch(self.udp)
+                else:
+                    seg_bytes, addr = self.udp.recvfrom(65536)
+                    segs = (seg_bytes,)
+            except Exception:
+                continue
+            for seg_bytes in segs:
+                self._process_segment(seg_bytes, addr)
+
+    # ------------------------------
+    # timer loop (retransmissions, delayed ACKs, persist)
+    # ------------------------------
+    def _timer_loop(self):
+        with self.send_lock:
+            while self.running:
+                deadline = self._timers.next_deadline()
+                now = time.monotonic()
+                if deadline is None:
+                    # idle: sleep until a timer is armed or the socket closes
+                    self._timer_cv.wait()
+                    continue
+                if deadline > now:
+                    self._timer_cv.wait(deadline - now)
+                    continue
+                self._run_timers(now)
+
+    # ------------------------------
+    # public API
+    # ------------------------------
+    def accept(self, timeout=None):
+        if not self._connect_event.wait(timeout=timeout):
+            raise TimeoutError('accept timeout')
+        return self
+
+    def connect(self, dest, timeout=5.0):
+        """
+        Send SYN and wait until SYN-ACK received or timeout.
+        The SYN is stored in send_buffer, so its retransmissions are driven by
+        the retransmission timer like any other segment.
+        With fastopen and a cookie cached for dest, return at once instead:
+        the SYN leaves with the first send() and carries its data.
+        """
+        if self._start_connect(dest):
+            return
+        if not self._connect_event.wait(timeout=timeout):
+            raise TimeoutError('connect timeout')
+        if self.error is not None:
+            # syn_retries SYNs went unanswered
+            raise self.error
+
+    def _signal_aborted(self):
+        super()._signal_aborted()
+        # the receive thread sees running == False and exits
+        try:
+            self.udp.close()
+        except OSError:
+            pass
+
+    def _cleanup(self):
+        # stop threads and close socket
+        super()._cleanup()
         try:
             self.udp.close()
         except:
@@ -400,3 +1891,180 @@ class SimpleTCPSocket:
             self._cleanup()
         except:
             pass
+
+
+class _ListenerConnection(TCPStream):
+    """Connection accepted by a TCPListener: shares its UDP socket and threads."""
+
+    def __init__(self, listener, **options):
+        super().__init__(**options)
+        self._listener = listener
+        self._out = listener.udp
+        self._scatter = hasattr(listener.udp, 'sendmsg')
+        self._gso = listener._gso
+
+    def _wake_timer(self):
+        # send_lock held; the listener's timer thread serves every connection
+        self._listener._schedule(self, self._timers.next_deadline())
+
+    def _signal_connected(self):
+        super()._signal_connected()
+        self._listener._on_established(self)
+
+    def _signal_aborted(self):
+        # e.g. a half-open connection whose SYN-ACKs went unanswered: free its backlog slot
+        super()._signal_aborted()
+        self._listener._forget(self)
+
+    def _cleanup(self):
+        super()._cleanup()
+        self._listener._forget(self)
+
+
+class TCPListener:
+    """
+    Server port shared by many connections. One receive thread demultiplexes
+    datagrams by peer address into per-connection state; one timer thread
+    runs the timers of all of them. A bare SYN from an unknown address opens
+    a connection unless `backlog` handshakes/unaccepted connections are
+    already pending (the client then retransmits its SYN). A handshake whose
+    SYN-ACK goes unanswered synack_retries times is dropped, so clients that
+    went away (or spoofed SYNs) only hold a slot for a while.
+    """
+
+    def __init__(self, local_port:int, channel:UnreliableChannel=None, backlog:int=16,
+                 offload:bool=False, **options):
+        """
+        offload: use Linux UDP GSO/GRO when available (see SimpleTCPSocket).
+        options: see TCPConnection (congestion, recv_bufsize, sack, ...).
+        """
+        self.channel = channel
+        self.backlog = backlog
+        self._options = options
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.bind(('localhost', local_port))
+        offload = offload and channel is None
+        self._gso = offload and gso_supported(self.udp)
+        self._gro = offload and enable_gro(self.udp)
+        if options.get('pmtud'):
+            set_dont_fragment(self.udp)
+
+        self._lock = threading.Lock()
+        self._conns = {}                 # peer address -> _ListenerConnection
+        self._accept_queue = deque()     # established, not yet accepted
+        self._accept_cv = threading.Condition(self._lock)
+        # per-connection earliest deadlines, keyed by connection
+        self._timers = TimerHeap()
+        self._timer_cv = threading.Condition(self._lock)
+
+        self.running = True
+        self._recv_t = threading.Thread(target=self._recv_loop, daemon=True)
+        self._timer_t = threading.Thread(target=self._timer_loop, daemon=True)
+        self._recv_t.start()
+        self._timer_t.start()
+
+    def getsockname(self):
+        return self.udp.getsockname()
+
+    def _pending(self):
+        # handshakes in progress + connections waiting in accept(); _lock held.
+        # A Fast Open connection handed out at its SYN is in the accept queue
+        # (or accepted) already: it does not count as half-open too
+        half_open = sum(1 for c in self._conns.values()
+                        if c.state == 'SYN_RCVD' and not c._tfo_early)
+        return half_open + len(self._accept_queue)
+
+    def _recv_loop(self):
+        while self.running:
+            try:
+                if self._gro:
+                    segs, addr = recv_batch(self.udp)
+                else:
+                    seg_bytes, addr = self.udp.recvfrom(65536)
+                    segs = (seg_bytes,)
+            except Exception:
+                continue
+            for seg_bytes in segs:
+                self._dispatch(seg_bytes, addr)
+
+    def _dispatch(self, seg_bytes, addr):
+        with self._lock:
+            conn = self._conns.get(addr)
+            if conn is None:
+                # only a bare SYN opens a connection
+                if len(seg_bytes) < HDR_LEN or seg_bytes[8] != FLAG_SYN:
+                    return
+                if self._pending() >= self.backlog:
+                    return
+                conn = _ListenerConnection(self, channel=self.channel, **self._options)
+                conn.listen()
+                self._conns[addr] = conn
+        conn._process_segment(seg_bytes, addr)
+
+    def _timer_loop(self):
+        while self.running:
+            with self._lock:
+                deadline = self._timers.next_deadline()
+                now = time.monotonic()
+                if deadline is None:
+                    self._timer_cv.wait()
+                    continue
+                if deadline > now:
+                    self._timer_cv.wait(deadline - now)
+                    continue
+                expired = self._timers.pop_expired(now)
+            # lock order is connection send_lock -> listener lock, so run the
+            # connections' timers without holding ours
+            for conn in expired:
+                with conn.send_lock:
+                    if not conn.running:
+                        continue
+                    conn._run_timers(time.monotonic())
+                    self._schedule(conn, conn._timers.next_deadline())
+
+    def _schedule(self, conn, deadline):
+        with self._lock:
+            if deadline is None:
+                self._timers.cancel(conn)
+                return
+            first = self._timers.next_deadline()
+            self._timers.schedule(conn, deadline)
+            if first is None or deadline < first:
+                self._timer_cv.notify()
+
+    def _on_established(self, conn):
+        with self._lock:
+            if self.running:
+                self._accept_queue.append(conn)
+                self._accept_cv.notify()
+
+    def _forget(self, conn):
+        with self._lock:
+            if self._conns.get(conn.remote) is conn:
+                del self._conns[conn.remote]
+            self._timers.cancel(conn)
+
+    def accept(self, timeout=None):
+        """Next established connection; raises TimeoutError if none arrives in time."""
+        with self._lock:
+            if not self._accept_cv.wait_for(lambda: self._accept_queue or not self.running,
+                                            timeout=timeout):
+                raise TimeoutError('accept timeout')
+            if not self._accept_queue:
+                raise OSError('listener closed')
+            return self._accept_queue.popleft()
+
+    def close(self):
+        """Stop listening and tear down every connection still open on this port."""
+        with self._lock:
+            self.running = False
+            conns = list(self._conns.values())
+            self._accept_queue.clear()
+            self._accept_cv.notify_all()
+            self._timer_cv.notify_all()
+        for conn in conns:
+            conn._cleanup()
+        try:
+            self.udp.close()
+        except OSError:
+            pass
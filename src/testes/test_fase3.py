@@ -1,10 +1,19 @@
 # src/testes/test_fase3.py
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import socket
 import threading
 import time
+import errno
 from utils.simulator import UnreliableChannel
-from fase3.tcp_socket import SimpleTCPSocket
+from fase3.tcp_socket import SimpleTCPSocket, TCPListener, FLAG_ACK, ts_clock, PMTU_BASE, unpack_segment
+from fase3.congestion import NewRenoCC, CubicCC
+from fase3 import fastopen
+from fase3.pool import ConnectionPool
+from fase3.tcp_asyncio import open_connection, start_server
+from fase3 import tcp_sim
+from utils.netsim import Simulator, SimNetwork
+import asyncio
 
 def test_handshake_and_transfer():
     print("\n=== Test: handshake + 10KB transfer ===")
@@ -18,8 +27,7 @@ def test_handshake_and_transfer():
         while len(buf) < 10240:
             chunk = conn.recv(4096)
             if not chunk:
-                time.sleep(0.01)
-                continue
+                break   # end of stream
             buf += chunk
         print("Server got:", len(buf))
         conn.close()
@@ -48,8 +56,7 @@ def test_with_loss():
         while len(buf) < 1024*50:
             chunk = conn.recv(4096)
             if not chunk:
-                time.sleep(0.01)
-                continue
+                break   # end of stream
             buf += chunk
         print("Server got:", len(buf))
         conn.close()
@@ -66,6 +73,1205 @@ def test_with_loss():
     time.sleep(0.5)
     print("Loss test finished")
 
+def test_segment_encoding():
+    print("\n=== Test: header encoding / scatter-gather segments ===")
+    import struct, zlib
+    from fase3.tcp_socket import pack_segment, unpack_segment, encode_header, HDR_FMT, pack_option
+    opts = pack_option(8, b'12345678')
+    data = b'payload' * 10
+    # same wire format as packing the header twice and checksumming a concatenation
+    hdrlen = 16 + len(opts)
+    ck = zlib.crc32(struct.pack('!I I B B H', 7, 9, FLAG_ACK, hdrlen, 500) + opts + data)
+    expected = struct.pack(HDR_FMT, 7, 9, FLAG_ACK, hdrlen, 500, ck) + opts + data
+    assert pack_segment(7, 9, FLAG_ACK, 500, data, opts) == expected
+    assert bytes(encode_header(7, 9, FLAG_ACK, 500, memoryview(data), opts)) == expected[:hdrlen]
+    parsed = unpack_segment(expected)
+    assert parsed['ck'] == parsed['calc'] and parsed['data'] == data and parsed['options'] == opts
+    corrupted = bytearray(expected)
+    corrupted[-1] ^= 0xff
+    parsed = unpack_segment(bytes(corrupted))
+    assert parsed['ck'] != parsed['calc']
+
+    # queued segments reference the application's buffer instead of copying it
+    sock = SimpleTCPSocket(local_port=0)
+    payload = b'G' * 3000
+    view = memoryview(payload)
+    with sock.send_lock:
+        entry = sock._queue_segment(FLAG_ACK, view[1000:2000])
+    assert entry.data.obj is payload
+    sock.close()
+    print("Segment encoding test finished")
+
+def test_send_queue_cumulative_ack():
+    print("\n=== Test: cumulative ACK pops only covered segments ===")
+    sock = SimpleTCPSocket(local_port=0)
+    with sock.send_lock:
+        entries = [sock._queue_segment(FLAG_ACK, b'C' * 100) for _ in range(5)]
+    # ACK in the middle of the third segment: only the first two are released
+    sock._handle_ack(entries[2].seq + 50, 0xffff)
+    assert list(sock.send_buffer) == [e.seq for e in entries[2:]]
+    sock._handle_ack(entries[-1].end, 0xffff)
+    assert len(sock.send_buffer) == 0
+    sock.close()
+    print("Send queue test finished")
+
+def test_retransmit_follows_rto():
+    print("\n=== Test: retransmission timer tracks RTO, with exponential backoff ===")
+    import socket
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('localhost', 0))   # peer that never answers
+    sock = SimpleTCPSocket(local_port=0)
+    sock.remote = sink.getsockname()
+    sock.timeout_interval = 0.02
+    with sock.send_lock:
+        entry = sock._queue_segment(FLAG_ACK, b'D' * 10)
+    # timeouts at 0.02, +0.04, +0.08, +0.16 s
+    time.sleep(0.25)
+    with sock.send_lock:
+        retx, rto = entry.retx_count, sock.timeout_interval
+    # a fixed 20 ms interval would have given ~12 retransmissions
+    assert 2 <= retx <= 4, retx
+    assert abs(rto - 0.02 * 2**retx) < 1e-9, rto
+    sock.close()
+    sink.close()
+    print("Retransmit timer test finished")
+
+def test_retry_limit():
+    print("\n=== Test: a silent peer is given up with ETIMEDOUT ===")
+    from fase3.tcp_socket import MAX_RETRIES
+    sim = Simulator(seed=6)
+    channel = UnreliableChannel(seed=6)
+    net = SimNetwork(sim, channel, delay=0.02)
+    tcp_sim.start_server(net, 8250, lambda conn: None)
+    client = tcp_sim.open_connection(net, ('localhost', 8250), local_port=9250)
+    assert sim.run(until=lambda: client.connected, limit=5)
+    channel.loss_rate = 1.0   # the peer vanishes
+    client.write(b'x' * 5000)
+    assert sim.run(until=lambda: client.closed, limit=3600)
+    assert isinstance(client.error, TimeoutError) and client.error.errno == errno.ETIMEDOUT
+    assert client.get_info()['state'] == 'CLOSED'
+    assert client.retransmissions == MAX_RETRIES
+    # the endpoint released its port, and nothing is left to fire
+    assert ('localhost', 9250) not in net._sockets
+    try:
+        client.write(b'y')
+        assert False, 'write on a connection that was given up'
+    except TimeoutError:
+        pass
+    assert sim.run(limit=sim.now + 3600)
+
+    # threaded: connect() to a port that never answers gives up after syn_retries
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('localhost', 0))
+    sock = SimpleTCPSocket(local_port=0, syn_retries=1)
+    start = time.monotonic()
+    try:
+        sock.connect(sink.getsockname(), timeout=20)
+        assert False, 'connect to a silent port should fail'
+    except TimeoutError as e:
+        assert e.errno == errno.ETIMEDOUT, e
+    # initial RTO 1.5 s, then 3 s: given up long before the connect timeout
+    assert time.monotonic() - start < 10
+    assert not sock.running and sock.state == 'CLOSED'
+    sock.close()
+    sink.close()
+    print("Retry limit test finished")
+
+def test_rto_burst():
+    print("\n=== Test: timers of one burst expiring together are one RTO ===")
+    sim = Simulator(seed=6)
+    channel = UnreliableChannel(seed=6)
+    net = SimNetwork(sim, channel, delay=0.02)
+    tcp_sim.start_server(net, 8255, lambda conn: None)
+    client = tcp_sim.open_connection(net, ('localhost', 8255), local_port=9255)
+    assert sim.run(until=lambda: client.connected, limit=5)
+    channel.loss_rate = 1.0
+    client.write(b'x' * 5000)
+    # five segments sent at the same instant: their timers share one deadline
+    assert len({e.first_sent for e in client.send_buffer.values()}) == 1
+    rto = client.timeout_interval
+    assert sim.run(until=lambda: client.retransmissions, limit=sim.now + 10)
+    sim.run(limit=sim.now + rto / 2)
+    print("retransmissions:", client.retransmissions, "RTO:", rto, "->", client.timeout_interval)
+    # one backoff, one retransmission of the front segment
+    assert client.retransmissions == 1 and client.timeout_interval == 2 * rto
+    client._abort()
+
+def test_slow_reader():
+    print("\n=== Test: a reader that pauses does not time the connection out ===")
+    sim = Simulator(seed=2)
+    channel = UnreliableChannel(delay_range=(0.0, 0.03), seed=2)
+    net = SimNetwork(sim, channel, delay=0.02)
+    accepted = []
+    tcp_sim.start_server(net, 8256, accepted.append, recv_bufsize=10000)
+    # a closed window is probed, not timed out: even a limit of 2 must hold
+    client = tcp_sim.open_connection(net, ('localhost', 8256), local_port=9256, max_retries=2)
+    assert sim.run(until=lambda: accepted, limit=5)
+    conn = accepted[0]
+    data = os.urandom(200 * 1000)
+    client.write(data)
+    # the application reads nothing for 30 s: the window fills and stays closed
+    rto = client.timeout_interval
+    sim.run(limit=sim.now + 30)
+    assert client.error is None and client.state == 'ESTABLISHED'
+    # persist: no backoff of the RTO, no congestion response
+    assert client._timeouts == 0 and client.timeout_interval <= rto
+    got = bytearray()
+    while len(got) < len(data) and client.error is None and sim.now < 600:
+        got += conn.read()
+        sim.run(limit=sim.now + 0.05)
+    print("retransmissions:", client.retransmissions, "virtual time:", round(sim.now, 1))
+    assert bytes(got) == data and client.error is None
+    # the queue held back while probing resumes promptly once the window opens
+    assert sim.now < 45
+    # forward progress resets the count of consecutive timeouts
+    assert client._timeouts == 0
+    client._abort()
+    conn._abort()
+
+def test_karn_and_timestamps():
+    print("\n=== Test: Karn's algorithm / timestamp RTT samples ===")
+    sock = SimpleTCPSocket(local_port=0)
+    sock._rtt_sampled = True
+    rtt = sock.estimated_rtt
+    with sock.send_lock:
+        entry = sock._queue_segment(FLAG_ACK, b'E' * 100)
+        entry.first_sent -= 5.0          # would be a huge sample
+        sock._retransmit(entry, time.monotonic())
+    # ambiguous ACK of retransmitted data: no sample without timestamps
+    sock._handle_ack(entry.end, 0xffff)
+    assert sock.estimated_rtt == rtt
+    # with timestamps the echo gives the RTT of the retransmission
+    sock.ts_ok = True
+    with sock.send_lock:
+        entry = sock._queue_segment(FLAG_ACK, b'E' * 100)
+        entry.first_sent -= 5.0
+        sock._retransmit(entry, time.monotonic())
+    sock._handle_ack(entry.end, 0xffff, tsecr=(ts_clock() - 200) & 0xffffffff)
+    assert abs(sock.estimated_rtt - (0.875 * rtt + 0.125 * 0.2)) < 0.001, sock.estimated_rtt
+    sock.close()
+
+    # negotiated end to end
+    server = SimpleTCPSocket(local_port=8080)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9080)
+    client.connect(('localhost', 8080))
+    conn = server.accept(timeout=5)
+    assert client.ts_ok and conn.ts_ok
+    client.send(b'T' * 5000)
+    buf = b''
+    while len(buf) < 5000:
+        buf += conn.recv(4096, timeout=5)
+    assert client._rtt_sampled and client.estimated_rtt < 0.1
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+    print("Karn / timestamp test finished")
+
+def test_congestion_control():
+    print("\n=== Test: NewReno / CUBIC window reactions ===")
+    mss = 1000
+    reno = NewRenoCC(mss)
+    start = reno.cwnd
+    reno.on_ack(mss, time.monotonic(), 0.01)
+    assert reno.cwnd == start + mss          # slow start
+    reno.on_enter_recovery(20 * mss, time.monotonic())
+    assert reno.ssthresh == 10 * mss and reno.cwnd == 13 * mss
+    reno.on_exit_recovery()
+    assert reno.cwnd == reno.ssthresh
+    reno.on_timeout(8 * mss, time.monotonic())
+    assert reno.cwnd == mss and reno.ssthresh == 4 * mss
+
+    cubic = CubicCC(mss)
+    cubic.cwnd = 100 * mss
+    cubic.on_enter_recovery(100 * mss, time.monotonic())
+    assert cubic.ssthresh == 70 * mss        # beta = 0.7
+    events = [e[1] for e in cubic.trace]
+    assert events == ['init', 'fast_retransmit']
+    print("Congestion control test finished")
+
+def test_flow_control_and_window_scale():
+    print("\n=== Test: receiver-driven flow control + window scaling ===")
+    server = SimpleTCPSocket(local_port=8020, recv_bufsize=4000)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9040, recv_bufsize=1024*1024)
+    client.connect(('localhost', 8020))
+    conn = server.accept(timeout=5)
+    # both offered the option: client scales its window by 2**5, server does not need to
+    assert client.rcv_wscale == 5 and conn.snd_wscale == 5
+    assert conn.rcv_wscale == 0 and client.snd_wscale == 0
+
+    data = bytes(range(256)) * 80   # 20 KB, 5x the server buffer
+    t = threading.Thread(target=client.send, args=(data,), daemon=True)
+    t.start()
+    time.sleep(0.5)
+    # nobody reads yet: the sender must stop at the advertised buffer space
+    assert len(conn.app_recv) <= 4000
+    assert client.peer_window == 0
+    buf = bytearray(len(data))
+    got = 0
+    while got < len(data):
+        n = conn.recv_into(memoryview(buf)[got:], timeout=20)
+        assert n, 'unexpected end of stream'
+        got += n
+    assert buf == data
+    t.join(timeout=5)
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+    print("Flow control test finished")
+
+def test_reordered_window_updates():
+    print("\n=== Test: a delayed older ACK does not reopen the window ===")
+    sock = SimpleTCPSocket(local_port=0)
+    with sock.send_lock:
+        entries = [sock._queue_segment(FLAG_ACK, b'W' * 1000) for _ in range(5)]
+    peer_seq = 5000
+    sock._handle_ack(entries[3].seq, 1000, seqnum=peer_seq)
+    # sent earlier, arrives later: acks less and offers more room
+    sock._handle_ack(entries[1].seq, 9000, seqnum=peer_seq)
+    assert sock.peer_window == 1000
+    # the same ack again may update the window (the peer read its buffer)
+    sock._handle_ack(entries[3].seq, 3000, seqnum=peer_seq)
+    assert sock.peer_window == 3000
+    # ... and so does a segment further on in the peer's stream
+    sock._handle_ack(entries[3].seq, 0, seqnum=peer_seq + 100)
+    assert sock.peer_window == 0
+    sock._handle_ack(entries[4].seq, 9000, seqnum=peer_seq)
+    assert sock.peer_window == 0
+    sock.close()
+    print("Window update test finished")
+
+def test_sack_scoreboard():
+    print("\n=== Test: SACK scoreboard retransmits only real holes ===")
+    import socket
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('localhost', 0))
+    sock = SimpleTCPSocket(local_port=0)
+    sock.remote = sink.getsockname()
+    sock.sack_ok = True
+    sock.timeout_interval = 5.0    # keep the RTO out of the way
+    with sock.send_lock:
+        entries = [sock._queue_segment(FLAG_ACK, b'E' * 100) for _ in range(8)]
+    una = entries[0].seq
+    # segments 0 and 1 lost, 2..7 arrive: every ACK repeats una with a growing SACK block
+    for i in range(2, 8):
+        sock._handle_ack(una, 0xffff, pure=True, sack_blocks=[(entries[2].seq, entries[i].end)])
+    assert sock.fast_retransmits == 1
+    assert entries[0].retx_count == 1 and entries[1].retx_count == 1
+    assert all(e.retx_count == 0 and e.sacked for e in entries[2:])
+    # hole 0 repaired: partial ACK, nothing left to resend
+    sock._handle_ack(entries[1].seq, 0xffff, sack_blocks=[(entries[2].seq, entries[7].end)])
+    assert sock.retransmissions == 2
+    sock._handle_ack(entries[7].end, 0xffff)
+    assert len(sock.send_buffer) == 0 and sock._recovery is None
+    sock.close()
+    sink.close()
+    print("SACK scoreboard test finished")
+
+def test_delayed_ack():
+    print("\n=== Test: delayed ACKs (every 2nd full segment) ===")
+    server = SimpleTCPSocket(local_port=8030)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9050)
+    client.connect(('localhost', 8030))
+    conn = server.accept(timeout=5)
+    data = b'F' * 20000      # 20 full segments
+    client.send(data)
+    buf = b''
+    while len(buf) < len(data):
+        buf += conn.recv(4096, timeout=5)
+    assert buf == data
+    # send() returns once queued: wait for the last (delayed) ACK
+    assert client.flush(timeout=2)
+    print("ACKs sent:", conn.acks_sent, "saved:", conn.acks_saved)
+    assert conn.acks_saved >= 8
+    assert conn.acks_sent + conn.acks_saved >= 20
+    # an immediate ACK (here for out-of-order data) replaces a pending delayed one
+    from fase3.tcp_socket import pack_segment, seq_add
+    with conn.send_lock:
+        conn._set_timer(('delack', None), 10.0)
+    sent = conn.acks_sent
+    conn._process_segment(pack_segment(seq_add(conn.ack, 5000), client.seq, FLAG_ACK, 0xffff, b'G' * 100,
+                                       codec=conn._codec), client.udp.getsockname())
+    assert ('delack', None) not in conn._timers and conn.acks_sent == sent + 1
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+    print("Delayed ACK test finished")
+
+def test_asyncio_client_threaded_server():
+    print("\n=== Test: asyncio client <-> threaded server ===")
+    server = SimpleTCPSocket(local_port=8040)
+    server.listen()
+    data = bytes(range(256)) * 200     # 51200 bytes
+
+    def server_thread():
+        # echo everything back, then close after the client's FIN
+        conn = server.accept(timeout=5)
+        while True:
+            chunk = conn.recv(4096, timeout=5)
+            if not chunk:
+                break
+            conn.send(chunk)
+        conn.close()
+
+    t = threading.Thread(target=server_thread, daemon=True)
+    t.start()
+
+    async def client():
+        reader, writer = await open_connection('localhost', 8040, local_port=9060)
+        writer.write(data)
+        await writer.drain()
+        echoed = await reader.readexactly(len(data))
+        writer.close()
+        assert await reader.read() == b''
+        await writer.wait_closed()
+        return echoed
+
+    assert asyncio.run(client()) == data
+    t.join(timeout=5)
+    assert not t.is_alive()
+    server.close(timeout=1.0)
+    print("asyncio client test finished")
+
+def test_threaded_client_asyncio_server():
+    print("\n=== Test: threaded client <-> asyncio server ===")
+    lines = [b'line %d\n' % i for i in range(500)]
+    received = []
+
+    async def handle(reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            received.append(line)
+            writer.write(line.upper())
+        writer.close()
+        await writer.wait_closed()
+
+    async def main():
+        server = await start_server(handle, 'localhost', 8050)
+        loop = asyncio.get_running_loop()
+
+        def client():
+            sock = SimpleTCPSocket(local_port=9070)
+            sock.connect(('localhost', 8050))
+            sock.send(b''.join(lines))
+            expected = b''.join(lines).upper()
+            buf = b''
+            while len(buf) < len(expected):
+                buf += sock.recv(4096, timeout=5)
+            sock.close()
+            return buf
+
+        buf = await loop.run_in_executor(None, client)
+        server.close()
+        await asyncio.wait_for(server.wait_closed(), 5)
+        return buf
+
+    buf = asyncio.run(main())
+    assert buf == b''.join(lines).upper()
+    assert received == lines
+    print("asyncio server test finished")
+
+def test_listener_many_clients():
+    print("\n=== Test: one listener port, concurrent clients ===")
+    listener = TCPListener(local_port=8060, backlog=8)
+    nclients = 6
+    received = {}
+
+    def serve(conn):
+        buf = b''
+        while True:
+            chunk = conn.recv(4096, timeout=10)
+            if not chunk:
+                break
+            buf += chunk
+        received[buf[:1]] = buf
+        conn.close(timeout=1.0)
+
+    def acceptor():
+        for _ in range(nclients):
+            conn = listener.accept(timeout=10)
+            threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=acceptor, daemon=True).start()
+
+    def client(i):
+        sock = SimpleTCPSocket(local_port=0)
+        sock.connect(('localhost', 8060))
+        sock.send(bytes([65 + i]) * (20000 + i))
+        sock.close(timeout=2.0)
+
+    clients = [threading.Thread(target=client, args=(i,)) for i in range(nclients)]
+    for t in clients:
+        t.start()
+    for t in clients:
+        t.join(timeout=15)
+    deadline = time.time() + 5
+    while len(received) < nclients and time.time() < deadline:
+        time.sleep(0.05)
+    for i in range(nclients):
+        assert received[bytes([65 + i])] == bytes([65 + i]) * (20000 + i)
+    listener.close()
+    print("Listener test finished")
+
+def test_listener_backlog():
+    print("\n=== Test: listener drops SYNs beyond the backlog ===")
+    listener = TCPListener(local_port=8070, backlog=2)
+    clients = [SimpleTCPSocket(local_port=0) for _ in range(3)]
+    clients[0].connect(('localhost', 8070), timeout=2)
+    clients[1].connect(('localhost', 8070), timeout=2)
+    try:
+        # nothing accepted yet: the third SYN is ignored (first retransmission
+        # only after the initial RTO)
+        clients[2].connect(('localhost', 8070), timeout=0.5)
+        assert False, 'connect beyond the backlog should time out'
+    except TimeoutError:
+        pass
+    a = listener.accept(timeout=1)
+    b = listener.accept(timeout=1)
+    assert a is not b and {a.remote, b.remote} == {c.udp.getsockname() for c in clients[:2]}
+    for c in clients:
+        c.close(timeout=0.5)
+    listener.close()
+    print("Backlog test finished")
+
+def test_listener_half_open():
+    print("\n=== Test: half-open connections are dropped and free the backlog ===")
+    from fase3.tcp_socket import pack_segment, FLAG_SYN
+    # two clients send a bare SYN and go away
+    listener = TCPListener(local_port=8071, backlog=2, synack_retries=1)
+    ghosts = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(2)]
+    for i, g in enumerate(ghosts):
+        g.bind(('localhost', 0))
+        g.sendto(pack_segment(1000 * i, 0, FLAG_SYN, 0xffff), ('localhost', 8071))
+    time.sleep(0.2)
+    with listener._lock:
+        assert listener._pending() == 2
+    for g in ghosts:
+        g.close()
+    # SYN-ACK timeouts at 1.5 s and 3 s more: then both slots are free again
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        with listener._lock:
+            if not listener._pending():
+                break
+        time.sleep(0.1)
+    with listener._lock:
+        assert listener._pending() == 0 and not listener._conns
+    client = SimpleTCPSocket(local_port=0)
+    client.connect(('localhost', 8071), timeout=2)
+    conn = listener.accept(timeout=1)
+    assert conn.remote == client.udp.getsockname()
+    client.close(timeout=0.5)
+    listener.close()
+
+    # the same in virtual time, with the default SYNACK_RETRIES
+    sim = Simulator(seed=7)
+    net = SimNetwork(sim, delay=0.01)
+    accepted = []
+    server = tcp_sim.start_server(net, 8260, accepted.append, backlog=2)
+    for i in range(2):
+        ghost = net.socket()
+        ghost.sendto(pack_segment(1000 * i, 0, FLAG_SYN, 0xffff), ('localhost', 8260))
+        ghost.close()
+    assert sim.run(until=lambda: len(server.conns) == 2, limit=1)
+    assert sim.run(until=lambda: not server.conns, limit=600)
+    client = tcp_sim.open_connection(net, ('localhost', 8260))
+    assert sim.run(until=lambda: accepted, limit=sim.now + 5)
+    print("Half-open test finished")
+
+def test_offload_transfer():
+    print("\n=== Test: bulk transfer with UDP GSO/GRO (Linux) ===")
+    server = SimpleTCPSocket(local_port=8090, offload=True)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9090, offload=True)
+    client.connect(('localhost', 8090))
+    conn = server.accept(timeout=5)
+    data = os.urandom(300 * 1000)
+    done = threading.Thread(target=client.send, args=(data,))
+    done.start()
+    buf = bytearray()
+    while len(buf) < len(data):
+        buf += conn.recv(65536, timeout=5)
+    done.join()
+    assert buf == data
+    if client._gso:
+        assert client.gso_sends > 0
+    print("GSO:", client._gso, "GRO:", conn._gro, "batched sendmsg:", client.gso_sends)
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+    print("Offload test finished")
+
+def _transfer(client, conn, size, timeout=5):
+    data = os.urandom(size)
+    done = threading.Thread(target=client.send, args=(data,))
+    done.start()
+    buf = bytearray()
+    while len(buf) < len(data):
+        buf += conn.recv(65536, timeout=timeout)
+    done.join()
+    assert buf == data
+
+def test_mss_negotiation_and_pmtud():
+    print("\n=== Test: MSS option and path MTU probing ===")
+    server = SimpleTCPSocket(local_port=8100, mss=16000)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9100, mss=16000, pmtud=True)
+    client.connect(('localhost', 8100))
+    conn = server.accept(timeout=5)
+    # no probing on the server: it uses the negotiated size at once
+    assert conn.mss == 16000
+    deadline = time.monotonic() + 3
+    while client.mss < 16000 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    print("client mss:", client.mss, "probes:", client.pmtu_probes)
+    assert client.mss == 16000 and client.pmtu_probes >= 1
+    _transfer(client, conn, 200 * 1000)
+    assert conn._rcv_mss == 16000
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+
+    # the smaller of the two advertised sizes wins
+    a = SimpleTCPSocket(local_port=8101, mss=500)
+    a.listen()
+    b = SimpleTCPSocket(local_port=9101, mss=8000)
+    b.connect(('localhost', 8101))
+    c = a.accept(timeout=5)
+    assert b.mss == c.mss == 500
+    b.close(timeout=1.0)
+    c.close(timeout=1.0)
+
+class MTUChannel(UnreliableChannel):
+    """Lossless channel that silently drops datagrams above `mtu` bytes."""
+    def __init__(self, mtu):
+        super().__init__()
+        self.mtu = mtu
+
+    def send(self, packet, dest_socket, dest_addr):
+        if len(packet) <= self.mtu:
+            super().send(packet, dest_socket, dest_addr)
+
+def test_pmtud_black_hole():
+    print("\n=== Test: path MTU probing stops at the largest size that gets through ===")
+    server = SimpleTCPSocket(local_port=8110, mss=16000)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9110, channel=MTUChannel(4100), mss=16000, pmtud=True)
+    client.connect(('localhost', 8110))
+    conn = server.accept(timeout=5)
+    deadline = time.monotonic() + 5
+    while (client._pmtu_candidates or client._pmtu_probe) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    print("client mss:", client.mss, "probes:", client.pmtu_probes)
+    assert client.mss == 4000
+    _transfer(client, conn, 100 * 1000)
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+
+class SizeLimitedSocket:
+    """Wraps a UDP socket; datagrams above `limit` fail like they do with DF set."""
+    def __init__(self, sock, limit):
+        self.sock = sock
+        self.limit = limit
+        self.rejected = 0
+
+    def _check(self, size):
+        if size > self.limit:
+            self.rejected += 1
+            raise OSError(errno.EMSGSIZE, 'Message too long')
+
+    def sendto(self, data, addr):
+        self._check(len(data))
+        return self.sock.sendto(data, addr)
+
+    def sendmsg(self, buffers, ancdata, flags, addr):
+        self._check(sum(len(b) for b in buffers))
+        return self.sock.sendmsg(buffers, ancdata, flags, addr)
+
+def test_emsgsize_fallback():
+    print("\n=== Test: EMSGSIZE drops the MSS and re-segments the queue ===")
+    server = SimpleTCPSocket(local_port=8120, mss=16000)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9120, mss=16000)
+    client.connect(('localhost', 8120))
+    conn = server.accept(timeout=5)
+    assert client.mss == 16000
+    client._out = SizeLimitedSocket(client.udp, 5000)
+    _transfer(client, conn, 100 * 1000)
+    print("client mss:", client.mss, "rejected sends:", client._out.rejected)
+    assert client.mss == PMTU_BASE and client._out.rejected >= 1
+    assert all(len(e.data) <= PMTU_BASE for e in client.send_buffer.values())
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+
+def _count_segments(sock):
+    counter = {'data': 0}
+    queue_segment = sock._queue_segment
+    def counting(flags, data=b''):
+        if data:
+            counter['data'] += 1
+        return queue_segment(flags, data)
+    sock._queue_segment = counting
+    return counter
+
+def test_nagle_coalescing():
+    print("\n=== Test: Nagle's algorithm coalesces small writes ===")
+    server = SimpleTCPSocket(local_port=8130)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9130, channel=UnreliableChannel(delay_range=(0.01, 0.01)),
+                             nodelay=False)
+    client.connect(('localhost', 8130))
+    conn = server.accept(timeout=5)
+    counter = _count_segments(client)
+    messages = [b'%04d:small-rpc-message|' % i for i in range(300)]
+    t0 = time.monotonic()
+    for m in messages:
+        client.send(m)
+    # send() only queues: 300 writes take far less than one RTT each
+    assert time.monotonic() - t0 < 0.5
+    expected = b''.join(messages)
+    buf = bytearray()
+    while len(buf) < len(expected):
+        buf += conn.recv(65536, timeout=5)
+    assert buf == expected
+    assert client.flush(timeout=2)
+    print("writes:", len(messages), "data segments:", counter['data'])
+    assert counter['data'] < len(messages) // 4
+
+    # with nodelay every write leaves in a segment of its own
+    client.set_nodelay(True)
+    counter['data'] = 0
+    for m in messages[:20]:
+        client.send(m)
+    assert client.flush(timeout=2)
+    assert counter['data'] == 20
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+
+def test_cork():
+    print("\n=== Test: cork/uncork ===")
+    server = SimpleTCPSocket(local_port=8140)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9140)
+    client.connect(('localhost', 8140))
+    conn = server.accept(timeout=5)
+    counter = _count_segments(client)
+    client.cork()
+    for _ in range(9):
+        client.send(b'x' * 100)
+    try:
+        conn.recv(4096, timeout=0.05)
+        assert False, "corked data was sent"
+    except TimeoutError:
+        pass
+    client.uncork()
+    assert conn.recv(4096, timeout=2) == b'x' * 900
+    assert counter['data'] == 1
+
+    # a full segment is not held back; the rest goes when the cork times out
+    client.cork()
+    client.send(b'y' * (client.mss + 10))
+    assert conn.recv(client.mss, timeout=0.1) == b'y' * client.mss
+    t0 = time.monotonic()
+    assert conn.recv(4096, timeout=2) == b'y' * 10
+    print("partial segment released after %.3f s" % (time.monotonic() - t0))
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+
+def test_fastopen():
+    print("\n=== Test: Fast Open (data in the SYN) ===")
+    listener = TCPListener(local_port=8150, fastopen=True)
+    server_addr = ('localhost', 8150)
+    fastopen.client_cookies.discard(server_addr)
+
+    # first connection: full handshake, the SYN-ACK brings a cookie
+    c1 = SimpleTCPSocket(local_port=9150, fastopen=True)
+    c1.connect(server_addr)
+    conn1 = listener.accept(timeout=2)
+    assert fastopen.client_cookies.get(server_addr) is not None
+    assert conn1.tfo_data == 0
+    c1.close(timeout=1.0)
+    conn1.close(timeout=1.0)
+
+    # later ones: connect() returns at once, the request rides in the SYN and
+    # the server reads it before the handshake completes
+    c2 = SimpleTCPSocket(local_port=9151, fastopen=True)
+    sent = []
+    send_raw = c2._send_raw
+    def recording(seg, addr, data=b''):
+        sent.append(bytes(seg) + bytes(data))
+        return send_raw(seg, addr, data)
+    c2._send_raw = recording
+    c2.connect(server_addr)
+    assert c2.state == 'SYN_SENT' and not c2.send_buffer
+    c2.send(b'GET /index')
+    conn2 = listener.accept(timeout=2)
+    assert conn2.recv(100, timeout=2) == b'GET /index'
+    assert conn2.tfo_data == len(b'GET /index')
+    conn2.send(b'200 OK')
+    assert c2.recv(100, timeout=2) == b'200 OK'
+    syn = sent[0]
+    c2.close(timeout=1.0)
+    conn2.close(timeout=1.0)
+
+    # the same SYN replayed from the same address is not accepted again
+    time.sleep(0.1)
+    replayer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    replayer.bind(('localhost', 9151))
+    replayer.sendto(syn, ('localhost', 8150))
+    try:
+        listener.accept(timeout=0.3)
+        assert False, "replayed SYN was accepted"
+    except TimeoutError:
+        pass
+    replayer.close()
+    listener.close()
+
+    # a stale cookie for a server without Fast Open: normal handshake, the
+    # data follows it, and the cookie is dropped
+    server = SimpleTCPSocket(local_port=8151)
+    server.listen()
+    fastopen.client_cookies.put(('localhost', 8151), b'\x00' * fastopen.COOKIE_LEN)
+    c3 = SimpleTCPSocket(local_port=9152, fastopen=True)
+    c3.connect(('localhost', 8151))
+    c3.send(b'hello')
+    conn3 = server.accept(timeout=2)
+    assert conn3.recv(100, timeout=2) == b'hello'
+    assert fastopen.client_cookies.get(('localhost', 8151)) is None
+    c3.close(timeout=1.0)
+    conn3.close(timeout=1.0)
+
+    # the SYN-ACK to a Fast Open SYN is lost: the retransmitted SYN (same ISN,
+    # though ack has moved past its data) gets the SYN-ACK again at once
+    from fase3.tcp_socket import pack_segment, pack_option, FLAG_SYN, OPT_FASTOPEN
+    srv = SimpleTCPSocket(local_port=8152, fastopen=True)
+    srv.listen()
+    peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    peer.bind(('localhost', 9153))
+    addr = peer.getsockname()
+    syn = pack_segment(77, 0, FLAG_SYN, 0xffff, b'early',
+                       pack_option(OPT_FASTOPEN, fastopen.server.issue(addr)))
+    srv._process_segment(syn, addr)
+    assert srv.state == 'SYN_RCVD' and srv.tfo_data == len(b'early')
+    srv._process_segment(syn, addr)
+    assert next(iter(srv.send_buffer.values())).retx_count == 1
+    peer.settimeout(1)
+    for _ in range(2):
+        seg = unpack_segment(peer.recvfrom(4096)[0])
+        assert seg['flags'] == FLAG_SYN | FLAG_ACK and seg['ack'] == 78 + len(b'early')
+    peer.close()
+    srv.close(timeout=0.5)
+
+    # a Fast Open connection queued for accept() at its SYN takes one backlog
+    # slot, not two (half-open and queued)
+    listener = TCPListener(local_port=8153, fastopen=True, backlog=2)
+    peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    peer.bind(('localhost', 9154))
+    syn = pack_segment(77, 0, FLAG_SYN, 0xffff, b'early',
+                       pack_option(OPT_FASTOPEN, fastopen.server.issue(peer.getsockname())))
+    peer.sendto(syn, ('localhost', 8153))
+    deadline = time.monotonic() + 2
+    while not listener._accept_queue and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with listener._lock:
+        assert listener._pending() == 1
+    # so a second handshake still fits
+    ghost = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    ghost.bind(('localhost', 9155))
+    ghost.sendto(pack_segment(1000, 0, FLAG_SYN, 0xffff), ('localhost', 8153))
+    deadline = time.monotonic() + 2
+    while len(listener._conns) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(listener._conns) == 2
+    conn = listener.accept(timeout=2)
+    assert conn.state == 'SYN_RCVD' and conn.recv(100, timeout=2) == b'early'
+    peer.close()
+    ghost.close()
+    listener.close()
+    print("Fast Open test finished")
+
+def _echo_server(listener, accepted):
+    def handle(conn):
+        while True:
+            try:
+                chunk = conn.recv(4096, timeout=5)
+            except TimeoutError:
+                break
+            if not chunk:
+                break
+            conn.send(chunk)
+        conn.close(timeout=1.0)
+
+    def serve():
+        while listener.running:
+            try:
+                conn = listener.accept(timeout=0.2)
+            except (TimeoutError, OSError):
+                continue
+            accepted.append(conn)
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    threading.Thread(target=serve, daemon=True).start()
+
+def test_connection_pool():
+    print("\n=== Test: client connection pool ===")
+    listener = TCPListener(local_port=8160)
+    accepted = []
+    _echo_server(listener, accepted)
+    dest = ('localhost', 8160)
+    pool = ConnectionPool(max_total=2, max_idle=2)
+
+    # repeated requests share one connection: one handshake in total
+    for i in range(20):
+        with pool.connection(dest) as conn:
+            conn.send(b'req%d' % i)
+            assert conn.recv(100, timeout=2) == b'req%d' % i
+    stats = pool.stats()
+    print(stats)
+    assert stats['misses'] == 1 and stats['hits'] == 19 and len(accepted) == 1
+
+    # the server closed it while idle: not handed out again
+    accepted[0].close(timeout=1.0)
+    time.sleep(0.1)
+    with pool.connection(dest) as conn:
+        conn.send(b'again')
+        assert conn.recv(100, timeout=2) == b'again'
+    assert pool.stats()['discarded'] == 1 and len(accepted) == 2
+
+    # max_total: a third connection waits for one to be released
+    a = pool.acquire(dest)
+    b = pool.acquire(dest)
+    assert a is not b
+    try:
+        pool.acquire(dest, timeout=0.2)
+        assert False, "pool grew beyond max_total"
+    except TimeoutError:
+        pass
+    pool.release(b)
+    assert pool.acquire(dest, timeout=1) is b
+    pool.release(a)
+    pool.release(b)
+
+    # a full pool makes room for another destination by evicting an idle connection
+    other = TCPListener(local_port=8161)
+    _echo_server(other, [])
+    with pool.connection(('localhost', 8161)) as conn:
+        conn.send(b'x')
+        assert conn.recv(100, timeout=2) == b'x'
+    assert pool.stats()['evictions'] == 1
+    pool.close()
+    listener.close()
+    other.close()
+    print("Pool test finished")
+
+def test_pacing():
+    print("\n=== Test: paced sending ===")
+    server = SimpleTCPSocket(local_port=8170)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9170, pacing=1000000)    # 1 MB/s
+    client.connect(('localhost', 8170))
+    conn = server.accept(timeout=5)
+    t0 = time.monotonic()
+    _transfer(client, conn, 200 * 1000)
+    elapsed = time.monotonic() - t0
+    stats = client.pacer.stats()
+    print("%.2f s" % elapsed, stats)
+    assert elapsed >= 0.15
+    # the windows offer bursts of several segments; they leave one or two at a time
+    assert stats['offered']['max'] >= 4 and stats['paced']['max'] <= 3
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+
+    # 'auto' follows cwnd / srtt
+    server = SimpleTCPSocket(local_port=8171)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9171, pacing='auto')
+    client.connect(('localhost', 8171))
+    conn = server.accept(timeout=5)
+    _transfer(client, conn, 200 * 1000)
+    assert client.pacer.rate is not None
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+
+def test_integrity_codec():
+    print("\n=== Test: negotiated integrity codec ===")
+    from utils.integrity import get_codec, DEFAULT
+    server = SimpleTCPSocket(local_port=8180, integrity='inet16')
+    server.listen()
+    client = SimpleTCPSocket(local_port=9180, integrity='inet16')
+    client.connect(('localhost', 8180))
+    conn = server.accept(timeout=5)
+    assert client._codec is conn._codec is get_codec('inet16')
+    _transfer(client, conn, 100 * 1000)
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+
+    # different offers: both stay on CRC32
+    server = SimpleTCPSocket(local_port=8181, integrity='adler32')
+    server.listen()
+    client = SimpleTCPSocket(local_port=9181, integrity='none')
+    client.connect(('localhost', 8181))
+    conn = server.accept(timeout=5)
+    assert client._codec is conn._codec is DEFAULT
+    _transfer(client, conn, 20 * 1000)
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+
+    # a retransmission with timestamps updates the inet16 checksum in place
+    sock = SimpleTCPSocket(local_port=0, integrity='inet16')
+    sock._codec = get_codec('inet16')
+    sock.ts_ok = True
+    with sock.send_lock:
+        entry = sock._queue_segment(FLAG_ACK, b'F' * 1001)
+        old_header = bytes(entry.header)
+        sock.ack += 7           # the retransmission carries a new ack (and TSval)
+        sock._retransmit(entry, time.monotonic())
+    assert bytes(entry.header) != old_header
+    parsed = unpack_segment(bytes(entry.header) + entry.data, sock._codec)
+    assert parsed['ck'] == parsed['calc'] and parsed['ack'] == sock.ack
+    sock.close()
+    print("Integrity codec test finished")
+
+def test_send_file():
+    print("\n=== Test: mmap-backed send_file / recv_to_file ===")
+    import tempfile
+    tmp = tempfile.mkdtemp()
+    src = os.path.join(tmp, 'src.bin')
+    data = os.urandom(3 * 1000 * 1000 + 123)
+    with open(src, 'wb') as f:
+        f.write(data)
+    server = SimpleTCPSocket(local_port=8190)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9190)
+    client.connect(('localhost', 8190))
+    conn = server.accept(timeout=5)
+    try:
+        # known size: received straight into a mapping of the destination file
+        dst = os.path.join(tmp, 'dst.bin')
+        sender = threading.Thread(target=client.send_file, args=(src,))
+        sender.start()
+        assert conn.recv_to_file(dst, count=len(data), timeout=10) == len(data)
+        sender.join()
+        with open(dst, 'rb') as f:
+            assert f.read() == data
+        # a slice of the file, then end of stream: positional writes
+        dst2 = os.path.join(tmp, 'dst2.bin')
+        def send_slice():
+            assert client.send_file(src, offset=5000, count=1000 * 1000) == 1000 * 1000
+            client.close(timeout=2.0)
+        sender = threading.Thread(target=send_slice)
+        sender.start()
+        assert conn.recv_to_file(dst2, timeout=10) == 1000 * 1000
+        sender.join()
+        with open(dst2, 'rb') as f:
+            assert f.read() == data[5000:5000 + 1000 * 1000]
+    finally:
+        client.close(timeout=1.0)
+        conn.close(timeout=1.0)
+    print("send_file test finished")
+
+def test_get_info():
+    print("\n=== Test: get_info() statistics snapshot ===")
+    channel = UnreliableChannel(loss_rate=0.1, corrupt_rate=0.05, delay_range=(0.0, 0.01), seed=4)
+    server = SimpleTCPSocket(local_port=8200, channel=channel)
+    server.listen()
+    client = SimpleTCPSocket(local_port=9200, channel=channel, send_bufsize=16 * 1000)
+    # a lossy handshake may need a few backed-off retransmissions
+    client.connect(('localhost', 8200), timeout=15)
+    conn = server.accept(timeout=15)
+    _transfer(client, conn, 100 * 1000, timeout=15)
+    assert client.flush(timeout=10)
+    info = client.get_info()
+    peer = conn.get_info()
+    print(info)
+    print(peer)
+    assert info['state'] == peer['state'] == 'ESTABLISHED'
+    assert info['bytes_sent'] == peer['bytes_received'] == 100 * 1000
+    assert info['segs_sent'] >= 100 and info['unacked_segs'] == 0 and info['unsent_bytes'] == 0
+    # 10% loss and 5% corruption: some repairs, some bad checksums on either side
+    assert info['retransmissions'] > 0 and info['bytes_retrans'] > 0
+    assert info['checksum_errors'] + peer['checksum_errors'] > 0
+    assert info['srtt'] is not None and info['rto'] >= info['srtt']
+    # a 16 KB send queue makes a 100 KB send() wait for ACKs
+    assert info['send_blocked'] > 0
+    assert peer['ooo_segs'] == 0 and peer['recv_queued'] == 0 and peer['advertised_window'] > 0
+    client.close(timeout=1.0)
+    conn.close(timeout=1.0)
+    print("get_info test finished")
+
+def test_tracing():
+    print("\n=== Test: protocol event tracing ===")
+    from utils import trace
+    seen = []
+    tracer = trace.enable(sinks=[seen.append])
+    try:
+        channel = UnreliableChannel(loss_rate=0.1, corrupt_rate=0.05, delay_range=(0.0, 0.01), seed=4)
+        server = SimpleTCPSocket(local_port=8210, channel=channel)
+        server.listen()
+        client = SimpleTCPSocket(local_port=9210, channel=channel)
+        # a lossy handshake may need a few backed-off retransmissions
+        client.connect(('localhost', 8210), timeout=15)
+        conn = server.accept(timeout=15)
+        _transfer(client, conn, 50 * 1000, timeout=15)
+        client.flush(timeout=10)
+        client.close(timeout=1.0)
+        conn.close(timeout=1.0)
+    finally:
+        trace.disable()
+    events = tracer.snapshot()
+    assert len(seen) == len(events)
+    kinds = {e[1] for e in events}
+    assert {trace.SEND, trace.ACK, trace.DELIVER, trace.STATE, trace.DROP, trace.RETRANSMIT} <= kinds, kinds
+    ours = trace.label(client)
+    states = [e[3]['new'] for e in events if e[1] == trace.STATE and e[2] == ours]
+    assert states[:2] == ['SYN_SENT', 'ESTABLISHED'], states
+    delivered = sum(e[3]['len'] for e in events if e[1] == trace.DELIVER and e[2] == trace.label(conn))
+    assert delivered == 50 * 1000
+    info = client.get_info()
+    assert tracer.count(trace.RETRANSMIT) >= info['retransmissions']
+    print("Tracing test finished")
+
+def _virtual_transfer(sim, size, seed):
+    channel = UnreliableChannel(loss_rate=0.05, corrupt_rate=0.02, delay_range=(0.0, 0.005), seed=seed)
+    net = SimNetwork(sim, channel, delay=0.02)
+    got = bytearray()
+    accepted = []
+
+    def on_accept(conn):
+        conn.on_data = got.extend
+        accepted.append(conn)
+
+    server = tcp_sim.start_server(net, 8220, on_accept)
+    client = tcp_sim.open_connection(net, ('localhost', 8220), local_port=9220)
+    data = os.urandom(size)
+    client.write(data)
+    assert sim.run(until=lambda: len(got) == size, limit=600)
+    assert bytes(got) == data
+    client.close()
+    assert sim.run(until=lambda: accepted[0].at_eof, limit=sim.now + 60)
+    accepted[0].close()
+    assert sim.run(until=lambda: client.closed and accepted[0].closed, limit=sim.now + 60)
+    server.close()
+    assert not net._sockets
+    return client
+
+def test_sequence_wraparound():
+    print("\n=== Test: transfer across the 2**32 sequence number wrap ===")
+    from fase3.tcp_socket import seq_add, seq_lt, seq_diff
+    assert seq_add(2**32 - 1, 2) == 1 and seq_diff(1, 2**32 - 1) == 2
+    assert seq_lt(2**32 - 10, 5) and not seq_lt(5, 2**32 - 10)
+    sim = Simulator(seed=5)
+    channel = UnreliableChannel(loss_rate=0.05, delay_range=(0.0, 0.005), seed=5)
+    net = SimNetwork(sim, channel, delay=0.02)
+    got = bytearray()
+    accepted = []
+
+    def on_accept(conn):
+        conn.on_data = got.extend
+        accepted.append(conn)
+
+    # both sides start just below the wrap, so data, ACKs and SACK blocks cross it
+    original = tcp_sim.SimTCPConnection._initial_seq
+    tcp_sim.SimTCPConnection._initial_seq = lambda self: 2**32 - 3000
+    try:
+        tcp_sim.start_server(net, 8240, on_accept)
+        client = tcp_sim.open_connection(net, ('localhost', 8240), local_port=9240)
+    finally:
+        tcp_sim.SimTCPConnection._initial_seq = original
+    data = os.urandom(200 * 1000)
+    client.write(data)
+    assert sim.run(until=lambda: len(got) == len(data), limit=120)
+    assert bytes(got) == data
+    assert sim.run(until=lambda: client.all_acked, limit=sim.now + 60)
+    # the sender's next sequence number wrapped past zero
+    assert client.seq == seq_add(2**32 - 3000, 1 + len(data))
+    assert client.get_info()['retransmissions'] > 0
+    print("Wraparound test finished")
+
+def test_virtual_time():
+    print("\n=== Test: virtual-time transfer (5 MB, 5% loss, 40 ms RTT) ===")
+    from utils import trace
+    sim = Simulator(seed=3)
+    start = time.monotonic()
+    tracer = trace.enable(clock=sim.time)
+    try:
+        client = _virtual_transfer(sim, 5 * 1000 * 1000, seed=3)
+        info = client.get_info()
+    finally:
+        trace.disable()
+    wall = time.monotonic() - start
+    print("virtual %.2fs, wall %.2fs, events %d, retransmissions %d"
+          % (sim.now, wall, sim.events, info['retransmissions']))
+    assert info['retransmissions'] > 0 and info['state'] == 'CLOSED'
+    # event times are virtual, and so are the controller's cwnd samples
+    times = [e[0] for e in tracer.snapshot()]
+    assert times == sorted(times) and 0 <= times[0] and times[-1] <= sim.now
+    assert all(0 <= t <= sim.now for t, *_ in client.cc.trace)
+    # same seeds, same run
+    sim2 = Simulator(seed=3)
+    info2 = _virtual_transfer(sim2, 5 * 1000 * 1000, seed=3).get_info()
+    assert (sim2.now, sim2.events) == (sim.now, sim.events)
+    assert info2 == info
+    print("Virtual-time test finished")
+
+def test_bottleneck_link():
+    print("\n=== Test: congestion over a 1 MB/s bottleneck with a 30 KB drop-tail queue ===")
+    from utils.link import Link
+    sim = Simulator(seed=4)
+    forward = Link(rate=1000 * 1000, queue=30 * 1000, delay=0.02)
+    channel = UnreliableChannel(seed=4, links={('localhost', 8230): forward,
+                                               ('localhost', 9230): Link(delay=0.02)})
+    net = SimNetwork(sim, channel)
+    got = bytearray()
+    tcp_sim.start_server(net, 8230, lambda conn: setattr(conn, 'on_data', got.extend))
+    client = tcp_sim.open_connection(net, ('localhost', 8230), local_port=9230)
+    assert sim.run(until=lambda: client.connected, limit=5)
+    start = sim.now
+    size = 4 * 1000 * 1000
+    client.write(bytes(size))
+    assert sim.run(until=lambda: len(got) == size, limit=120)
+    goodput = size / (sim.now - start)
+    info = client.get_info()
+    print("goodput %.0f B/s, link %s, retransmissions %d, ssthresh %d"
+          % (goodput, forward.stats(), info['retransmissions'], info['ssthresh']))
+    # slow start overflows the queue: losses come from the bottleneck, not the channel
+    assert forward.queue_drops > 0 and info['retransmissions'] > 0
+    assert info['ssthresh'] < 2**31
+    assert forward.max_backlog <= 30 * 1000
+    assert 0.6 * 1000 * 1000 < goodput <= 1000 * 1000
+    print("Bottleneck test finished")
+
 if __name__ == '__main__':
     test_handshake_and_transfer()
     test_with_loss()
+    test_segment_encoding()
+    test_send_queue_cumulative_ack()
+    test_retransmit_follows_rto()
+    test_retry_limit()
+    test_rto_burst()
+    test_slow_reader()
+    test_karn_and_timestamps()
+    test_congestion_control()
+    test_flow_control_and_window_scale()
+    test_reordered_window_updates()
+    test_sack_scoreboard()
+    test_delayed_ack()
+    test_asyncio_client_threaded_server()
+    test_threaded_client_asyncio_server()
+    test_listener_many_clients()
+    test_listener_backlog()
+    test_listener_half_open()
+    test_offload_transfer()
+    test_mss_negotiation_and_pmtud()
+    test_pmtud_black_hole()
+    test_emsgsize_fallback()
+    test_nagle_coalescing()
+    test_cork()
+    test_fastopen()
+    test_connection_pool()
+    test_pacing()
+    test_integrity_codec()
+    test_send_file()
+    test_get_info()
+    test_tracing()
+    test_sequence_wraparound()
+    test_virtual_time()
+    test_bottleneck_link()
@@ -0,0 +1,361 @@
+# testes/test_utils.py
+# Testes das estruturas auxiliares em utils/
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.timers import TimerHeap
+from utils.ringbuffer import RingBuffer
+from utils import udp_offload
+from utils.pacing import Pacer
+from utils import integrity
+from utils import trace
+from utils.netsim import Simulator, SimNetwork
+import socket
+import threading
+import time
+
+
+def test_timer_heap():
+    print("\n=== Teste TimerHeap - ordem, cancelamento e re-arm ===")
+    timers = TimerHeap()
+    timers.schedule('a', 3.0)
+    timers.schedule('b', 1.0)
+    timers.schedule('c', 2.0)
+    assert timers.next_deadline() == 1.0
+    timers.cancel('b')
+    assert timers.next_deadline() == 2.0
+    # re-arm: 'c' passa a vencer depois de 'a'
+    timers.schedule('c', 5.0)
+    assert timers.pop_expired(4.0) == ['a']
+    assert 'c' in timers and len(timers) == 1
+    assert timers.pop_expired(10.0) == ['c']
+    assert timers.next_deadline() is None
+    print("✓ TimerHeap ok")
+
+
+def test_ring_buffer():
+    print("\n=== Teste RingBuffer - volta do buffer e capacidade ===")
+    ring = RingBuffer(8)
+    assert ring.write(b'abcdef') == 6
+    assert ring.read(4) == b'abcd'
+    # escreve passando do fim do bytearray interno
+    assert ring.write(b'ghijklmn') == 6      # só cabem 6
+    assert len(ring) == 8 and ring.free == 0
+    out = bytearray(5)
+    assert ring.readinto(out) == 5 and out == b'efghi'
+    assert ring.read(100) == b'jkl'
+    assert len(ring) == 0
+    print("✓ RingBuffer ok")
+
+
+def test_udp_offload():
+    print("\n=== Teste GSO/GRO - lotes, separação e loopback ===")
+    a, b = ('127.0.0.1', 1), ('127.0.0.1', 2)
+    dgrams = [(a, 100, (b'x',)), (a, 100, (b'y',)), (a, 40, (b'z',)),   # menor fecha o lote
+              (a, 100, (b'w',)), (b, 100, (b'v',))]                       # outro destino
+    batches = [(addr, size, len(d)) for addr, size, d in udp_offload.gso_batches(dgrams)]
+    assert batches == [(a, 100, 3), (a, 100, 1), (b, 100, 1)]
+    many = [(a, 1000, (b'x',))] * 100
+    sizes = [len(d) for _, _, d in udp_offload.gso_batches(many)]
+    assert max(sizes) * 1000 <= udp_offload.GSO_MAX_BYTES and sum(sizes) == 100
+
+    gro = [(udp_offload.SOL_UDP, udp_offload.UDP_GRO, (100).to_bytes(4, sys.byteorder))]
+    assert udp_offload.split_gro(b'a' * 250, gro) == [b'a' * 100, b'a' * 100, b'a' * 50]
+    assert udp_offload.split_gro(b'a' * 250, []) == [b'a' * 250]
+
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.bind(('127.0.0.1', 0))
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        if not (udp_offload.gso_supported(tx) and udp_offload.enable_gro(rx)):
+            print("- GSO/GRO indisponível neste sistema, loopback não testado")
+            return
+        sent = [(bytes([65 + i]) * 500,) for i in range(4)] + [(b'Z' * 123,)]
+        udp_offload.send_gso(tx, sent, 500, rx.getsockname())
+        rx.settimeout(2)
+        got = []
+        while len(got) < len(sent):
+            segs, _ = udp_offload.recv_batch(rx)
+            got.extend(segs)
+        assert got == [d[0] for d in sent]
+        print("✓ GSO/GRO no loopback ok")
+    finally:
+        rx.close()
+        tx.close()
+
+
+def test_pacer():
+    print("\n=== Teste Pacer - token bucket e estatísticas de rajada ===")
+    pacer = Pacer(rate=100000, mss=1000)     # 100 KB/s, balde de 2 segmentos
+    t = 1000.0
+    pacer._stamp = t
+    pacer._tokens = pacer.burst
+    assert pacer.delay(1000, t) == 0
+    pacer.consume(1000, t)
+    pacer.consume(1000, t)
+    # balde vazio: o próximo segmento espera 1000 / 100000 s
+    assert abs(pacer.delay(1000, t) - 0.01) < 1e-9
+    assert pacer.delay(1000, t + 0.011) == 0
+    pacer.consume(1000, t + 0.011)
+    stats = pacer.stats()
+    # dois envios juntos e um espaçado
+    assert stats['paced']['bursts'] == 2 and stats['paced']['max'] == 2
+    pacer.offer(10)
+    assert pacer.stats()['offered'] == {'bursts': 1, 'mean': 10.0, 'max': 10}
+    # sem taxa não há espera
+    assert Pacer().delay(10 ** 6) == 0
+    print("✓ Pacer ok")
+
+
+def test_integrity_codecs():
+    print("\n=== Teste codecs de integridade ===")
+    import zlib
+    parts = (b'\x01\x02\x03', b'cabecalho', bytes(range(256)) * 5 + b'!')
+    whole = b''.join(parts)
+    assert integrity.get_codec('crc32').compute(*parts) == zlib.crc32(whole)
+    assert integrity.get_codec('adler32').compute(*parts) == zlib.adler32(whole)
+    inet = integrity.get_codec('inet16')
+    # referência RFC 1071: soma das palavras de 16 bits com "end-around carry"
+    padded = whole + b'\x00' * (len(whole) & 1)
+    acc = sum(int.from_bytes(padded[i:i + 2], 'big') for i in range(0, len(padded), 2))
+    while acc >> 16:
+        acc = (acc & 0xffff) + (acc >> 16)
+    assert inet.compute(*parts) % 0xffff == (~acc & 0xffff) % 0xffff
+    assert inet.compute(*parts) == inet.compute(whole)
+    # atualização incremental: troca dos 12 primeiros bytes sem reler o resto
+    new = b'outro cabeca' + whole[12:]
+    assert inet.update(inet.compute(whole), whole[:12], new[:12]) % 0xffff == inet.compute(new) % 0xffff
+    none = integrity.get_codec('none')
+    assert none.compute(whole) == 0 and none.verify(1234, whole)
+    try:
+        integrity.get_codec('md5')
+        assert False
+    except ValueError:
+        pass
+    print("✓ Codecs ok")
+
+
+
+def test_trace():
+    print("\n=== Teste rastreamento de eventos ===")
+    import json, tempfile
+    seen = []
+    tracer = trace.Tracer(capacity=3, sinks=[seen.append])
+    src = object()
+    for i in range(5):
+        tracer.emit(trace.SEND, src, seq=i)
+    # buffer circular: só os 3 últimos ficam; o sink viu todos
+    assert [e[3]['seq'] for e in tracer.snapshot()] == [2, 3, 4]
+    assert len(seen) == 5 and tracer.count(trace.SEND) == 3 and tracer.count(trace.ACK) == 0
+    qlog = trace.to_qlog(tracer.snapshot())
+    events = qlog['traces'][0]['events']
+    assert events[0]['time'] == 0 and events[0]['name'] == 'transport:packet_sent'
+    assert events[0]['data']['source'] == trace.label(src)
+    path = os.path.join(tempfile.mkdtemp(), 't.qlog')
+    trace.export_qlog(tracer, path)
+    with open(path) as f:
+        assert json.load(f)['traces'][0]['events'] == events
+    # desligado por padrão; enable()/disable() trocam o tracer do processo
+    assert trace.active is None
+    t = trace.enable(capacity=10)
+    assert trace.active is t
+    trace.disable()
+    assert trace.active is None
+    print("✓ Trace ok")
+
+
+
+def test_channel_seed():
+    print("\n=== Teste canal simulado com semente ===")
+    from utils.simulator import UnreliableChannel
+
+    class Sink:
+        def __init__(self):
+            self.got = []
+
+        def sendto(self, data, addr):
+            self.got.append(data)
+
+    def run(seed):
+        channel = UnreliableChannel(loss_rate=0.3, corrupt_rate=0.3, seed=seed)
+        sink = Sink()
+        for i in range(200):
+            channel.send(bytes([i]) * 20, sink, None)
+        time.sleep(0.2)
+        return sorted(sink.got)
+
+    # mesma semente, mesmas perdas e corrupções
+    a, b = run(7), run(7)
+    assert a == b and 0 < len(a) < 200
+    assert run(8) != a
+    print("✓ Semente ok")
+
+
+def test_channel_dispatcher():
+    print("\n=== Teste canal simulado - despachante único ===")
+    from utils.simulator import UnreliableChannel
+
+    class Sink:
+        def __init__(self):
+            self.got = []
+
+        def sendto(self, data, addr):
+            self.got.append((time.monotonic(), data))
+
+    # atraso zero: entregue na própria chamada, sem threads
+    channel = UnreliableChannel()
+    sink = Sink()
+    threads = threading.active_count()
+    channel.send(b'a', sink, None)
+    assert [d for _, d in sink.got] == [b'a'] and threading.active_count() == threads
+    # atrasos: uma thread só, entregas na ordem dos instantes sorteados
+    channel = UnreliableChannel(delay_range=(0.01, 0.05), seed=3)
+    sink = Sink()
+    sent = time.monotonic()
+    for i in range(500):
+        channel.send(bytes([i % 256]), sink, None)
+    assert threading.active_count() <= threads + 1
+    time.sleep(0.15)
+    assert len(sink.got) == 500 and channel.pending() == 0
+    times = [t for t, _ in sink.got]
+    assert times == sorted(times) and times[0] - sent >= 0.01
+    channel.close()
+    # close(): descarta ou entrega o que está pendente
+    for flush, expected in ((False, 0), (True, 10)):
+        channel = UnreliableChannel(delay_range=(5.0, 5.0))
+        sink = Sink()
+        for i in range(10):
+            channel.send(b'x', sink, None)
+        assert channel.pending() == 10
+        channel.close(flush=flush)
+        assert len(sink.got) == expected and channel.pending() == 0
+        channel.send(b'y', sink, None)       # canal fechado: ignorado
+        assert len(sink.got) == expected
+    print("✓ Despachante ok")
+
+
+def test_netsim():
+    print("\n=== Teste netsim - simulador de eventos em tempo virtual ===")
+    from utils.simulator import UnreliableChannel
+    sim = Simulator(seed=1)
+    order = []
+    sim.call_later(2.0, order.append, 'c')
+    sim.call_later(1.0, order.append, 'a')
+    sim.call_later(1.0, order.append, 'b')      # mesmo instante: ordem de agendamento
+    sim.call_later(1.5, order.append, 'x').cancel()
+    assert not sim.run(limit=1.5)       # "c" ainda na fila
+    assert order == ['a', 'b'] and sim.now == 1.5
+    assert sim.run() and order == ['a', 'b', 'c'] and sim.now == 2.0
+    # rede: atraso fixo + do canal, porta sem socket descarta
+    net = SimNetwork(sim, UnreliableChannel(delay_range=(0.0, 0.01), seed=2), delay=0.05)
+    a, b = net.socket(7000), net.socket()
+    got = []
+    b.handler = lambda data, src: got.append((sim.now, data, src))
+    t0 = sim.now
+    for i in range(100):
+        a.sendto(bytes([i]), b.getsockname())
+    a.sendto(b'?', ('localhost', 1))
+    assert sim.run(until=lambda: len(got) == 100)
+    assert all(0.05 <= t - t0 <= 0.06 and src == ('localhost', 7000) for t, _, src in got)
+    assert net.datagrams == 101 and net.delivered == 100
+    try:
+        net.socket(7000)
+        assert False, "porta em uso"
+    except OSError:
+        pass
+    # perda pela mesma semente: mesma sequência de entregas
+    runs = []
+    for _ in range(2):
+        sim = Simulator()
+        net = SimNetwork(sim, UnreliableChannel(loss_rate=0.3, seed=5))
+        a, b = net.socket(), net.socket()
+        seen = []
+        b.handler = lambda data, src: seen.append(data)
+        for i in range(200):
+            a.sendto(bytes([i]), b.getsockname())
+        sim.run()
+        runs.append(seen)
+    assert runs[0] == runs[1] and 100 < len(runs[0]) < 180
+    print("eventos:", sim.events, "entregues:", len(runs[0]))
+    print("✓ netsim ok")
+
+
+def test_link_model():
+    print("\n=== Teste Link - banda, fila, perda em rajadas, reordenação ===")
+    from utils.simulator import UnreliableChannel
+    from utils.link import Link, DropTail, RED, GilbertElliott
+
+    def rajada(link, n=100, size=1000, seed=1, gap=0.0):
+        # n pacotes de `size` bytes, um a cada `gap` s, em tempo virtual
+        sim = Simulator()
+        net = SimNetwork(sim, UnreliableChannel(seed=seed, link=link))
+        a, b = net.socket(), net.socket()
+        got = []
+        b.handler = lambda data, src: got.append((sim.now, data))
+        for i in range(n):
+            sim.call_at(i * gap, a.sendto, i.to_bytes(4, 'big') + bytes(size - 4), b.getsockname())
+        sim.run()
+        return got
+
+    # serialização: 1000 B a 100 kB/s = 10 ms por pacote, mais a propagação
+    got = rajada(Link(rate=100000, delay=0.05))
+    assert len(got) == 100
+    assert all(abs(t - (0.05 + 0.01 * (i + 1))) < 1e-9 for i, (t, _) in enumerate(got))
+    # fila de 10 kB com descarte na cauda: da rajada só passam 10 pacotes
+    link = Link(rate=100000, queue=10000)
+    assert len(rajada(link)) == 10 and link.queue_drops == 90 and link.max_backlog == 10000
+    # RED descarta antes de encher: fila média fica abaixo do limite físico
+    link = Link(rate=100000, queue=RED(50000, weight=0.05))
+    got = rajada(link, n=2000, gap=0.008)       # 125 kB/s num enlace de 100 kB/s
+    tail = Link(rate=100000, queue=DropTail(50000))
+    rajada(tail, n=2000, gap=0.008)
+    print("RED:", link.stats(), "DropTail:", tail.stats())
+    assert link.queue_drops > 0 and link.max_backlog < tail.max_backlog
+    # Gilbert-Elliott: perdas em rajadas de 1/r pacotes em média
+    ge = GilbertElliott(p=0.02, r=0.25)
+    link = Link(loss=ge)
+    got = rajada(link, n=20000, size=8)
+    seqs = {int.from_bytes(d[:4], 'big') for _, d in got}
+    runs, run = [], 0
+    for i in range(20000):
+        if i in seqs:
+            if run:
+                runs.append(run)
+            run = 0
+        else:
+            run += 1
+    mean_run = sum(runs) / len(runs)
+    print("perda %.3f (esperada %.3f), rajada média %.2f" % (1 - len(got) / 20000, ge.mean_loss, mean_run))
+    assert abs((1 - len(got) / 20000) - ge.mean_loss) < 0.02 and 3 < mean_run < 5
+    # reordenação e duplicação
+    link = Link(reorder_rate=0.1, reorder_delay=0.01, duplicate_rate=0.05)
+    got = rajada(link, n=1000, size=8, gap=0.001)
+    order = [int.from_bytes(d[:4], 'big') for _, d in got]
+    assert len(order) == 1000 + link.duplicated and set(order) == set(range(1000))
+    assert order != sorted(order) and 50 < link.reordered < 150 and 20 < link.duplicated < 80
+    # um enlace por direção: só a ida passa pelo gargalo
+    sim = Simulator()
+    ida = Link(rate=1000)
+    net = SimNetwork(sim, UnreliableChannel(seed=1, links={('localhost', 2): ida}))
+    a, b = net.socket(1), net.socket(2)
+    times = {}
+    a.handler = lambda data, src: times.setdefault('volta', sim.now)
+    b.handler = lambda data, src: times.setdefault('ida', sim.now)
+    a.sendto(bytes(100), b.getsockname())
+    b.sendto(bytes(100), a.getsockname())
+    sim.run()
+    assert times == {'volta': 0.0, 'ida': 0.1} and ida.packets == 1
+    print("✓ Link ok")
+
+
+if __name__ == "__main__":
+    test_timer_heap()
+    test_ring_buffer()
+    test_udp_offload()
+    test_pacer()
+    test_integrity_codecs()
+    test_trace()
+    test_channel_seed()
+    test_channel_dispatcher()
+    test_netsim()
+    test_link_model()
+    print("\nTodos os testes de utils passaram com sucesso!")
@@ -0,0 +1,56 @@
+# =====================
+# utils/filemap.py
+# =====================
+"""Acesso a arquivos por mmap, em janelas, para envio e recepção sem cópia.
+
+O arquivo nunca é lido inteiro para a memória: cada janela de até
+MAP_WINDOW bytes vira um mmap próprio e os segmentos são fatias
+(memoryview) dele. Um mmap é desfeito quando a última fatia que o
+referencia é liberada (por exemplo, quando o segmento é confirmado), então
+a memória residente fica limitada a poucas janelas, qualquer que seja o
+tamanho do arquivo.
+"""
+import mmap
+import os
+
+MAP_WINDOW = 8 * 1024 * 1024    # bytes mapeados por vez
+
+
+def map_file(fd: int, offset: int, length: int, write: bool = False) -> memoryview:
+    """
+    memoryview de [offset, offset + length) do arquivo `fd` (length > 0). O
+    mmap começa no múltiplo de ALLOCATIONGRANULARITY anterior a offset e
+    vive enquanto houver fatias da view. Com write=True o arquivo já precisa
+    ter o tamanho necessário (os.ftruncate).
+    """
+    base = offset - offset % mmap.ALLOCATIONGRANULARITY
+    access = mmap.ACCESS_WRITE if write else mmap.ACCESS_READ
+    m = mmap.mmap(fd, offset + length - base, access=access, offset=base)
+    return memoryview(m)[offset - base:]
+
+
+def windows(offset: int, count: int, window: int = MAP_WINDOW):
+    """Gera (posição, tamanho) das janelas consecutivas que cobrem [offset, offset + count)."""
+    end = offset + count
+    while offset < end:
+        n = min(window, end - offset)
+        yield offset, n
+        offset += n
+
+
+def file_span(fd: int, offset: int = 0, count: int = None) -> int:
+    """Bytes a partir de offset até o fim do arquivo, limitado a count."""
+    size = os.fstat(fd).st_size
+    if offset < 0 or offset > size:
+        raise ValueError('offset fora do arquivo: %d' % offset)
+    return size - offset if count is None else min(count, size - offset)
+
+
+def preallocate(fd: int, size: int):
+    """Reserva `size` bytes no disco (posix_fallocate se houver) e ajusta o tamanho do arquivo."""
+    if hasattr(os, 'posix_fallocate') and size:
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            pass
+    os.ftruncate(fd, size)
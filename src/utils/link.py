@@ -0,0 +1,174 @@
+# =====================
+# utils/link.py
+# =====================
+"""Modelo de enlace gargalo para o UnreliableChannel.
+
+O canal sozinho só sorteia perdas independentes e um atraso uniforme, com
+banda infinita: não há fila, então controle de congestionamento e pacing
+não têm o que mostrar. Um Link acrescenta, numa direção:
+
+- taxa de serialização (bytes/s) atrás de uma fila FIFO, com descarte na
+  cauda (DropTail) ou RED quando a fila enche;
+- latência de propagação fixa;
+- perda em rajadas (GilbertElliott), além da perda independente do canal;
+- reordenação (um pacote atrasa reorder_delay a mais e chega depois dos
+  seguintes) e duplicação.
+
+A fila não guarda pacotes: como a saída é FIFO a taxa constante, basta
+saber quando o enlace fica livre (_busy_until). O backlog num instante é
+(_busy_until - agora) * rate e a partida de um pacote admitido é
+max(agora, _busy_until) + tamanho / rate. Os sorteios usam o gerador do
+canal, então a semente dele também fixa o comportamento do enlace.
+
+    ida = Link(rate=1_000_000, queue=RED(64_000), delay=0.02,
+               loss=GilbertElliott(p=0.01, r=0.3))
+    volta = Link(delay=0.02)
+    canal = UnreliableChannel(seed=1, links={('localhost', 8000): ida,
+                                             ('localhost', 9000): volta})
+"""
+
+
+class GilbertElliott:
+    def __init__(self, p: float, r: float, loss_good: float = 0.0, loss_bad: float = 1.0):
+        """
+        Cadeia de Markov de dois estados, avançada a cada pacote.
+        p: probabilidade de passar de bom para ruim; r: de ruim para bom
+        (rajadas de 1/r pacotes em média).
+        loss_good, loss_bad: probabilidade de perda em cada estado.
+        """
+        self.p = p
+        self.r = r
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        self.bad = False
+
+    @property
+    def mean_loss(self) -> float:
+        """Taxa de perda de longo prazo."""
+        if not self.p + self.r:
+            return self.loss_good
+        pi_bad = self.p / (self.p + self.r)
+        return pi_bad * self.loss_bad + (1 - pi_bad) * self.loss_good
+
+    def lost(self, rng) -> bool:
+        # transição primeiro, depois a perda no estado em que o pacote passa
+        if rng.random() < (self.r if self.bad else self.p):
+            self.bad = not self.bad
+        return rng.random() < (self.loss_bad if self.bad else self.loss_good)
+
+
+class DropTail:
+    def __init__(self, limit: int):
+        """limit: bytes que cabem na fila (incluindo o pacote em serialização)."""
+        self.limit = limit
+
+    def admit(self, backlog: float, size: int, idle: float, rng) -> bool:
+        return backlog + size <= self.limit
+
+
+class RED:
+    def __init__(self, limit: int, min_th: int = None, max_th: int = None,
+                 max_p: float = 0.1, weight: float = 0.002):
+        """
+        Random Early Detection (Floyd e Jacobson, 1993) sobre a média móvel
+        do backlog: abaixo de min_th aceita, acima de max_th descarta e
+        entre os dois descarta com probabilidade crescente até max_p.
+        limit: tamanho físico da fila, em bytes (descarte forçado acima dele).
+        min_th, max_th: limiares em bytes (padrão: 1/4 e 3/4 de limit).
+        weight: peso da amostra nova na média (w_q).
+        """
+        self.limit = limit
+        self.min_th = limit // 4 if min_th is None else min_th
+        self.max_th = 3 * limit // 4 if max_th is None else max_th
+        self.max_p = max_p
+        self.weight = weight
+        self.avg = 0.0
+        self._count = -1            # pacotes aceitos desde o último descarte
+
+    def admit(self, backlog: float, size: int, idle: float, rng) -> bool:
+        w = self.weight
+        if backlog or not idle:
+            self.avg += w * (backlog - self.avg)
+        else:
+            # fila vazia há `idle` pacotes de tempo: a média decai como se
+            # tivessem chegado amostras zero nesse intervalo
+            self.avg *= (1 - w) ** idle
+        if backlog + size > self.limit or self.avg >= self.max_th:
+            self._count = 0
+            return False
+        if self.avg < self.min_th:
+            self._count = -1
+            return True
+        self._count += 1
+        pb = self.max_p * (self.avg - self.min_th) / (self.max_th - self.min_th)
+        # espaça os descartes: a probabilidade cresce com os aceitos desde o último
+        pa = 1.0 if self._count * pb >= 1 else pb / (1 - self._count * pb)
+        if rng.random() < pa:
+            self._count = 0
+            return False
+        return True
+
+
+class Link:
+    def __init__(self, rate: float = None, queue=None, delay: float = 0.0, loss: GilbertElliott = None,
+                 reorder_rate: float = 0.0, reorder_delay: float = 0.01, duplicate_rate: float = 0.0):
+        """
+        rate: taxa de serialização em bytes/s; None = banda infinita, sem fila.
+        queue: disciplina da fila (DropTail, RED) ou um limite em bytes
+        (DropTail); None = fila ilimitada. Só vale com rate.
+        delay: latência de propagação, em s.
+        loss: GilbertElliott, perda em rajadas depois da fila.
+        reorder_rate: probabilidade de um pacote atrasar reorder_delay s a mais.
+        duplicate_rate: probabilidade de entregar também uma segunda cópia.
+        """
+        self.rate = rate
+        self.queue = DropTail(queue) if isinstance(queue, int) else queue
+        self.delay = delay
+        self.loss = loss
+        self.reorder_rate = reorder_rate
+        self.reorder_delay = reorder_delay
+        self.duplicate_rate = duplicate_rate
+        self._busy_until = 0.0      # instante em que a fila esvazia
+        # estatísticas
+        self.packets = 0            # pacotes oferecidos ao enlace
+        self.queue_drops = 0
+        self.burst_losses = 0
+        self.reordered = 0
+        self.duplicated = 0
+        self.max_backlog = 0.0      # bytes
+
+    def backlog(self, now: float) -> float:
+        """Bytes na fila (incluindo o pacote em serialização) no instante `now`."""
+        if not self.rate:
+            return 0.0
+        return max(0.0, self._busy_until - now) * self.rate
+
+    def enqueue(self, size: int, now: float, rng):
+        """
+        Passa um pacote de `size` bytes pela fila no instante `now`. Retorna
+        o atraso até o fim da serialização mais a propagação, ou None se a
+        fila o descartou.
+        """
+        self.packets += 1
+        if not self.rate:
+            return self.delay
+        backlog = self.backlog(now)
+        if self.queue is not None:
+            # tempo ocioso medido em pacotes deste tamanho (decaimento da média do RED)
+            idle = max(0.0, now - self._busy_until) * self.rate / max(size, 1)
+            if not self.queue.admit(backlog, size, idle, rng):
+                self.queue_drops += 1
+                return None
+        self.max_backlog = max(self.max_backlog, backlog + size)
+        self._busy_until = max(now, self._busy_until) + size / self.rate
+        return self._busy_until - now + self.delay
+
+    def stats(self) -> dict:
+        return {
+            'packets': self.packets,
+            'queue_drops': self.queue_drops,
+            'burst_losses': self.burst_losses,
+            'reordered': self.reordered,
+            'duplicated': self.duplicated,
+            'max_backlog': int(self.max_backlog),
+        }
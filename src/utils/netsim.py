@@ -0,0 +1,275 @@
+# =====================
+# utils/netsim.py
+# =====================
+"""Simulação de eventos discretos em tempo virtual.
+
+Os testes com sockets de verdade andam no relógio de parede: timeouts de
+segundos, atrasos do canal e polling com time.sleep. Aqui um Simulator
+mantém um relógio virtual e um heap de eventos; run() executa os eventos em
+ordem e salta o relógio direto para o próximo, sem dormir e sem threads.
+Uma SimNetwork liga SimSockets (com o sendto() de um socket UDP) e entrega
+cada datagrama como um evento, depois do atraso sorteado pelo
+UnreliableChannel opcional:
+
+    sim = Simulator(seed=1)
+    net = SimNetwork(sim, UnreliableChannel(loss_rate=0.1, seed=1), delay=0.01)
+    rx = SimSRReceiver(net, 12000)
+    tx = SimSRSender(net, 12001, ('localhost', 12000))
+    tx.send_stream(dados)
+    sim.run(until=lambda: tx.done)
+
+Cada protocolo tem seu driver em tempo virtual, que troca o relógio, os
+timers e o socket do motor pelos do simulador: SimRDT20Sender/Receiver,
+SimRDT21Sender/Receiver e SimRDT30Sender/Receiver (fase1, sobre
+SimStopAndWaitSender e SimReceiver, abaixo), SimSRSender e SimSRReceiver
+(fase2.sr) e fase3.tcp_sim para o TCP. Com as mesmas sementes (Simulator e canal) duas
+execuções produzem exatamente a mesma sequência de eventos.
+"""
+import heapq
+import itertools
+import random
+from collections import deque
+
+from utils import trace
+
+EPHEMERAL_PORT = 49152      # primeira porta de SimNetwork.socket() sem porta
+
+
+class SimTimer:
+    """Evento agendado no Simulator; cancel() o descarta, como threading.Timer."""
+    __slots__ = ('when', 'fn', 'args', 'cancelled')
+
+    def __init__(self, when: float, fn, args):
+        self.when = when
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Simulator:
+    def __init__(self, seed=None):
+        """
+        seed: semente de `rng`, o gerador que os drivers usam para sorteios
+        próprios (número de sequência inicial do TCP, ...).
+        """
+        self.now = 0.0              # relógio virtual, em s
+        self.rng = random.Random(seed)
+        self.events = 0             # eventos executados
+        self._queue = []            # (instante, contador, SimTimer)
+        self._counter = itertools.count()
+
+    def time(self) -> float:
+        """Relógio virtual; os drivers o usam no lugar de time.monotonic."""
+        return self.now
+
+    def call_at(self, when: float, fn, *args) -> SimTimer:
+        """Agenda fn(*args) para o instante `when` (nunca antes de agora)."""
+        timer = SimTimer(max(when, self.now), fn, args)
+        # o contador desempata eventos do mesmo instante na ordem de agendamento
+        heapq.heappush(self._queue, (timer.when, next(self._counter), timer))
+        return timer
+
+    def call_later(self, delay: float, fn, *args) -> SimTimer:
+        return self.call_at(self.now + delay, fn, *args)
+
+    def call_soon(self, fn, *args) -> SimTimer:
+        return self.call_at(self.now, fn, *args)
+
+    def pending(self) -> int:
+        """Eventos na fila (incluindo cancelados ainda não descartados)."""
+        return len(self._queue)
+
+    def step(self, limit: float = None) -> bool:
+        """Executa o próximo evento (até o instante `limit`); False se não houver."""
+        queue = self._queue
+        while queue:
+            when, _, timer = queue[0]
+            if timer.cancelled:
+                heapq.heappop(queue)
+                continue
+            if limit is not None and when > limit:
+                return False
+            heapq.heappop(queue)
+            self.now = when
+            self.events += 1
+            timer.fn(*timer.args)
+            return True
+        return False
+
+    def run(self, until=None, limit: float = None) -> bool:
+        """
+        Executa eventos até `until()` ficar verdadeiro (testado depois de
+        cada evento), até o relógio chegar a `limit` segundos virtuais ou até
+        a fila esvaziar. Retorna True se `until` foi satisfeito (sem until,
+        True se a fila esvaziou).
+        """
+        if until is not None and until():
+            return True
+        while self.step(limit):
+            if until is not None and until():
+                return True
+        if limit is not None and self.now < limit and self._queue:
+            # parou no limite com eventos futuros: o relógio avança até ele
+            self.now = limit
+        return False if until is not None else not self._queue
+
+
+class SimSocket:
+    """Ponta de uma SimNetwork, com a interface de envio de um socket UDP."""
+
+    def __init__(self, net, addr):
+        self.net = net
+        self.addr = addr
+        self.handler = None         # handler(dados, origem), chamado a cada datagrama
+        self.closed = False
+
+    def getsockname(self):
+        return self.addr
+
+    def sendto(self, data, addr) -> int:
+        # depois de close() o datagrama some, sem erro (o motor pode ter timers pendentes)
+        if not self.closed:
+            self.net._transmit(bytes(data), self.addr, addr)
+        return len(data)
+
+    def close(self):
+        self.closed = True
+        self.net._unbind(self)
+
+
+class SimNetwork:
+    def __init__(self, sim: Simulator, channel=None, delay: float = 0.0):
+        """
+        channel: UnreliableChannel que sorteia perda, corrupção e atraso de
+        cada datagrama (impair()); None entrega todos intactos.
+        delay: latência fixa somada ao atraso do canal, em s.
+        """
+        self.sim = sim
+        self.channel = channel
+        self.delay = delay
+        self.datagrams = 0          # datagramas enviados
+        self.delivered = 0          # ... entregues a um socket
+        self._sockets = {}          # endereço -> SimSocket
+        self._ports = itertools.count(EPHEMERAL_PORT)
+
+    def socket(self, port: int = 0, host: str = 'localhost') -> SimSocket:
+        """Socket ligado a (host, port); port 0 escolhe uma porta livre."""
+        if port:
+            if (host, port) in self._sockets:
+                raise OSError('endereço em uso: %s:%d' % (host, port))
+        else:
+            port = next(self._ports)
+            while (host, port) in self._sockets:
+                port = next(self._ports)
+        sock = SimSocket(self, (host, port))
+        self._sockets[sock.addr] = sock
+        return sock
+
+    def _unbind(self, sock):
+        if self._sockets.get(sock.addr) is sock:
+            del self._sockets[sock.addr]
+
+    def _transmit(self, data, src, dest):
+        self.datagrams += 1
+        if self.channel is None:
+            self.sim.call_later(self.delay, self._deliver, data, src, dest)
+            return
+        for pkt, extra in self.channel.impair(data, dest, self.sim.now):
+            self.sim.call_later(self.delay + extra, self._deliver, pkt, src, dest)
+
+    def _deliver(self, data, src, dest):
+        # porta sem socket: o datagrama se perde, como no UDP
+        sock = self._sockets.get(dest)
+        if sock is None or sock.handler is None:
+            return
+        self.delivered += 1
+        sock.handler(data, src)
+
+
+class SimStopAndWaitSender:
+    """
+    Remetente pare e espere em tempo virtual, base dos drivers da fase 1:
+    send() não bloqueia, só enfileira a mensagem; elas saem uma por vez
+    conforme as confirmações chegam, e o timeout é um evento do simulador.
+    Vem antes da classe do protocolo na herança; ela fornece _transmit,
+    _packet(dados), _is_ack(resposta) e _advance() (a cada confirmação).
+    """
+
+    def __init__(self, net, local_port, dest_addr, timeout=2.0, **options):
+        """
+        net: SimNetwork (perda e atraso vêm do canal dela).
+        options: as do remetente do protocolo (integrity, ...).
+        """
+        self.net = net
+        super().__init__(local_port, dest_addr, **options)
+        self.timeout = timeout
+        self.retransmissions = 0
+        self.sent = 0               # mensagens confirmadas
+        self._queue = deque()
+        self._pending = None        # pacote aguardando confirmação
+        self._timer = None
+        self.sock.handler = self._on_datagram
+
+    def _bind(self, local_port):
+        return self.net.socket(local_port)
+
+    @property
+    def done(self) -> bool:
+        """Todas as mensagens enviadas foram confirmadas."""
+        return self._pending is None and not self._queue
+
+    def send(self, data, timeout=None):
+        if isinstance(data, str):
+            data = data.encode()
+        self._queue.append((data, timeout or self.timeout))
+        if self._pending is None:
+            self._next()
+
+    def _next(self):
+        if not self._queue:
+            return
+        data, self._rto = self._queue.popleft()
+        self._pending = self._packet(data)
+        self._send_current(None)
+
+    def _send_current(self, reason):
+        if reason is not None:
+            self.retransmissions += 1
+            if trace.active is not None:
+                trace.active.emit(trace.RETRANSMIT, self, reason=reason)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._transmit(self._pending)
+        self._timer = self.net.sim.call_later(self._rto, self._send_current, 'timeout')
+
+    def _on_datagram(self, resp, addr):
+        if self._pending is None:
+            return
+        if self._is_ack(resp):
+            self._timer.cancel()
+            self._timer = self._pending = None
+            self._advance()
+            self.sent += 1
+            self._next()
+        else:
+            self._send_current('wrong ack')
+
+
+class SimReceiver:
+    """
+    Receptor em tempo virtual, base dos drivers da fase 1: em vez da thread
+    de recepção, cada datagrama vai a _handle_packet no evento de entrega.
+    """
+
+    def __init__(self, net, local_port, **options):
+        self.net = net
+        super().__init__(local_port, **options)
+
+    def _bind(self, local_port):
+        return self.net.socket(local_port)
+
+    def _start(self):
+        self.sock.handler = self._handle_packet
@@ -0,0 +1,138 @@
+# =====================
+# utils/pacing.py
+# =====================
+"""Pacing de segmentos com token bucket.
+
+Em vez de despejar a janela inteira de uma vez (rajadas na velocidade da
+interface, que estouram a fila do gargalo e causam perdas agrupadas), o
+remetente pergunta ao Pacer quanto esperar antes de cada segmento. O balde
+enche a `rate` bytes/s até `burst` bytes; um segmento sai quando há fichas
+para ele.
+
+Usado pelo SRSender (fase2) e pelo TCPConnection (fase3). O balde guarda
+pelo menos PACING_HORIZON de fichas: quem agenda o próximo envio (timer de
+thread, call_later do asyncio) acorda com atraso de fração de milissegundo
+e o atraso não deve virar perda de taxa.
+
+As estatísticas comparam as rajadas oferecidas pelo remetente (quantos
+segmentos ele soltaria juntos sem pacing) com os trens que saíram de fato
+(envios separados por menos de `train_gap`).
+"""
+import time
+
+PACING_BURST_SEGMENTS = 2   # profundidade mínima do balde, em segmentos
+PACING_HORIZON = 0.001      # ... e em segundos de taxa
+TRAIN_GAP = 0.0001          # envios mais próximos que isso contam como uma rajada
+SPIN_THRESHOLD = 0.0005     # sleep_until gira (sem dormir) nos últimos 0,5 ms
+TOKEN_SLACK = 1e-6          # bytes: falta menor que isso é arredondamento do refill
+
+
+def sleep_until(deadline: float):
+    """Espera até `deadline` (time.monotonic) com precisão de microssegundos."""
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if remaining > SPIN_THRESHOLD:
+            time.sleep(remaining - SPIN_THRESHOLD)
+
+
+class BurstStats:
+    """Histograma de tamanhos de rajada (em segmentos)."""
+
+    def __init__(self):
+        self.hist = {}
+
+    def record(self, n: int):
+        if n > 0:
+            self.hist[n] = self.hist.get(n, 0) + 1
+
+    @property
+    def bursts(self) -> int:
+        return sum(self.hist.values())
+
+    @property
+    def max(self) -> int:
+        return max(self.hist, default=0)
+
+    @property
+    def mean(self) -> float:
+        total = self.bursts
+        return sum(n * c for n, c in self.hist.items()) / total if total else 0.0
+
+    def summary(self) -> dict:
+        return {'bursts': self.bursts, 'mean': round(self.mean, 2), 'max': self.max}
+
+
+class Pacer:
+    def __init__(self, rate: float = None, mss: int = 1000, train_gap: float = TRAIN_GAP,
+                 clock=time.monotonic):
+        """
+        rate: bytes/s; None desliga o pacing (delay() sempre 0).
+        mss: tamanho de segmento, para a profundidade do balde.
+        clock: relógio em s (o de um utils.netsim.Simulator em tempo virtual).
+        """
+        self._clock = clock
+        self.mss = mss
+        self.train_gap = train_gap
+        self.rate = None
+        self.burst = 0
+        self._tokens = 0.0
+        self._stamp = clock()
+        self.set_rate(rate)
+        self.offered = BurstStats()   # rajadas como o remetente as oferece
+        self.paced = BurstStats()     # trens que saíram de fato
+        self._train = 0
+        self._last_send = None
+
+    def set_rate(self, rate: float = None, mss: int = None):
+        """Muda a taxa (bytes/s, None = sem limite) sem perder as fichas acumuladas."""
+        if mss is not None:
+            self.mss = mss
+        self._refill(self._clock())
+        self.rate = rate
+        if rate:
+            self.burst = max(PACING_BURST_SEGMENTS * self.mss, rate * PACING_HORIZON)
+            self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self, now):
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def delay(self, nbytes: int, now: float = None) -> float:
+        """Segundos até haver fichas para `nbytes` (0: pode enviar já)."""
+        if not self.rate:
+            return 0.0
+        now = self._clock() if now is None else now
+        self._refill(now)
+        # um segmento maior que o balde sai com o balde cheio
+        need = min(nbytes, self.burst)
+        # sem a folga, uma espera abaixo da resolução do relógio não o faria
+        # andar (em tempo virtual, o timer dispararia no mesmo instante para sempre)
+        if self._tokens + TOKEN_SLACK >= need:
+            return 0.0
+        return (need - self._tokens) / self.rate
+
+    def consume(self, nbytes: int, now: float = None):
+        """Registra o envio de `nbytes` (depois de delay() == 0)."""
+        now = self._clock() if now is None else now
+        if self.rate:
+            self._refill(now)
+            self._tokens -= min(nbytes, self.burst)
+        if self._last_send is not None and now - self._last_send <= self.train_gap:
+            self._train += 1
+        else:
+            self.paced.record(self._train)
+            self._train = 1
+        self._last_send = now
+
+    def offer(self, segments: int):
+        """O remetente tinha `segments` segmentos prontos para sair juntos."""
+        self.offered.record(segments)
+
+    def stats(self) -> dict:
+        paced = BurstStats()
+        paced.hist = dict(self.paced.hist)
+        paced.record(self._train)   # o trem em andamento também conta
+        return {'rate': self.rate, 'offered': self.offered.summary(), 'paced': paced.summary()}
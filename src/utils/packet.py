@@ -1,23 +1,38 @@
 """Funções utilitárias para empacotar e desempacotar pacotes simples.
 Formato usado nas fases 1 e 2 (simplificado):
-Tipo (1 byte), SeqNum (1 byte, opcional), Checksum (4 bytes, crc32), Dados...
+Tipo (1 byte), SeqNum (1 byte, opcional), Checksum (4 bytes), Dados...
+
+O nibble alto do tipo leva o id do codec de integridade (utils.integrity),
+como no SR: crc32 (id 0, o padrão) mantém o formato de sempre.
 """
 import struct
 import zlib
 
+from utils.integrity import BY_ID, DEFAULT as DEFAULT_CODEC
+
 # Types
 TYPE_DATA = 0
 TYPE_ACK = 1
 TYPE_NAK = 2
 
-def checksum(data: bytes) -> int:
-    # usa crc32 truncado a 32 bits
-    return zlib.crc32(data) & 0xffffffff
+CODEC_SHIFT = 4
+TYPE_MASK = 0x0f
+
+def checksum(*parts) -> int:
+    # crc32 encadeado pelas partes (sem concatená-las), truncado a 32 bits
+    ck = 0
+    for part in parts:
+        ck = zlib.crc32(part, ck)
+    return ck & 0xffffffff
+
+def split_type(t: int):
+    """(tipo, codec) de um byte de tipo; codec None se o id for desconhecido."""
+    return t & TYPE_MASK, BY_ID.get(t >> CODEC_SHIFT)
 
-def pack_rdt20(data: bytes) -> bytes:
-    # Tipo (1), Checksum (4), Dados
-    chksum = checksum(data)
-    return struct.pack('!BI', TYPE_DATA, chksum) + data
+def pack_rdt20(data: bytes, codec=DEFAULT_CODEC) -> bytes:
+    # Tipo (1, com o id do codec), Checksum (4, só dos dados), Dados
+    chksum = codec.compute(data)
+    return struct.pack('!BI', TYPE_DATA | codec.id << CODEC_SHIFT, chksum) + data
 
 def unpack_rdt20(packet: bytes):
     try:
@@ -34,9 +49,10 @@ def pack_ack_rdt20(ack_type=TYPE_ACK) -> bytes:
     return struct.pack('!B', ack_type)
 
 # rdt2.1: inclui SeqNum (1 byte) entre Tipo e Checksum
-def pack_rdt21(type_byte: int, seqnum: int, data: bytes=b'') -> bytes:
-    chksum = checksum(struct.pack('!B', type_byte) + struct.pack('!B', seqnum) + data)
-    return struct.pack('!BBI', type_byte, seqnum, chksum) + data
+def pack_rdt21(type_byte: int, seqnum: int, data: bytes=b'', codec=DEFAULT_CODEC) -> bytes:
+    header = struct.pack('!BB', type_byte | codec.id << CODEC_SHIFT, seqnum)
+    chksum = codec.compute(header, data)
+    return header + struct.pack('!I', chksum) + data
 
 def unpack_rdt21(packet: bytes):
     if len(packet) < 6:
@@ -45,4 +61,21 @@ def unpack_rdt21(packet: bytes):
     data = packet[6:]
     return type_byte, seqnum, chksum, data
 
+def verify_rdt21(packet: bytes, integrity=DEFAULT_CODEC):
+    """
+    (tipo, seqnum, dados, codec) de um pacote rdt2.1 íntegro, ou None se for
+    curto, de codec desconhecido ou com checksum errado. Aceita o codec que
+    vier no tipo; 'none' (sem verificação) só se `integrity` também for 'none'.
+    """
+    out = unpack_rdt21(packet)
+    if out is None:
+        return None
+    t, seqnum, chksum, data = out
+    kind, codec = split_type(t)
+    if codec is None or (not codec.checks and codec is not integrity):
+        return None
+    if not codec.verify(chksum, packet[:2], data):
+        return None
+    return kind, seqnum, data, codec
+
 # rdt3.0 usa rdt2.1 com timers (mesmo formato)
\ No newline at end of file
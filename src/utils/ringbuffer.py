@@ -0,0 +1,66 @@
+# =====================
+# utils/ringbuffer.py
+# =====================
+"""Buffer circular de bytes com capacidade fixa.
+
+Escritas e leituras copiam só os bytes transferidos (no máximo duas fatias
+por causa da volta do buffer), nunca o conteúdo pendente inteiro.
+A classe não é thread-safe: quem usa deve protegê-la com o próprio lock.
+"""
+
+
+class RingBuffer:
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError('capacity must be positive')
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._head = 0      # posição do próximo byte a ler
+        self._size = 0      # bytes armazenados
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self._size
+
+    def write(self, data) -> int:
+        """Copia o máximo de `data` que couber; retorna quantos bytes foram escritos."""
+        src = memoryview(data).cast('B')
+        n = min(len(src), self.capacity - self._size)
+        if n == 0:
+            return 0
+        tail = (self._head + self._size) % self.capacity
+        first = min(n, self.capacity - tail)
+        self._view[tail:tail + first] = src[:first]
+        if n > first:
+            self._view[:n - first] = src[first:n]
+        self._size += n
+        return n
+
+    def readinto(self, out) -> int:
+        """Move até len(out) bytes para `out` (buffer gravável); retorna quantos."""
+        dst = memoryview(out).cast('B')
+        n = min(len(dst), self._size)
+        if n == 0:
+            return 0
+        first = min(n, self.capacity - self._head)
+        dst[:first] = self._view[self._head:self._head + first]
+        if n > first:
+            dst[first:n] = self._view[:n - first]
+        self._head = (self._head + n) % self.capacity
+        self._size -= n
+        return n
+
+    def read(self, n: int) -> bytes:
+        """Remove e retorna até n bytes."""
+        n = min(n, self._size)
+        first = min(n, self.capacity - self._head)
+        out = self._view[self._head:self._head + first].tobytes()
+        if n > first:
+            out += self._view[:n - first].tobytes()
+        self._head = (self._head + n) % self.capacity
+        self._size -= n
+        return out
@@ -3,48 +3,173 @@
 # =====================
 """Simulador de canal não confiável.
 Use para enviar pacotes entre sockets locais simulando perda, corrupção e atraso.
+
+Os pacotes atrasados esperam num heap ordenado pelo instante de entrega e
+uma única thread despachante (criada no primeiro atraso) os envia na hora;
+com atraso zero o envio é feito na própria chamada. close() encerra o
+canal entregando ou descartando o que ainda estiver na fila.
+
+Banda, fila, perda em rajadas, reordenação e duplicação vêm de um
+utils.link.Link, comum às duas direções (link=) ou por endereço de
+destino (links=).
 """
+import heapq
+import itertools
 import random
 import threading
 import time
+from utils import trace
 
 
 class UnreliableChannel:
-    def __init__(self, loss_rate=0.0, corrupt_rate=0.0, delay_range=(0.0, 0.0)):
+    def __init__(self, loss_rate=0.0, corrupt_rate=0.0, delay_range=(0.0, 0.0), seed=None,
+                 link=None, links=None):
         """
         loss_rate: probabilidade de perda (0 a 1)
         corrupt_rate: probabilidade de corrupção (0 a 1)
         delay_range: (min_delay, max_delay) em segundos
+        seed: semente do gerador próprio do canal (sorteios reproduzíveis);
+        None usa uma semente aleatória
+        link: utils.link.Link para os pacotes sem enlace próprio em `links`
+        links: {endereço de destino: Link}, um enlace por direção
         """
+        self._rng = random.Random(seed)
+        self.link = link
+        self.links = dict(links or {})
         self.loss_rate = loss_rate
         self.corrupt_rate = corrupt_rate
         self.delay_range = delay_range
+        self._queue = []            # (instante de entrega, contador, pacote, socket, destino)
+        self._counter = itertools.count()
+        self._cv = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.send_errors = 0        # sendto() que falhou (socket de origem já fechado, ...)
 
     def send(self, packet: bytes, dest_socket, dest_addr):
         """Simula enviar um pacote com perda, corrupção e atraso."""
-        # Simular perda
-        if random.random() < self.loss_rate:
-            print('[SIM] Pacote perdido')
+        if self._closed:
             return
+        now = time.monotonic()
+        with self._cv:
+            # o estado do enlace (fila) é compartilhado pelas threads que enviam
+            fates = self.impair(packet, dest_addr, now)
+        for pkt_to_send, delay in fates:
+            if delay <= 0:
+                self._deliver(pkt_to_send, dest_socket, dest_addr)
+                continue
+            entry = (now + delay, next(self._counter), pkt_to_send, dest_socket, dest_addr)
+            with self._cv:
+                if self._closed:
+                    return
+                heapq.heappush(self._queue, entry)
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._dispatch, name='UnreliableChannel', daemon=True)
+                    self._thread.start()
+                elif self._queue[0] is entry:
+                    # nova entrega mais próxima: o despachante dorme até a anterior
+                    self._cv.notify()
+
+    def impair(self, packet: bytes, dest_addr=None, now: float = 0.0) -> list:
+        """
+        Sorteia o destino de um pacote enviado no instante `now`: a lista de
+        entregas (pacote, atraso em s), vazia se ele se perdeu, com duas se
+        foi duplicado; o pacote pode vir corrompido. send() entrega em tempo
+        real; utils.netsim usa o mesmo sorteio em tempo virtual.
+        """
+        link = self.links.get(dest_addr, self.link)
+        wait = 0.0
+        if link is not None:
+            # fila e serialização do gargalo: o pacote ocupa o enlace mesmo
+            # que se perca depois
+            wait = link.enqueue(len(packet), now, self._rng)
+            if wait is None:
+                if trace.active is not None:
+                    trace.active.emit(trace.DROP, self, size=len(packet), dest=dest_addr, reason='queue')
+                return []
+
+        # Simular perda
+        if self._rng.random() < self.loss_rate:
+            if trace.active is not None:
+                trace.active.emit(trace.DROP, self, size=len(packet), dest=dest_addr)
+            return []
+        if link is not None and link.loss is not None and link.loss.lost(self._rng):
+            link.burst_losses += 1
+            if trace.active is not None:
+                trace.active.emit(trace.DROP, self, size=len(packet), dest=dest_addr, reason='burst')
+            return []
 
         # Simular corrupção
         pkt_to_send = packet
-        if random.random() < self.corrupt_rate:
+        if self._rng.random() < self.corrupt_rate:
             pkt_to_send = self._corrupt_packet(packet)
-            print('[SIM] Pacote corrompido')
+            if trace.active is not None:
+                trace.active.emit(trace.CORRUPT, self, size=len(packet), dest=dest_addr)
+
+        # Simular atraso (sorteado sempre: a sequência de perdas de uma
+        # semente não depende da faixa de atraso)
+        delay = wait + self._rng.uniform(*self.delay_range)
+        if link is None:
+            return [(pkt_to_send, delay)]
+        fates = [(pkt_to_send, delay)]
+        if link.duplicate_rate and self._rng.random() < link.duplicate_rate:
+            link.duplicated += 1
+            fates.append((pkt_to_send, delay))
+        if link.reorder_rate and self._rng.random() < link.reorder_rate:
+            # só a primeira cópia atrasa: chega depois dos pacotes seguintes
+            link.reordered += 1
+            fates[0] = (pkt_to_send, delay + link.reorder_delay)
+        return fates
 
-        # Simular atraso
-        delay = random.uniform(*self.delay_range)
+    def pending(self) -> int:
+        """Pacotes atrasados ainda não entregues."""
+        with self._cv:
+            return len(self._queue)
+
+    def close(self, flush: bool = False):
+        """
+        Encerra o canal: com flush=True entrega já os pacotes pendentes, senão
+        os descarta. Envios posteriores são ignorados.
+        """
+        with self._cv:
+            self._closed = True
+            pending, self._queue = self._queue, []
+            self._cv.notify()
+            thread = self._thread
+        if flush:
+            for _, _, pkt, sock, addr in sorted(pending):
+                self._deliver(pkt, sock, addr)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
 
-        def delayed_send():
-            try:
-                dest_socket.sendto(pkt_to_send, dest_addr)
-            except OSError:
-                # O socket pode ter sido fechado antes do timer disparar
-                # Evitamos os erros: OSError: [Errno 9] Bad file descriptor
-                return
+    def _deliver(self, packet, dest_socket, dest_addr):
+        try:
+            dest_socket.sendto(packet, dest_addr)
+        except OSError:
+            # socket de origem fechado antes da entrega: conta, não derruba o despachante
+            self.send_errors += 1
 
-        threading.Timer(delay, delayed_send).start()
+    def _dispatch(self):
+        queue_cv = self._cv
+        while True:
+            with queue_cv:
+                while True:
+                    if self._closed:
+                        return
+                    if self._queue:
+                        wait = self._queue[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    queue_cv.wait(wait)
+                now = time.monotonic()
+                due = []
+                while self._queue and self._queue[0][0] <= now:
+                    due.append(heapq.heappop(self._queue))
+            # envia fora do lock: send() de outras threads não espera o sendto
+            for _, _, pkt, sock, addr in due:
+                self._deliver(pkt, sock, addr)
 
     def _corrupt_packet(self, packet: bytes) -> bytes:
         """Corrompe alguns bytes do pacote."""
@@ -54,10 +179,10 @@ class UnreliableChannel:
         packet_list = bytearray(packet)
 
         # Corrupção leve: altera de 1 até N bytes
-        num_corruptions = random.randint(1, max(1, min(5, len(packet_list)//4)))
+        num_corruptions = self._rng.randint(1, max(1, min(5, len(packet_list)//4)))
 
         for _ in range(num_corruptions):
-            idx = random.randint(0, len(packet_list) - 1)
+            idx = self._rng.randint(0, len(packet_list) - 1)
             packet_list[idx] ^= 0xFF  # inverte bits
 
         return bytes(packet_list)
@@ -0,0 +1,68 @@
+# =====================
+# utils/timers.py
+# =====================
+"""Agendador de timers baseado em min-heap.
+
+Cada timer é identificado por uma chave (qualquer objeto hashable). Agendar
+uma chave já existente reprograma o timer (re-arm); cancelar só remove a
+chave do índice e a entrada antiga do heap é descartada quando chegar ao topo
+(cancelamento preguiçoso). Agendar e reprogramar custam O(log n), cancelar O(1).
+A classe não é thread-safe: quem usa deve protegê-la com o próprio lock.
+"""
+import heapq
+import itertools
+
+
+class TimerHeap:
+    def __init__(self):
+        self._heap = []          # (deadline, contador, chave)
+        self._active = {}        # chave -> contador da entrada vigente
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._active)
+
+    def __contains__(self, key):
+        return key in self._active
+
+    def schedule(self, key, deadline: float):
+        """Arma (ou rearma) o timer `key` para disparar em `deadline`."""
+        n = next(self._counter)
+        self._active[key] = n
+        heapq.heappush(self._heap, (deadline, n, key))
+        # evita que entradas obsoletas dominem o heap
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._active):
+            self._compact()
+
+    def cancel(self, key):
+        """Cancela o timer `key` (sem efeito se não estiver armado)."""
+        self._active.pop(key, None)
+
+    def clear(self):
+        self._heap.clear()
+        self._active.clear()
+
+    def next_deadline(self):
+        """Deadline mais próximo entre os timers armados, ou None."""
+        heap = self._heap
+        while heap:
+            deadline, n, key = heap[0]
+            if self._active.get(key) == n:
+                return deadline
+            heapq.heappop(heap)
+        return None
+
+    def pop_expired(self, now: float):
+        """Remove e retorna (em ordem de deadline) as chaves com deadline <= now."""
+        heap = self._heap
+        expired = []
+        while heap and heap[0][0] <= now:
+            deadline, n, key = heapq.heappop(heap)
+            if self._active.get(key) == n:
+                del self._active[key]
+                expired.append(key)
+        return expired
+
+    def _compact(self):
+        self._heap = [e for e in self._heap if self._active.get(e[2]) == e[1]]
+        heapq.heapify(self._heap)
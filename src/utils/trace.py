@@ -0,0 +1,130 @@
+# =====================
+# utils/trace.py
+# =====================
+"""Rastreamento de eventos dos protocolos, em memória.
+
+Em vez de print() nos caminhos quentes (perda simulada, retransmissão),
+os protocolos registram eventos tipados num buffer circular:
+
+    from utils import trace
+    tracer = trace.enable()              # ou enable(sinks=[trace.LoggingSink()])
+    ...transferência...
+    trace.export_qlog(tracer, 'saida.qlog')
+    trace.disable()
+
+Desligado (o padrão), cada ponto de rastreamento custa um teste
+`trace.active is not None`. Ligado, um evento é uma tupla
+(instante, tipo, origem, campos) acrescentada a um deque com maxlen: o
+append é atômico no CPython, sem lock, e os eventos mais antigos são
+descartados quando o buffer enche. Sinks recebem cada evento na hora
+(LoggingSink); o exportador qlog trabalha sobre o conteúdo do buffer.
+"""
+import json
+import logging
+import time
+from collections import deque
+
+# tipos de evento
+SEND = 'send'               # segmento transmitido pela primeira vez
+RETRANSMIT = 'retransmit'
+ACK = 'ack'                 # confirmação nova recebida pelo remetente
+DROP = 'drop'               # pacote perdido pelo canal simulado
+CORRUPT = 'corrupt'         # pacote corrompido pelo canal simulado
+DELIVER = 'deliver'         # dados entregues em ordem à aplicação
+STATE = 'state'             # mudança de estado da conexão
+
+TRACE_CAPACITY = 65536      # eventos guardados
+
+# nomes qlog (categoria:evento) de cada tipo
+QLOG_NAMES = {
+    SEND: 'transport:packet_sent',
+    RETRANSMIT: 'recovery:packet_retransmitted',
+    ACK: 'transport:ack_received',
+    DROP: 'simulation:packet_dropped',
+    CORRUPT: 'simulation:packet_corrupted',
+    DELIVER: 'transport:data_delivered',
+    STATE: 'connectivity:connection_state_updated',
+}
+
+
+def label(source) -> str:
+    """Nome curto e estável de quem gerou o evento: classe@id."""
+    return '%s@%x' % (type(source).__name__, id(source))
+
+
+class Tracer:
+    def __init__(self, capacity: int = TRACE_CAPACITY, sinks=(), clock=time.monotonic):
+        """
+        capacity: eventos mantidos no buffer circular.
+        sinks: chamáveis que recebem cada evento (tupla) assim que é emitido.
+        clock: relógio dos instantes (o de um utils.netsim.Simulator em tempo virtual).
+        """
+        self.clock = clock
+        self.events = deque(maxlen=capacity)
+        self.sinks = list(sinks)
+
+    def emit(self, kind: str, source, **fields):
+        event = (self.clock(), kind, label(source), fields)
+        self.events.append(event)
+        for sink in self.sinks:
+            sink(event)
+
+    def snapshot(self) -> list:
+        """Cópia dos eventos no buffer, do mais antigo ao mais recente."""
+        return list(self.events)
+
+    def count(self, kind: str = None) -> int:
+        return sum(1 for e in self.snapshot() if kind is None or e[1] == kind)
+
+    def clear(self):
+        self.events.clear()
+
+
+class LoggingSink:
+    """Repassa cada evento ao logging (nível DEBUG por padrão)."""
+
+    def __init__(self, logger: logging.Logger = None, level: int = logging.DEBUG):
+        self.logger = logger or logging.getLogger('trace')
+        self.level = level
+
+    def __call__(self, event):
+        if self.logger.isEnabledFor(self.level):
+            t, kind, source, fields = event
+            self.logger.log(self.level, '%.6f %s %s %s', t, source, kind, fields)
+
+
+def to_qlog(events, title: str = 'trace') -> dict:
+    """Eventos no formato qlog (JSON): tempos em ms relativos ao primeiro evento."""
+    start = events[0][0] if events else 0.0
+    return {
+        'qlog_version': '0.3',
+        'title': title,
+        'traces': [{
+            'common_fields': {'time_format': 'relative', 'reference_time': 0},
+            'events': [{'time': round((t - start) * 1000, 3), 'name': QLOG_NAMES.get(kind, kind),
+                        'data': dict(fields, source=source)}
+                       for t, kind, source, fields in events],
+        }],
+    }
+
+
+def export_qlog(tracer: Tracer, path: str, title: str = 'trace'):
+    """Grava o conteúdo do buffer de `tracer` num arquivo qlog."""
+    with open(path, 'w') as f:
+        json.dump(to_qlog(tracer.snapshot(), title), f, default=str)
+
+
+# tracer do processo; None = rastreamento desligado
+active = None
+
+
+def enable(capacity: int = TRACE_CAPACITY, sinks=(), clock=time.monotonic) -> Tracer:
+    """Liga o rastreamento para todo o processo e retorna o Tracer."""
+    global active
+    active = Tracer(capacity, sinks, clock)
+    return active
+
+
+def disable():
+    global active
+    active = None
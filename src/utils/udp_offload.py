@@ -0,0 +1,116 @@
+# =====================
+# utils/udp_offload.py
+# =====================
+"""Offload de segmentação UDP do Linux (GSO/GRO).
+
+Com UDP_SEGMENT (GSO) um único sendmsg entrega ao kernel um lote de
+datagramas do mesmo tamanho, concatenados; o kernel os separa. Com UDP_GRO
+o kernel junta datagramas recebidos do mesmo fluxo e o recvmsg devolve o
+lote inteiro, com o tamanho de cada datagrama numa mensagem de controle.
+Assim uma rajada de N segmentos custa uma chamada de sistema em vez de N.
+
+As funções detectam o suporte e devolvem False quando as opções não
+existem (outros sistemas, kernels antigos); quem usa cai no caminho normal
+(sendto/recvfrom).
+"""
+import socket
+import struct
+import sys
+
+SOL_UDP = getattr(socket, 'SOL_UDP', 17)
+UDP_SEGMENT = getattr(socket, 'UDP_SEGMENT', 103)   # valores do Linux
+UDP_GRO = getattr(socket, 'UDP_GRO', 104)
+
+GSO_MAX_SEGMENTS = 64       # limite do kernel por sendmsg
+GSO_MAX_BYTES = 65000       # payload UDP máximo (65507) com folga
+RECV_BUFSIZE = 65536
+_ANC_SPACE = socket.CMSG_SPACE(4) if hasattr(socket, 'CMSG_SPACE') else 0
+
+
+def gso_supported(sock) -> bool:
+    """True se o socket aceita UDP_SEGMENT."""
+    if not sys.platform.startswith('linux') or not hasattr(sock, 'sendmsg'):
+        return False
+    try:
+        sock.getsockopt(SOL_UDP, UDP_SEGMENT)
+        return True
+    except OSError:
+        return False
+
+
+def enable_gro(sock) -> bool:
+    """Liga UDP_GRO no socket; False se não for suportado."""
+    if not sys.platform.startswith('linux') or not hasattr(sock, 'recvmsg'):
+        return False
+    try:
+        sock.setsockopt(SOL_UDP, UDP_GRO, 1)
+        return True
+    except OSError:
+        return False
+
+
+def set_dont_fragment(sock) -> bool:
+    """
+    Proíbe fragmentação (IP_PMTUDISC_DO): datagramas maiores que o MTU local
+    ou que o PMTU aprendido por ICMP falham com EMSGSIZE em vez de sair
+    fragmentados. False se a opção não existir.
+    """
+    opt = getattr(socket, 'IP_MTU_DISCOVER', 10 if sys.platform.startswith('linux') else None)
+    if opt is None:
+        return False
+    try:
+        sock.setsockopt(socket.IPPROTO_IP, opt, getattr(socket, 'IP_PMTUDISC_DO', 2))
+        return True
+    except OSError:
+        return False
+
+
+def send_gso(sock, datagrams, seg_size: int, addr) -> int:
+    """
+    Envia uma lista de datagramas (cada um uma tupla de buffers) num único
+    sendmsg; todos têm seg_size bytes, exceto talvez o último. Os buffers
+    não são copiados (scatter/gather).
+    """
+    buffers = [buf for dgram in datagrams for buf in dgram]
+    cmsg = [(SOL_UDP, UDP_SEGMENT, struct.pack('=H', seg_size))]
+    return sock.sendmsg(buffers, cmsg, 0, addr)
+
+
+def gso_batches(datagrams):
+    """
+    Agrupa (addr, tamanho, buffers) consecutivos em lotes válidos para GSO:
+    mesmo destino, mesmo tamanho (só o último do lote pode ser menor) e dentro
+    dos limites do kernel. Gera (addr, seg_size, lista de buffers por datagrama).
+    """
+    addr0 = seg_size = None
+    batch = []
+    closed = False
+    for addr, size, bufs in datagrams:
+        if (batch and addr == addr0 and size <= seg_size and not closed
+                and len(batch) < GSO_MAX_SEGMENTS and (len(batch) + 1) * seg_size <= GSO_MAX_BYTES):
+            batch.append(bufs)
+            # um datagrama menor fecha o lote
+            closed = size < seg_size
+            continue
+        if batch:
+            yield addr0, seg_size, batch
+        addr0, seg_size, batch, closed = addr, size, [bufs], False
+    if batch:
+        yield addr0, seg_size, batch
+
+
+def split_gro(data, ancdata):
+    """Separa um lote recebido com GRO nos datagramas originais."""
+    seg_size = 0
+    for level, ctype, cdata in ancdata:
+        if level == SOL_UDP and ctype == UDP_GRO:
+            seg_size = struct.unpack('=i', cdata[:4])[0]
+    if seg_size <= 0 or seg_size >= len(data):
+        return [data]
+    return [data[i:i + seg_size] for i in range(0, len(data), seg_size)]
+
+
+def recv_batch(sock, bufsize: int = RECV_BUFSIZE):
+    """recvfrom() para sockets com GRO: retorna (lista de datagramas, addr)."""
+    data, ancdata, _, addr = sock.recvmsg(bufsize, _ANC_SPACE)
+    return split_gro(data, ancdata), addr